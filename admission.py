@@ -0,0 +1,139 @@
+"""
+Admission queue for registration bursts.
+
+When a popular event opens, every request thread would otherwise take
+SQLite's single write lock for its own one-row transaction, and the losers
+back off in busy-timeout sleeps. AdmissionQueue takes registrations in
+memory instead and a single writer thread drains them with
+DB.register_batch, one commit per batch. Each submission gets a ticket
+that can be waited on or polled. The capacity check still runs inside the
+write transaction, so a batch can never oversell an event.
+"""
+import secrets
+import threading
+import time
+from collections import deque
+
+
+class QueueFull(Exception):
+    """Too many registrations are already waiting; the caller should ask the user to retry"""
+
+
+class _Ticket:
+    __slots__ = ('id', 'user_id', 'event_id', 'status', 'message', 'registration_id', 'done', 'expires')
+
+    def __init__(self, ticket_id, user_id, event_id):
+        self.id = ticket_id
+        self.user_id = user_id
+        self.event_id = event_id
+        self.status = 'pending'
+        self.message = None
+        self.registration_id = None
+        self.done = threading.Event()
+        self.expires = None
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'message': self.message,
+            'event_id': self.event_id,
+            'registration_id': self.registration_id,
+        }
+
+
+class AdmissionQueue:
+    def __init__(self, db, batch_size=256, max_pending=10000, ticket_ttl=300):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.ticket_ttl = ticket_ttl
+        self._pending = deque()
+        self._tickets = {}
+        self._finished = deque()  # settled tickets, oldest first
+        self._cond = threading.Condition()
+        self._writer = None
+        self._closed = False
+        self.batches = self.processed = 0
+
+    def submit(self, user_id, event_id):
+        """Queue a registration and return its ticket id"""
+        ticket = _Ticket(secrets.token_urlsafe(12), user_id, event_id)
+        with self._cond:
+            if self._closed:
+                raise QueueFull('Registration is shutting down')
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull('Too many registrations in progress')
+            self._tickets[ticket.id] = ticket
+            self._pending.append(ticket)
+            if self._writer is None:
+                # Started on first use, like the password hashing pool
+                self._writer = threading.Thread(target=self._drain, name='admission-writer', daemon=True)
+                self._writer.start()
+            self._cond.notify()
+        return ticket.id
+
+    def wait(self, ticket_id, timeout=None):
+        """Block until the ticket is settled (or timeout); return its result or None if unknown"""
+        ticket = self._tickets.get(ticket_id)
+        if ticket is None:
+            return None
+        ticket.done.wait(timeout)
+        return ticket.as_dict()
+
+    def result(self, ticket_id, user_id=None):
+        """Current state of a ticket; None if unknown, expired, or owned by another user"""
+        ticket = self._tickets.get(ticket_id)
+        if ticket is None or (user_id is not None and ticket.user_id != user_id):
+            return None
+        return ticket.as_dict()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'tickets': len(self._tickets),
+                'batches': self.batches,
+                'processed': self.processed,
+            }
+
+    def close(self, timeout=5.0):
+        """Stop accepting work and let the writer finish what is queued"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join(timeout)
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Take whatever has piled up since the last commit; no extra waiting when idle
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                results = self.db.register_batch([(t.user_id, t.event_id) for t in batch])
+            except Exception as e:
+                results = [(None, f'Registration failed, please try again ({e})')] * len(batch)
+            finally:
+                self.db.release()
+            self._settle(batch, results)
+
+    def _settle(self, batch, results):
+        now = time.monotonic()
+        for ticket, (registration_id, error) in zip(batch, results):
+            ticket.registration_id = registration_id
+            ticket.status = 'failed' if error else 'registered'
+            ticket.message = error
+            ticket.expires = now + self.ticket_ttl
+            ticket.done.set()
+        with self._cond:
+            self.batches += 1
+            self.processed += len(batch)
+            self._finished.extend(batch)
+            # Forget tickets settled more than ticket_ttl ago
+            while self._finished and self._finished[0].expires <= now:
+                self._tickets.pop(self._finished.popleft().id, None)
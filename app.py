@@ -1,27 +1,258 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from db import DB
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, jsonify, Response, stream_with_context, abort
+from markupsafe import Markup, escape
+from db import DB, QueryCache, HIGHLIGHT_START, HIGHLIGHT_END, EXPORT_BATCH_SIZE, csv_cell
+from passwords import PasswordHasher, HasherBusy, LoginThrottle
+from metrics import Profiler
+from admission import AdmissionQueue, QueueFull
+from pubsub import Broker, TooManySubscribers
+from assets import StaticAssets, choose_encoding, compress
+from recurrence import format_rrule, parse_rrule
+from datetime import datetime, timedelta, timezone
+from werkzeug.http import is_resource_modified
+import calendar
+import csv
+import hashlib
+import io
+import os
 import re
 import json
+import threading
+import time
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
-# Initialize database
-db = DB()
+# Request profiling is opt-in: EVENTS_PROFILE=1 python app.py
+profiler = Profiler() if os.environ.get('EVENTS_PROFILE') else None
+
+# The database (EVENTS_DB overrides the default events.db, e.g. for benchmark.py),
+# the admission queue and the built assets are set up by start(), at the end of this file
+db = admission = static_assets = None
+if profiler:
+    profiler.init_app(app)
+
+# Rows per page on paginated listings
+PAGE_SIZE = 20
+
+# Longest date window /events?from=...&to=... will expand, and the default one
+MAX_WINDOW_DAYS = 366
+DEFAULT_WINDOW_DAYS = 30
+
+def wall_clock_epoch(dt):
+    """Epoch seconds of a local wall-clock time read as UTC, the convention of the schedules table"""
+    return calendar.timegm(dt.timetuple())
+
+# Server-side login sessions; the cookie only holds the session id
+SESSION_TTL = 14 * 24 * 3600
+app.permanent_session_lifetime = timedelta(seconds=SESSION_TTL)
+
+# Password KDFs run in a bounded process pool; floods are throttled before reaching it
+hasher = PasswordHasher(workers=2, max_pending=32)
+email_throttle = LoginThrottle(limit=10, window=300)
+ip_throttle = LoginThrottle(limit=30, window=60)
+
+# Registrations are committed in batches by one writer thread. A request waits
+# up to ADMISSION_WAIT seconds for its result before handing back a ticket to poll.
+ADMISSION_WAIT = 2.0
+
+# Live seat counts: every committed seat change is fanned out to the open
+# /events/seats streams subscribed to that event
+seat_broker = Broker(max_subscribers=10000, max_topics=PAGE_SIZE * 5)
+# Idle streams get a comment this often, so proxies keep them open and dead clients are noticed
+SEAT_STREAM_KEEPALIVE = 15.0
+# Under asgi.py the event loop is passed in the WSGI environ, so seat streams can wait on it
+ASGI_LOOP_KEY = 'events.asgi_loop'
+
+# Worker processes sharing the database, set by serve.py. With more than one,
+# each must notice the others' writes: a background thread polls
+# table_versions every WORKER_POLL_INTERVAL seconds, invalidates the cached
+# reads of tables other workers have written and publishes seat changes.
+WORKERS = int(os.environ.get('EVENTS_WORKERS', '1'))
+WORKER_POLL_INTERVAL = 0.25
+
+# style.css and main.js are minified, fingerprinted and compressed once at startup;
+# templates link them with asset_url() and /assets/ serves them as immutable
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Rendered public pages for anonymous visitors. Entries expire after
+# PAGE_CACHE_TTL seconds, so template edits and other changes show up quickly.
+PAGE_CACHE_TTL = 30.0
+page_cache = QueryCache(max_bytes=4 * 1024 * 1024, ttl=PAGE_CACHE_TTL)
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Return this request thread's pooled connection"""
+    db.release()
+
+# Columns written by the streaming CSV/NDJSON exports
+ATTENDEE_EXPORT_FIELDS = ('id', 'name', 'email', 'role', 'registration_date')
+EVENT_REPORT_FIELDS = ('id', 'title', 'start', 'end', 'venue_name', 'organizer_name',
+                       'organizer_email', 'capacity', 'registered_count')
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_response(rows, fields, fmt, filename):
+    """
+    Stream rows (an iterator of dicts) as a CSV or NDJSON download. Output is
+    flushed every EXPORT_BATCH_SIZE rows, so memory stays flat and the header
+    reaches the client before the first batch is read.
+    """
+    if fmt not in EXPORT_MIMETYPES:
+        abort(404)
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if fmt == 'csv':
+            writer.writerow(fields)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        for n, row in enumerate(rows, 1):
+            if fmt == 'csv':
+                writer.writerow([csv_cell(row[f]) for f in fields])
+            else:
+                buf.write(json.dumps({f: row[f] for f in fields}) + '\n')
+            if n % EXPORT_BATCH_SIZE == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    # stream_with_context defers teardown (and the pooled connection's release) until the stream ends
+    return Response(stream_with_context(generate()), mimetype=EXPORT_MIMETYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{fmt}"',
+        'X-Accel-Buffering': 'no',
+    })
+
+def watch_other_workers():
+    """
+    Catch up with writes committed by other worker processes. Stale cached
+    reads are invalidated (DB.sync_cache). When the events or waitlist
+    version moves, the subscribed events are re-read and those whose counts
+    differ from what this process last saw are published.
+    """
+    last_version, seen = None, {}
+    while True:
+        time.sleep(WORKER_POLL_INTERVAL)
+        try:
+            db.sync_cache()
+            topics = seat_broker.topics()
+            if not topics:
+                continue
+            version = sum(v for v, _ in db.get_table_versions(('events', 'waitlist')).values())
+            if version == last_version and all(t in seen for t in topics):
+                continue
+            last_version = version
+            counts = db.get_seat_counts(topics)
+            current = {event_id: tuple(sorted((k, v) for k, v in c.items() if k != 'version'))
+                       for event_id, c in counts.items()}
+            changed = [(event_id, counts[event_id], counts[event_id]['version'])
+                       for event_id in topics if seen.get(event_id) != current[event_id]]
+            seen = current
+            if changed:
+                seat_broker.publish_many(changed)
+        except Exception:
+            app.logger.exception('Watching other workers failed')
+
+@app.before_request
+def load_current_user():
+    """Resolve the signed-in user from the server-side session, normally from the DB cache"""
+    g.user = None
+    sid = session.get('sid')
+    if sid:
+        user_id = db.get_session(sid)
+        if user_id is not None:
+            g.user = db.get_session_user(user_id)
+
+@app.context_processor
+def inject_current_user():
+    return {'current_user': g.get('user')}
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file; the built assets get their fingerprinted /assets/ URL"""
+    url_name = static_assets.url_name(filename)
+    if url_name == filename:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=url_name)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """A fingerprinted asset, pre-compressed in the best encoding the client accepts"""
+    built = static_assets.get(filename)
+    if built is None:
+        abort(404)
+    encoding = choose_encoding(request.accept_encodings)
+    response = Response(built.bodies[encoding], content_type=built.mimetype)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f'{built.etag}-{encoding or "identity"}')
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def anonymous_page_cache(key=None):
+    """
+    Serve a public page to anonymous visitors from page_cache, compressed
+    once per render rather than once per request. key() returns whatever else
+    the page shows, such as /about's statistics; it is part of the cache key,
+    so a change to it renders the page again right away. Only for pages that
+    show neither the user nor flash messages; signed-in users and query
+    strings bypass the cache.
+    """
+    from functools import wraps
+    def decorator(view):
+        @wraps(view)
+        def cached_view(*args, **kwargs):
+            if g.user or request.args:
+                return view(*args, **kwargs)
+            cache_key = (request.path, key() if key else None)
+            found, page, generation = page_cache.get(cache_key)
+            if not found:
+                body = view(*args, **kwargs).encode('utf-8')
+                page = (compress(body, fast=True), hashlib.sha1(body).hexdigest()[:24])
+                page_cache.put(cache_key, page, (), generation)
+            bodies, etag = page
+            # Signed-in users get a different page at the same URL
+            headers = {'ETag': f'"{etag}"', 'Vary': 'Cookie, Accept-Encoding'}
+            if not is_resource_modified(request.environ, etag=etag):
+                return Response(status=304, headers=headers)
+            encoding = choose_encoding(request.accept_encodings)
+            if encoding:
+                headers['Content-Encoding'] = encoding
+            return Response(bodies[encoding], mimetype='text/html', headers=headers)
+        return cached_view
+    return decorator
+
+def displayed_statistics():
+    """The counts about.html shows, read fresh from the one-row statistics rollup"""
+    stats = db.get_event_statistics()
+    return tuple(stats[k] for k in ('total_users', 'total_events', 'total_venues', 'total_registrations'))
+
+@app.template_filter('highlight')
+def highlight_filter(text):
+    """Escape search-result text and turn the DB's match markers into <mark> tags"""
+    if not text:
+        return text
+    return Markup(str(escape(text)).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
 
 @app.route('/')
+@anonymous_page_cache()
 def landing():
     """Beautiful landing page"""
     return render_template('landing.html')
 
 @app.route('/about')
+@anonymous_page_cache(key=displayed_statistics)
 def about():
     """About page"""
     stats = db.get_event_statistics()
     return render_template('about.html', stats=stats)
 
 @app.route('/creator')
+@anonymous_page_cache()
 def creator():
     """Creator/Developer page"""
     return render_template('creator.html')
@@ -29,15 +260,13 @@ def creator():
 @app.route('/login-page')
 def login_page():
     """Login page with mandatory authentication"""
-    if 'user_id' in session:
+    if g.user:
         return redirect(url_for('dashboard'))
     return render_template('login.html')
 
 @app.route('/login', methods=['POST'])
 def login():
     """Handle login"""
-    from werkzeug.security import check_password_hash
-    
     email = request.form.get('email', '').strip()
     password = request.form.get('password', '').strip()
     
@@ -45,21 +274,36 @@ def login():
         flash('Please enter your email address', 'error')
         return redirect(url_for('login_page'))
     
+    # Reject floods before doing any database or KDF work
+    wait = ip_throttle.hit(request.remote_addr) or email_throttle.hit(email.lower())
+    if wait:
+        flash(f'Too many sign-in attempts. Please try again in {int(wait) + 1} seconds.', 'error')
+        return redirect(url_for('login_page'))
+    
     user = db.get_user_by_email(email)
     if not user:
         flash('User not found. Please create an account first.', 'error')
         return redirect(url_for('login_page'))
     
     # Check password if password_hash exists
-    if len(user) > 4 and user[4] and not check_password_hash(user[4], password):
-        flash('Invalid password. Please try again.', 'error')
-        return redirect(url_for('login_page'))
+    if len(user) > 4 and user[4]:
+        # Don't hold a pooled connection while waiting on the KDF
+        db.release()
+        try:
+            valid = hasher.verify(user[4], password)
+        except HasherBusy:
+            flash('The server is busy signing people in. Please try again in a moment.', 'error')
+            return redirect(url_for('login_page'))
+        if not valid:
+            flash('Invalid password. Please try again.', 'error')
+            return redirect(url_for('login_page'))
+    
+    email_throttle.reset(email.lower())
     
-    # Store user in session
-    session['user_id'] = user[0]
-    session['user_name'] = user[1]
-    session['user_email'] = user[2]
-    session['user_role'] = user[3]
+    # Start a server-side session; the cookie only carries its id
+    session.clear()
+    session.permanent = True
+    session['sid'] = db.create_session(user[0], SESSION_TTL)
     
     flash(f'Welcome back, {user[1]}!', 'success')
     return redirect(url_for('dashboard'))
@@ -67,6 +311,8 @@ def login():
 @app.route('/logout')
 def logout():
     """Handle logout"""
+    if 'sid' in session:
+        db.delete_session(session['sid'])
     session.clear()
     flash('You have been logged out successfully', 'info')
     return redirect(url_for('landing'))
@@ -98,9 +344,17 @@ def register():
         flash('Please enter a valid email address', 'error')
         return render_template('register.html')
     
+    if ip_throttle.hit(request.remote_addr):
+        flash('Too many requests. Please try again shortly.', 'error')
+        return render_template('register.html')
+    
+    try:
+        password_hash = hasher.hash(password)
+    except HasherBusy:
+        flash('The server is busy. Please try again in a moment.', 'error')
+        return render_template('register.html')
+    
     try:
-        from werkzeug.security import generate_password_hash
-        password_hash = generate_password_hash(password)
         db.create_user_with_password(name, email, role, password_hash)
         flash(f'Account created successfully! You can now log in.', 'success')
         return redirect(url_for('login_page'))
@@ -113,7 +367,7 @@ def login_required(f):
     from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if not g.user:
             flash('Please log in to access this page', 'error')
             return redirect(url_for('login_page'))
         return f(*args, **kwargs)
@@ -125,10 +379,10 @@ def role_required(required_role):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if 'user_id' not in session:
+            if not g.user:
                 flash('Please log in to access this page', 'error')
                 return redirect(url_for('login_page'))
-            if session.get('user_role') != required_role:
+            if g.user['role'] != required_role:
                 flash('Access denied. Insufficient permissions.', 'error')
                 return redirect(url_for('dashboard'))
             return f(*args, **kwargs)
@@ -140,41 +394,66 @@ def role_required(required_role):
 def dashboard():
     """Main dashboard - redirects admins to admin panel"""
     # Redirect admins to admin panel
-    if session.get('user_role') == 'admin':
+    if g.user['role'] == 'admin':
         return redirect(url_for('admin_panel'))
     
     # Get some stats for the dashboard
-    events = db.get_events()
-    user_registrations = db.get_registrations_by_user(session['user_id'])
+    events = db.get_events(limit=6)  # Show only first 6 events
+    user_registrations = db.get_registrations_by_user(g.user['id'], limit=5)  # Show only first 5 registrations
     
     # Get events organized by current user if they're an organizer
     organized_events = []
-    if session.get('user_role') == 'organizer':
-        organized_events = db.get_events_by_organizer(session['user_id'])
+    if g.user['role'] == 'organizer':
+        organized_events = db.get_events_by_organizer(g.user['id'], limit=5)
     
     return render_template('dashboard.html', 
-                         events=events[:6],  # Show only first 6 events
-                         user_registrations=user_registrations[:5],  # Show only first 5 registrations
-                         organized_events=organized_events[:5])
+                         events=events,
+                         user_registrations=user_registrations,
+                         organized_events=organized_events)
 
 @app.route('/events')
 @login_required
 def events():
     """Browse all events - excludes events user organizes"""
     search = request.args.get('search', '').strip()
-    all_events = db.search_events(search) if search else db.get_events()
+    after = request.args.get('after')
+    window = date_window(request.args.get('from'), request.args.get('to'))
     
     # Filter out events where current user is the organizer
-    events = [event for event in all_events if event['organizer_id'] != session['user_id']]
+    if search:
+        events = db.search_events(search, limit=PAGE_SIZE, after=after,
+                                  exclude_organizer_id=g.user['id'])
+    elif window:
+        # One entry per occurrence in the window; recurring series are expanded on the fly
+        events = db.get_occurrences(wall_clock_epoch(window[0]),
+                                    wall_clock_epoch(window[1] + timedelta(days=1)),
+                                    limit=PAGE_SIZE, after=after, exclude_organizer_id=g.user['id'])
+    else:
+        events = db.get_events(limit=PAGE_SIZE, after=after,
+                               exclude_organizer_id=g.user['id'])
     
-    # Add registration count for each event
+    # Add registration count for each event (one aggregated query)
+    summary = db.get_registration_summary(g.user['id'], [event['id'] for event in events])
     for event in events:
-        event['registered_count'] = len(db.get_event_attendees(event['id']))
-        event['is_full'] = event['registered_count'] >= event['capacity']
-        event['is_registered'] = any(reg['event_id'] == event['id'] 
-                                   for reg in db.get_registrations_by_user(session['user_id']))
+        event.update(summary[event['id']])
     
-    return render_template('events.html', events=events, search=search)
+    # Carried by the pagination links; 'from' can't be a url_for keyword in templates
+    window_args = {'from': f'{window[0]:%Y-%m-%d}', 'to': f'{window[1]:%Y-%m-%d}'} if window and not search else {}
+    return render_template('events.html', events=events, search=search, window_args=window_args,
+                         after=after, next_cursor=events.next_cursor)
+
+def date_window(start, end):
+    """Parse ?from=YYYY-MM-DD&to=YYYY-MM-DD into an inclusive (first day, last day) pair, or None"""
+    if not start and not end:
+        return None
+    try:
+        first = datetime.strptime(start, '%Y-%m-%d') if start else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        last = datetime.strptime(end, '%Y-%m-%d') if end else first + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    except ValueError:
+        return None
+    if last < first:
+        first, last = last, first
+    return first, min(last, first + timedelta(days=MAX_WINDOW_DAYS - 1))
 
 @app.route('/event/<int:event_id>')
 @login_required
@@ -186,13 +465,24 @@ def event_detail(event_id):
         return redirect(url_for('events'))
     
     attendees = db.get_event_attendees(event_id)
-    is_registered = any(reg['event_id'] == event_id 
-                       for reg in db.get_registrations_by_user(session['user_id']))
+    is_registered = db.get_registration_summary(g.user['id'], [event_id])[event_id]['is_registered']
+    waitlist_position = None if is_registered else db.get_waitlist_position(g.user['id'], event_id)
+    
+    # Next dates of a recurring series, expanded from today (day granularity keeps the query cacheable)
+    recurrence = db.get_recurrence(event_id)
+    occurrences = []
+    if recurrence:
+        today = wall_clock_epoch(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0))
+        occurrences = db.get_occurrences(today, recurrence['last_ts'] + 1, limit=10, event_id=event_id)
     
     return render_template('event_detail.html', 
+                         recurrence=recurrence,
+                         occurrences=occurrences,
                          event=event, 
                          attendees=attendees, 
                          is_registered=is_registered,
+                         waitlist_position=waitlist_position,
+                         waitlist_count=db.get_waitlist_count(event_id),
                          registered_count=len(attendees))
 
 @app.route('/register_event/<int:event_id>', methods=['POST'])
@@ -200,30 +490,171 @@ def event_detail(event_id):
 def register_event(event_id):
     """Register for an event - admins and organizers of the event cannot register"""
     # Prevent admins from registering for events
-    if session.get('user_role') == 'admin':
+    if g.user['role'] == 'admin':
         flash('Administrators cannot register for events. Only attendees and organizers can register.', 'error')
         return redirect(url_for('event_detail', event_id=event_id))
     
     # Check if user is the organizer of this event
     event = db.get_event_with_organizer(event_id)
-    if event and event['organizer_id'] == session['user_id']:
+    if event and event['organizer_id'] == g.user['id']:
         flash('You cannot register for your own event as the organizer.', 'error')
         return redirect(url_for('event_detail', event_id=event_id))
     
     try:
-        db.register_user_for_event(session['user_id'], event_id)
+        ticket = admission.submit(g.user['id'], event_id)
+    except QueueFull:
+        flash('Registration is very busy right now. Please try again in a moment.', 'error')
+        return redirect(url_for('event_detail', event_id=event_id))
+    
+    # Scripted clients get the ticket straight away and poll for the outcome
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'ticket': ticket, 'status': 'pending',
+                        'status_url': url_for('registration_status_json', ticket=ticket)}), 202
+    
+    # Don't hold a pooled connection while the writer works through the queue
+    db.release()
+    result = admission.wait(ticket, ADMISSION_WAIT)
+    if result['status'] == 'pending':
+        return redirect(url_for('registration_status', ticket=ticket))
+    return registration_outcome(result)
+
+def registration_outcome(result):
+    """Flash a settled registration ticket's result and go back to the event"""
+    if result['status'] == 'registered':
         flash('Successfully registered for the event!', 'success')
+    else:
+        flash(f"Registration failed: {result['message']}", 'error')
+    return redirect(url_for('event_detail', event_id=result['event_id']))
+
+@app.route('/registration/<ticket>')
+@login_required
+def registration_status(ticket):
+    """Holding page for a queued registration; refreshes until the ticket settles"""
+    result = admission.result(ticket, g.user['id'])
+    if result is None:
+        abort(404)
+    if result['status'] != 'pending':
+        return registration_outcome(result)
+    event = db.get_event_with_organizer(result['event_id'])
+    return render_template('registration_pending.html', event=event, ticket=ticket)
+
+@app.route('/registration/<ticket>.json')
+@login_required
+def registration_status_json(ticket):
+    """Poll a registration ticket: status is pending, registered or failed"""
+    result = admission.result(ticket, g.user['id'])
+    if result is None:
+        return jsonify({'error': 'Unknown or expired ticket'}), 404
+    return jsonify(result)
+
+class SeatStream:
+    """
+    Server-Sent Events body for a seat subscription: the snapshot first, then
+    each newer change, or a keepalive comment when idle. Iterating it blocks a
+    thread per stream (the WSGI servers); asgi.py iterates it asynchronously
+    instead, so an idle stream there holds no thread.
+    """
+
+    def __init__(self, subscription, snapshot):
+        self.subscription = subscription
+        self.snapshot = snapshot
+        self.sent = {}
+
+    def message(self, counts):
+        fresh = {str(event_id): c for event_id, c in counts.items() if c['version'] >= self.sent.get(event_id, 0)}
+        self.sent.update((int(event_id), c['version']) for event_id, c in fresh.items())
+        return f'data: {json.dumps(fresh)}\n\n' if fresh else ''
+
+    def __iter__(self):
+        try:
+            yield ('retry: 5000\n' + self.message(self.snapshot)).encode()
+            while True:
+                changed = self.subscription.wait(SEAT_STREAM_KEEPALIVE)
+                if changed is None:
+                    return
+                yield (self.message(changed) or ': keepalive\n\n').encode()
+        finally:
+            self.close()
+
+    async def __aiter__(self):
+        try:
+            yield ('retry: 5000\n' + self.message(self.snapshot)).encode()
+            while True:
+                changed = await self.subscription.wait_async(SEAT_STREAM_KEEPALIVE)
+                if changed is None:
+                    return
+                yield (self.message(changed) or ': keepalive\n\n').encode()
+        finally:
+            self.close()
+
+    def close(self):
+        self.subscription.close()
+
+@app.route('/events/seats')
+@login_required
+def seat_stream():
+    """
+    Server-Sent Events stream of seat counts for ?ids=1,2,3: the current
+    counts first, then a message whenever a registration, cancellation,
+    waitlist change or capacity edit for one of those events commits
+    """
+    try:
+        event_ids = list(dict.fromkeys(int(i) for i in request.args.get('ids', '').split(',') if i.strip()))
+    except ValueError:
+        abort(400)
+    try:
+        subscription = seat_broker.subscribe(event_ids, loop=request.environ.get(ASGI_LOOP_KEY))
+    except ValueError:
+        abort(400)
+    except TooManySubscribers:
+        return Response('Too many live connections', status=503, headers={'Retry-After': '30'})
+    # Subscribe first, then read: a change committed in between is either in the
+    # snapshot or delivered afterwards, and versions put the two in order
+    snapshot = db.get_seat_counts(event_ids)
+    # The stream can stay open for hours; it must not hold a pooled connection
+    db.release()
+    # direct_passthrough hands the SeatStream itself to the server rather than an encoding wrapper
+    return Response(SeatStream(subscription, snapshot), mimetype='text/event-stream', direct_passthrough=True,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/join_waitlist/<int:event_id>', methods=['POST'])
+@login_required
+def join_waitlist(event_id):
+    """Queue for a full event; registers straight away if a seat has opened"""
+    if g.user['role'] == 'admin':
+        flash('Administrators cannot register for events. Only attendees and organizers can register.', 'error')
+        return redirect(url_for('event_detail', event_id=event_id))
+    
+    event = db.get_event_with_organizer(event_id)
+    if event and event['organizer_id'] == g.user['id']:
+        flash('You cannot register for your own event as the organizer.', 'error')
+        return redirect(url_for('event_detail', event_id=event_id))
+    
+    try:
+        result = db.join_waitlist(g.user['id'], event_id)
+        if result['status'] == 'registered':
+            flash('A seat was available, so you are now registered for the event!', 'success')
+        else:
+            flash(f"You're #{result['position']} on the waitlist. We'll register you automatically when a seat opens.", 'info')
     except Exception as e:
-        flash(f'Registration failed: {str(e)}', 'error')
+        flash(f'Could not join the waitlist: {str(e)}', 'error')
     
     return redirect(url_for('event_detail', event_id=event_id))
 
+@app.route('/leave_waitlist/<int:event_id>', methods=['POST'])
+@login_required
+def leave_waitlist(event_id):
+    """Give up a place on an event's waitlist"""
+    if db.leave_waitlist(g.user['id'], event_id):
+        flash('You have left the waitlist', 'info')
+    return redirect(url_for('event_detail', event_id=event_id))
+
 @app.route('/unregister_event/<int:event_id>', methods=['POST'])
 @login_required
 def unregister_event(event_id):
     """Unregister from an event"""
     try:
-        db.unregister_user_from_event(session['user_id'], event_id)
+        db.unregister_user_from_event(g.user['id'], event_id)
         flash('Successfully unregistered from the event', 'info')
     except Exception as e:
         flash(f'Unregistration failed: {str(e)}', 'error')
@@ -233,27 +664,22 @@ def unregister_event(event_id):
 @app.route('/my-registrations')
 @login_required
 def my_registrations():
-    """User's registrations"""
-    registrations = db.get_registrations_by_user(session['user_id'])
-    
-    # Add status to each registration
-    for reg in registrations:
-        if reg.get('start'):
-            try:
-                start_dt = datetime.fromisoformat(reg['start'].replace('T', ' '))
-                now = datetime.now()
-                if start_dt < now:
-                    reg['status'] = 'past'
-                elif start_dt - now < timedelta(days=1):
-                    reg['status'] = 'soon'
-                else:
-                    reg['status'] = 'upcoming'
-            except:
-                reg['status'] = 'unknown'
-        else:
-            reg['status'] = 'tbd'
-    
-    return render_template('my_registrations.html', registrations=registrations)
+    """User's registrations; ?show=upcoming or ?show=past filters in the query"""
+    show = request.args.get('show')
+    if show not in ('upcoming', 'past'):
+        show = None
+    registrations = db.get_registrations_by_user(g.user['id'], when=show)
+    return render_template('my_registrations.html', registrations=registrations, show=show)
+
+def add_attendee_stats(events, shown_event_id=None):
+    """
+    Set each event's registered_count from one summary query, and its
+    attendees list only for shown_event_id, the one whose list is open
+    """
+    summary = db.get_registration_summary(event_ids=[event['id'] for event in events])
+    for event in events:
+        event['registered_count'] = summary[event['id']]['registered_count']
+        event['attendees'] = db.get_event_attendees(event['id']) if event['id'] == shown_event_id else None
 
 @app.route('/organizer')
 @login_required
@@ -263,14 +689,8 @@ def organizer_panel():
     Shows user's created events and management tools
     Connected to: Dashboard (navigation), Create Event (event creation), Event management
     """
-    events = db.get_events_by_organizer(session['user_id'])
-    
-    # Add stats to each event - inline comments for functionality
-    for event in events:
-        attendees = db.get_event_attendees(event['id'])  # Get all registered users
-        event['registered_count'] = len(attendees)       # Count registrations
-        event['attendees'] = attendees                   # Store attendee data for management
-    
+    events = db.get_events_by_organizer(g.user['id'])
+    add_attendee_stats(events, request.args.get('attendees', type=int))
     return render_template('organizer.html', events=events)
 
 @app.route('/my-events')  # Alternative route for clarity
@@ -283,14 +703,8 @@ def my_events_redirect():
 @login_required
 def my_events():
     """User's created events (if they've created any)"""
-    created_events = db.get_events_by_organizer(session['user_id'])
-    
-    # Add stats to each event
-    for event in created_events:
-        attendees = db.get_event_attendees(event['id'])
-        event['registered_count'] = len(attendees)
-        event['attendees'] = attendees
-    
+    created_events = db.get_events_by_organizer(g.user['id'])
+    add_attendee_stats(created_events, request.args.get('attendees', type=int))
     return render_template('my_events.html', events=created_events)
 
 @app.route('/create-event', methods=['GET', 'POST'])
@@ -303,7 +717,7 @@ def create_event():
     Connected to: Organizer panel (management), Dashboard (navigation)
     """
     # Prevent admins from creating events
-    if session.get('user_role') == 'admin':
+    if g.user['role'] == 'admin':
         flash('Administrators cannot create events. Only attendees and organizers can create events.', 'error')
         return redirect(url_for('admin_panel'))
     
@@ -320,6 +734,7 @@ def create_event():
     start_time = request.form.get('start_time', '').strip()
     end_date = request.form.get('end_date', '').strip()
     end_time = request.form.get('end_time', '').strip()
+    repeat = request.form.get('repeat', 'none')
     
     # Validation
     if not all([title, venue_id, capacity, start_date, start_time]):
@@ -327,6 +742,20 @@ def create_event():
         venues = db.get_venues()
         return render_template('create_event.html', venues=venues)
     
+    # Recurring series are stored as one RRULE, e.g. FREQ=WEEKLY;COUNT=52
+    rrule = None
+    if repeat in ('daily', 'weekly', 'monthly'):
+        ends = request.form.get('repeat_ends', 'count')
+        try:
+            rrule = format_rrule(repeat, request.form.get('repeat_interval') or 1,
+                                 count=request.form.get('repeat_count') if ends == 'count' else None,
+                                 until=request.form.get('repeat_until') if ends == 'until' else None)
+            parse_rrule(rrule)
+        except ValueError as e:
+            flash(str(e), 'error')
+            venues = db.get_venues()
+            return render_template('create_event.html', venues=venues)
+    
     try:
         capacity = int(capacity)
         venue_id = int(venue_id)
@@ -351,21 +780,24 @@ def create_event():
         venues = db.get_venues()
         return render_template('create_event.html', venues=venues)
     
-    # Check venue availability for the requested time slot
-    end_check = end_datetime if end_datetime else start_datetime
-    if not db.check_venue_availability(venue_id, start_datetime, end_check):
-        flash('This venue is already booked for the selected date and time. Please choose a different time or venue.', 'error')
+    # Check venue availability for the requested time slot (every occurrence of a series, in one query)
+    conflicts = db.find_venue_conflicts(venue_id, start_datetime, end_datetime, rrule=rrule)
+    if conflicts:
+        if rrule:
+            flash(f'This venue is already booked on {conflicts[0]["start"]} ("{conflicts[0]["title"]}"), '
+                  f'one of {len(conflicts)} clash(es) with this series. Please choose a different time or venue.', 'error')
+        else:
+            flash(f'This venue is already booked for the selected date and time ("{conflicts[0]["title"]}"). Please choose a different time or venue.', 'error')
         venues = db.get_venues()
         return render_template('create_event.html', venues=venues)
     
     try:
-        event_id = db.create_event(title, description, venue_id, session['user_id'], 
-                       capacity, start_datetime, end_datetime)
+        event_id = db.create_event(title, description, venue_id, g.user['id'], 
+                       capacity, start_datetime, end_datetime, rrule=rrule)
         
         # Update user role to organizer if they created an event and aren't admin
-        if session.get('user_role') == 'attendee':
-            db.update_user_role(session['user_id'], 'organizer')
-            session['user_role'] = 'organizer'
+        if g.user['role'] == 'attendee':
+            db.update_user_role(g.user['id'], 'organizer')
         
         flash('Event created successfully!', 'success')
         return redirect(url_for('my_events'))
@@ -384,7 +816,7 @@ def edit_event(event_id):
         return redirect(url_for('events'))
     
     # Check if user can edit (event creator or admin)
-    if event['organizer_id'] != session['user_id'] and session['user_role'] != 'admin':
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
         flash('You can only edit events you created', 'error')
         return redirect(url_for('event_detail', event_id=event_id))
     
@@ -442,7 +874,7 @@ def manage_event(event_id):
         return redirect(url_for('my_events'))
     
     # Check if user can manage (event creator or admin)
-    if event['organizer_id'] != session['user_id'] and session['user_role'] != 'admin':
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
         flash('You can only manage events you created', 'error')
         return redirect(url_for('events'))
     
@@ -461,6 +893,22 @@ def manage_event(event_id):
                          registered_count=registered_count,
                          venue=venue)
 
+@app.route('/manage_event/<int:event_id>/attendees.<fmt>')
+@login_required
+def export_attendees(event_id, fmt):
+    """Stream an event's attendee list as CSV or NDJSON (event creator or admin)"""
+    event = db.get_event_with_organizer(event_id)
+    if not event:
+        flash('Event not found', 'error')
+        return redirect(url_for('my_events'))
+    
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
+        flash('You can only export attendees for events you created', 'error')
+        return redirect(url_for('events'))
+    
+    return export_response(db.iter_event_attendees(event_id), ATTENDEE_EXPORT_FIELDS,
+                           fmt, f'event-{event_id}-attendees')
+
 @app.route('/delete_event/<int:event_id>', methods=['POST'])
 @login_required
 def delete_event(event_id):
@@ -471,7 +919,7 @@ def delete_event(event_id):
         return redirect(url_for('events'))
     
     # Check if user can delete (event creator or admin)
-    if event['organizer_id'] != session['user_id'] and session['user_role'] != 'admin':
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
         flash('You can only delete events you created', 'error')
         return redirect(url_for('event_detail', event_id=event_id))
     
@@ -493,7 +941,7 @@ def remove_attendee(event_id, user_id):
         return redirect(url_for('events'))
     
     # Check if user can remove attendees (event creator or admin)
-    if event['organizer_id'] != session['user_id'] and session['user_role'] != 'admin':
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
         flash('You can only manage attendees for events you created', 'error')
         return redirect(url_for('event_detail', event_id=event_id))
     
@@ -510,25 +958,28 @@ def remove_attendee(event_id, user_id):
 def admin_panel():
     """Admin panel"""
     stats = db.get_event_statistics()
-    events = db.get_events()
-    
-    # Add registration count to each event for display
-    for event in events:
-        event['registered_count'] = len(db.get_event_attendees(event['id']))
-    
-    return render_template('admin.html', stats=stats, events=events)
+    return render_template('admin.html', stats=stats)
 
 @app.route('/admin/events')
 @role_required('admin')
 def admin_events():
     """Admin event management - dedicated events page"""
-    events = db.get_events()
+    after = request.args.get('after')
+    events = db.get_events(limit=PAGE_SIZE, after=after)
     
     # Add registration count to each event for display
+    summary = db.get_registration_summary(event_ids=[event['id'] for event in events])
     for event in events:
-        event['registered_count'] = len(db.get_event_attendees(event['id']))
+        event['registered_count'] = summary[event['id']]['registered_count']
     
-    return render_template('admin_events.html', events=events)
+    return render_template('admin_events.html', events=events,
+                         after=after, next_cursor=events.next_cursor)
+
+@app.route('/admin/events/export.<fmt>')
+@role_required('admin')
+def export_event_report(fmt):
+    """Stream a report of every event with its seat counts as CSV or NDJSON"""
+    return export_response(db.iter_event_report(), EVENT_REPORT_FIELDS, fmt, 'events-report')
 
 @app.route('/admin/event/<int:event_id>')
 @role_required('admin')
@@ -554,6 +1005,30 @@ def admin_event_detail(event_id):
                          venue=venue,
                          registered_count=len(attendees))
 
+@app.route('/admin/metrics')
+@role_required('admin')
+def admin_metrics():
+    """Per-route timings and SQL accounting from the request profiler"""
+    metrics = profiler.snapshot() if profiler else None
+    return render_template('admin_metrics.html', metrics=metrics,
+                           since=datetime.fromtimestamp(metrics['since']) if metrics else None)
+
+@app.route('/admin/metrics.txt')
+@role_required('admin')
+def admin_metrics_prometheus():
+    """The same counters in Prometheus text exposition format"""
+    if not profiler:
+        abort(404)
+    return Response(profiler.prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/metrics/reset', methods=['POST'])
+@role_required('admin')
+def admin_metrics_reset():
+    if profiler:
+        profiler.reset()
+        flash('Metrics reset', 'success')
+    return redirect(url_for('admin_metrics'))
+
 @app.route('/admin/users')
 @role_required('admin')
 def admin_users():
@@ -593,17 +1068,64 @@ def create_venue():
 @role_required('admin')
 def delete_user(user_id):
     """Delete user"""
-    if user_id == session['user_id']:
+    if user_id == g.user['id']:
         flash('Cannot delete your own account', 'error')
         return redirect(url_for('admin_users'))
     
     try:
-        db.delete_user(user_id)
-        flash('User deleted successfully', 'success')
+        counts = db.delete_users([user_id])
     except Exception as e:
         flash(f'Error deleting user: {str(e)}', 'error')
-    
-    return redirect(url_for('admin_users'))
+        return redirect(url_for('admin_users'))
+    return bulk_delete_response(counts, 'users', 'admin_users')
+
+def bulk_ids():
+    """Ids posted by a bulk admin action, as form checkboxes or a JSON {"ids": [...]} body"""
+    data = request.get_json(silent=True)
+    raw = data.get('ids', []) if isinstance(data, dict) else request.form.getlist('ids')
+    try:
+        return sorted({int(i) for i in raw})
+    except (TypeError, ValueError):
+        abort(400)
+
+def bulk_delete_response(counts, noun, redirect_to):
+    """JSON callers get the per-table counts; the admin pages get a flash message"""
+    if request.is_json:
+        return jsonify(counts)
+    removed = counts.get(noun, 0)
+    if removed:
+        details = ', '.join(f'{n} {table}' for table, n in counts.items() if table != noun and n)
+        flash(f'Deleted {removed} {noun}' + (f' ({details} removed with them)' if details else ''), 'success')
+    else:
+        flash(f'No {noun} were deleted', 'error')
+    return redirect(url_for(redirect_to))
+
+@app.route('/admin/users/delete', methods=['POST'])
+@role_required('admin')
+def delete_users():
+    """Delete the selected users in one transaction"""
+    ids = [user_id for user_id in bulk_ids() if user_id != g.user['id']]
+    try:
+        counts = db.delete_users(ids)
+    except Exception as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 500
+        flash(f'Error deleting users: {str(e)}', 'error')
+        return redirect(url_for('admin_users'))
+    return bulk_delete_response(counts, 'users', 'admin_users')
+
+@app.route('/admin/events/delete', methods=['POST'])
+@role_required('admin')
+def delete_events():
+    """Delete the selected events in one transaction"""
+    try:
+        counts = db.delete_events(bulk_ids())
+    except Exception as e:
+        if request.is_json:
+            return jsonify({'error': str(e)}), 500
+        flash(f'Error deleting events: {str(e)}', 'error')
+        return redirect(url_for('admin_events'))
+    return bulk_delete_response(counts, 'events', 'admin_events')
 
 @app.route('/admin/delete_event/<int:event_id>', methods=['POST'])
 @role_required('admin')
@@ -628,6 +1150,185 @@ def admin_delete_event(event_id):
     
     return redirect(url_for('admin_panel'))
 
+# JSON API (v1) for mobile and kiosk clients. Read-only views over the same
+# DB methods as the pages, with ?fields= selection and keyset pagination
+# (?limit=&after=). Every response carries an ETag and Last-Modified built
+# from the table_versions counters, so an unchanged poll is answered 304
+# after one read of that tiny table.
+API_MAX_LIMIT = 100
+
+# Fields each resource can return; ?fields= picks a subset. Time-dependent
+# values (like an event's computed status) are left out, because they can
+# change without any table changing and would defeat the ETags.
+API_EVENT_FIELDS = ('id', 'title', 'description', 'capacity', 'start', 'end', 'venue_name', 'venue_address',
+                    'organizer_id', 'organizer_name', 'registered_count', 'is_full', 'is_registered')
+API_EVENT_DETAIL_FIELDS = API_EVENT_FIELDS + ('venue_id', 'recurrence', 'waitlist_count', 'waitlist_position')
+API_ATTENDEE_FIELDS = ('id', 'name', 'email', 'role', 'registration_date')
+API_REGISTRATION_FIELDS = ('event_id', 'event_title', 'description', 'capacity', 'start', 'end',
+                           'venue_name', 'venue_address', 'organizer_name', 'registration_date')
+API_VENUE_FIELDS = ('id', 'name', 'address', 'capacity')
+
+# Tables each resource is read from
+API_EVENT_TABLES = ('events', 'schedules', 'recurrences', 'venues', 'users', 'registrations')
+API_EVENT_DETAIL_TABLES = API_EVENT_TABLES + ('waitlist',)
+
+def api_error(status, message):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+def api_login_required(f):
+    """Like login_required, but answers 401 JSON instead of redirecting to the login page"""
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not g.user:
+            return api_error(401, 'Authentication required')
+        return f(*args, **kwargs)
+    return decorated_function
+
+def api_fields(allowed):
+    """The fields requested with ?fields=a,b (all allowed fields by default); aborts 400 on unknown ones"""
+    requested = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        abort(api_error(400, f"Unknown field(s) {', '.join(unknown)}; choose from {', '.join(allowed)}"))
+    return requested or list(allowed)
+
+def api_limit():
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        abort(api_error(400, 'limit must be a whole number'))
+    return max(1, min(limit, API_MAX_LIMIT))
+
+def api_not_modified(tables, *key):
+    """
+    Compute the response validators from the versions of tables plus key
+    (whatever else the body depends on: the user, resolved filters). Returns a
+    304 response if the client's copy is current, else None and leaves the
+    validators for api_response.
+    """
+    # Versions are read before the data, so a racing write can only make the ETag older than the body
+    versions = db.get_table_versions(tables)
+    digest = hashlib.sha1(repr((request.path, sorted(request.args.items(multi=True)),
+                                sorted(versions.items()), key)).encode()).hexdigest()
+    g.api_etag = digest[:24]
+    g.api_last_modified = datetime.fromtimestamp(max(updated for _, updated in versions.values()), timezone.utc)
+    if is_resource_modified(request.environ, etag=g.api_etag, last_modified=g.api_last_modified):
+        return None
+    return api_response(None, 304)
+
+def api_response(body, status=200):
+    """JSON response carrying the validators from api_not_modified; clients must revalidate each time"""
+    response = jsonify(body) if body is not None else Response(status=status)
+    response.status_code = status
+    response.set_etag(g.api_etag)
+    response.last_modified = g.api_last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def api_page(rows, fields, next_cursor):
+    """Envelope for a list: the selected fields of each row and a link to the next page"""
+    args = request.args.to_dict()
+    args['after'] = next_cursor
+    return {
+        'data': [{f: row.get(f) for f in fields} for row in rows],
+        'next_cursor': next_cursor,
+        'next': url_for(request.endpoint, **request.view_args, **args) if next_cursor else None,
+    }
+
+@app.route('/api/v1/events')
+@api_login_required
+def api_events():
+    """Events by start (?q= searches, ?from=&to= lists each occurrence in a date window)"""
+    fields = api_fields(API_EVENT_FIELDS)
+    limit, after = api_limit(), request.args.get('after')
+    search = request.args.get('q', '').strip()
+    window = None if search else date_window(request.args.get('from'), request.args.get('to'))
+    not_modified = api_not_modified(API_EVENT_TABLES, g.user['id'], window)
+    if not_modified:
+        return not_modified
+    
+    if search:
+        events = db.search_events(search, limit=limit, after=after)
+    elif window:
+        events = db.get_occurrences(wall_clock_epoch(window[0]), wall_clock_epoch(window[1] + timedelta(days=1)),
+                                    limit=limit, after=after)
+    else:
+        events = db.get_events(limit=limit, after=after)
+    summary = db.get_registration_summary(g.user['id'], [event['id'] for event in events])
+    for event in events:
+        event.update(summary[event['id']])
+    return api_response(api_page(events, fields, events.next_cursor))
+
+@app.route('/api/v1/events/<int:event_id>')
+@api_login_required
+def api_event(event_id):
+    """One event with its seat counts, series rule and the caller's waitlist place"""
+    fields = api_fields(API_EVENT_DETAIL_FIELDS)
+    not_modified = api_not_modified(API_EVENT_DETAIL_TABLES, g.user['id'])
+    if not_modified:
+        return not_modified
+    
+    event = db.get_event_with_organizer(event_id)
+    if not event:
+        return api_error(404, 'Event not found')
+    event.update(db.get_registration_summary(g.user['id'], [event_id])[event_id])
+    recurrence = db.get_recurrence(event_id)
+    event['recurrence'] = recurrence and {k: recurrence[k] for k in ('rrule', 'summary', 'last_start')}
+    event['waitlist_count'] = db.get_waitlist_count(event_id)
+    event['waitlist_position'] = None if event['is_registered'] else db.get_waitlist_position(g.user['id'], event_id)
+    return api_response({f: event.get(f) for f in fields})
+
+@app.route('/api/v1/events/<int:event_id>/attendees')
+@api_login_required
+def api_event_attendees(event_id):
+    """An event's attendees in sign-up order (event creator or admin)"""
+    event = db.get_event_with_organizer(event_id)
+    if not event:
+        return api_error(404, 'Event not found')
+    if event['organizer_id'] != g.user['id'] and g.user['role'] != 'admin':
+        return api_error(403, 'Only the event organizer can list attendees')
+    fields = api_fields(API_ATTENDEE_FIELDS)
+    limit = api_limit()
+    not_modified = api_not_modified(('registrations', 'users'))
+    if not_modified:
+        return not_modified
+    
+    attendees = db.get_event_attendees(event_id, limit=limit, after=request.args.get('after'))
+    return api_response(api_page(attendees, fields, attendees.next_cursor))
+
+@app.route('/api/v1/registrations')
+@api_login_required
+def api_registrations():
+    """The caller's registrations by event start; ?show=upcoming or ?show=past filters"""
+    fields = api_fields(API_REGISTRATION_FIELDS)
+    limit = api_limit()
+    show = request.args.get('show')
+    if show not in (None, 'upcoming', 'past'):
+        return api_error(400, 'show must be upcoming or past')
+    # Which events count as upcoming changes with the clock, so the filtered lists revalidate each minute
+    clock = int(time.time() // 60) if show else None
+    not_modified = api_not_modified(('registrations', 'events', 'schedules', 'venues', 'users'), g.user['id'], clock)
+    if not_modified:
+        return not_modified
+    
+    registrations = db.get_registrations_by_user(g.user['id'], limit=limit, after=request.args.get('after'), when=show)
+    return api_response(api_page(registrations, fields, registrations.next_cursor))
+
+@app.route('/api/v1/venues')
+@api_login_required
+def api_venues():
+    """All venues (a short list, so not paginated)"""
+    fields = api_fields(API_VENUE_FIELDS)
+    not_modified = api_not_modified(('venues',))
+    if not_modified:
+        return not_modified
+    
+    return api_response({'data': [{f: venue[f] for f in fields} for venue in db.get_venues()], 'next_cursor': None, 'next': None})
+
 # AI Chat Feature
 @app.route('/api/chat', methods=['POST'])
 @login_required
@@ -687,5 +1388,25 @@ def generate_ai_response(message):
         # More helpful default response with context
         return f"🤖 **Great question!** I'm your Event Planning Assistant, and I'd love to help you with:\n\n🎯 **Event Creation**: venue selection, timing, capacity, descriptions\n🎟️ **Event Attendance**: finding events, registration tips, networking\n⚙️ **Platform Help**: navigation, features, troubleshooting\n\n💬 **Try asking me about:**\n• \"How do I create an engaging event?\"\n• \"What's the best venue for my event?\"\n• \"How do I network effectively?\"\n• \"When should I schedule my event?\"\n\nWhat would you like help with today?"
 
+def start():
+    """Open the database and start the app's helpers"""
+    global db, admission, static_assets
+    db = DB(os.environ.get('EVENTS_DB'), profiler=profiler, shared=WORKERS > 1)
+    admission = AdmissionQueue(db, batch_size=256, max_pending=10000)
+    db.seat_listeners.append(
+        lambda counts: seat_broker.publish_many((event_id, c, c['version']) for event_id, c in counts.items()))
+    static_assets = StaticAssets(app.static_folder)
+    if WORKERS > 1:
+        threading.Thread(target=watch_other_workers, name='worker-watcher', daemon=True).start()
+
+# The password hashing pool spawns its workers, and a spawned process first
+# re-runs the main script as __mp_main__; under `python app.py` that is this
+# file. Those workers only call into passwords.py, so they skip start() rather
+# than each opening, migrating and seeding the database and building the assets.
+if __name__ != '__mp_main__':
+    start()
+
 if __name__ == '__main__':
+    # The debug server rebuilds an asset when its source file changes
+    static_assets.reload = True
     app.run(debug=True, host='0.0.0.0', port=5003)
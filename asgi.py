@@ -0,0 +1,233 @@
+"""
+ASGI entry point: the Flask app served from an event loop.
+
+    python3 serve.py --workers 4        # uvicorn, four processes
+    uvicorn asgi:app                    # or any ASGI server
+
+Connections belong to the event loop, so a thousand open, idle or slow
+connections cost a thousand small objects instead of a thousand threads.
+Each request's Flask work (blocking sqlite3 calls and template rendering)
+runs on a bounded pool of EVENTS_THREADS threads; once EVENTS_MAX_QUEUED
+requests are already waiting for it, new ones get an immediate 503.
+Seat streams (/events/seats) wait on the loop and hold no thread between
+messages.
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, admission, db, hasher, ASGI_LOOP_KEY, WORKERS
+
+THREADS = int(os.environ.get('EVENTS_THREADS', '16'))
+MAX_QUEUED = int(os.environ.get('EVENTS_MAX_QUEUED', '1024'))
+# Chunks of a streamed export read ahead of what the client has taken
+STREAM_AHEAD = 4
+
+
+class WSGIBridge:
+    """Run a WSGI app for an ASGI server, on a bounded thread pool"""
+
+    def __init__(self, wsgi_app, threads=THREADS, max_queued=MAX_QUEUED):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='asgi-worker')
+        self.max_in_flight = threads + max_queued
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        # Only the loop touches in_flight, so it needs no lock
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            await _send_plain(send, 503, b'Server busy, please retry', [(b'retry-after', b'1')])
+            return
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            environ = _environ(scope, await _read_body(receive), loop)
+            status, headers, body, stream = await loop.run_in_executor(self.executor, self._call, environ)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if stream is None:
+                await send({'type': 'http.response.body', 'body': body})
+                return
+        finally:
+            self.in_flight -= 1
+        await self._stream(stream, receive, send)
+
+    def _call(self, environ):
+        """Run the app in a pool thread; read the whole body unless it is a stream"""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        # Bodies Flask knows the length of are complete; anything else (exports, seat streams) is streamed
+        if hasattr(result, '__aiter__') or not any(k == b'content-length' for k, _ in started['headers']):
+            return started['status'], started['headers'], None, result
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], body, None
+
+    async def _stream(self, stream, receive, send):
+        if not hasattr(stream, '__aiter__'):
+            await self._stream_sync(stream, receive, send)
+            return
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        # The aiter()/anext() builtins would need Python 3.10
+        chunks = stream.__aiter__()
+        try:
+            while True:
+                step = asyncio.ensure_future(chunks.__anext__())
+                done, _ = await asyncio.wait({step, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if step not in done:
+                    step.cancel()
+                    return
+                try:
+                    chunk = step.result()
+                except StopAsyncIteration:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    async def _stream_sync(self, stream, receive, send):
+        """
+        Stream a sync body (the CSV/NDJSON exports). One pool thread runs the
+        whole iteration and the close, as stream_with_context needs: Flask's
+        contexts and the thread's pooled connection stay on the thread that
+        set them up. It stays at most STREAM_AHEAD chunks ahead of the client.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        credits = threading.Semaphore(STREAM_AHEAD)
+        stop = threading.Event()
+        pump = loop.run_in_executor(self.executor, _pump, stream, loop, chunks, credits, stop)
+        disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            while True:
+                step = asyncio.ensure_future(chunks.get())
+                done, _ = await asyncio.wait({step, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if step not in done:
+                    step.cancel()
+                    return
+                chunk = step.result()
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                credits.release()
+            # Raises whatever ended the iteration early
+            await pump
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            stop.set()
+            credits.release()
+            # The stream is closed (and the request torn down) by the pump, once its current chunk is done
+            await asyncio.wait({pump})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, self.close)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        admission.close()
+        hasher.close()
+        db.close()
+
+
+def _environ(scope, body, loop):
+    """The WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': WORKERS > 1,
+        'wsgi.run_once': False,
+        ASGI_LOOP_KEY: loop,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]}, {value}' if key in environ else value
+    return environ
+
+
+def _pump(stream, loop, chunks, credits, stop):
+    """Iterate and close a sync body on the calling thread, handing chunks to the loop"""
+    try:
+        for chunk in stream:
+            credits.acquire()
+            if stop.is_set():
+                break
+            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+    finally:
+        try:
+            if hasattr(stream, 'close'):
+                stream.close()
+        finally:
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _send_plain(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'text/plain; charset=utf-8'), (b'content-length', str(len(body)).encode()), *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = WSGIBridge(flask_app)
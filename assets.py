@@ -0,0 +1,193 @@
+"""
+Fingerprinted, minified and pre-compressed static assets.
+
+Each asset is built once, when the app starts: its comments and layout
+whitespace are stripped, it is named after a hash of the result
+(css/style.1a2b3c4d5e.css) and gzip and, when the brotli module is
+installed, brotli copies are made up front. Pages link to the fingerprinted
+URL, so it can be cached forever; any edit changes the name.
+
+    python3 assets.py                  # sizes before and after
+    python3 assets.py --out dist       # write the files for a front proxy
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sys
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Sources under static/ that are built; others are served as they are by Flask
+ASSETS = ('css/style.css', 'js/main.js')
+
+MIMETYPES = {'.css': 'text/css; charset=utf-8', '.js': 'text/javascript; charset=utf-8'}
+
+# Preferred first when a client accepts several
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+Asset = namedtuple('Asset', 'name url_name mimetype etag bodies mtime')
+
+
+def minify_css(text):
+    """Drop comments and layout whitespace; strings and url() values are left alone"""
+    out = []
+    for token in re.split(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\([^)]*\))''', text):
+        if token[:1] in ('"', "'") or token.startswith('url('):
+            out.append(token)
+            continue
+        token = re.sub(r'/\*.*?\*/', '', token, flags=re.S)
+        token = re.sub(r'\s+', ' ', token)
+        token = re.sub(r' ?([{};,>]) ?', r'\1', token)
+        # "a:hover" and "a :hover" differ, so only declaration colons lose their space
+        token = re.sub(r': ', ':', token)
+        out.append(token.replace(';}', '}'))
+    return ''.join(out).strip()
+
+
+def minify_js(text):
+    """
+    Drop comments and indentation. Line breaks are kept so automatic
+    semicolon insertion reads the code as before. Strings and template
+    literals are copied verbatim; a regex literal must not contain // or /*.
+    """
+    lines, line, code = [], [], []
+    i, n = 0, len(text)
+
+    def flush_code():
+        line.append(re.sub(r'\s+', ' ', ''.join(code)))
+        code.clear()
+
+    while i < n:
+        c = text[i]
+        if c in '\'"`':
+            j = i + 1
+            while j < n and text[j] != c:
+                j += 2 if text[j] == '\\' else 1
+            flush_code()
+            line.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith('//', i):
+            i = text.find('\n', i)
+            i = n if i < 0 else i
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            i = n if j < 0 else j + 2
+            code.append(' ')
+        elif c == '\n':
+            flush_code()
+            lines.append(''.join(line).strip())
+            line = []
+            i += 1
+        else:
+            code.append(c)
+            i += 1
+    flush_code()
+    lines.append(''.join(line).strip())
+    return '\n'.join(l for l in lines if l)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def compress(body, fast=False):
+    """
+    {encoding: bytes} for body as is (None) and each of ENCODINGS. fast trades
+    some size for speed, for content rebuilt while serving (cached pages).
+    """
+    bodies = {None: body, 'gzip': gzip.compress(body, 6 if fast else 9, mtime=0)}
+    if brotli:
+        bodies['br'] = brotli.compress(body, quality=5 if fast else 11)
+    return bodies
+
+
+def build(static_folder, name):
+    """Build one asset from static_folder/name"""
+    path = os.path.join(static_folder, name)
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    stem, ext = os.path.splitext(name)
+    body = MINIFIERS[ext](source).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:10]
+    return Asset(name, f'{stem}.{digest}{ext}', MIMETYPES[ext], digest, compress(body), os.path.getmtime(path))
+
+
+class StaticAssets:
+    """
+    The built ASSETS of an app, looked up by source name (for links) or by
+    fingerprinted name (for serving). With reload=True, as under the debug
+    server, an asset whose source has changed is rebuilt on its next use.
+    """
+
+    def __init__(self, static_folder, names=ASSETS, reload=False):
+        self.static_folder = static_folder
+        self.reload = reload
+        self._by_name = {}
+        self._by_url_name = {}
+        for name in names:
+            self._add(build(static_folder, name))
+
+    def url_name(self, name):
+        """Fingerprinted file name for a source name, or the name itself if it isn't built"""
+        asset = self._current(name)
+        return asset.url_name if asset else name
+
+    def get(self, url_name):
+        asset = self._by_url_name.get(url_name)
+        if asset is not None and self.reload:
+            asset = self._current(asset.name)
+        return asset
+
+    def _current(self, name):
+        asset = self._by_name.get(name)
+        if asset is not None and self.reload:
+            path = os.path.join(self.static_folder, name)
+            if os.path.getmtime(path) != asset.mtime:
+                asset = self._add(build(self.static_folder, name))
+        return asset
+
+    def _add(self, asset):
+        self._by_name[asset.name] = asset
+        self._by_url_name[asset.url_name] = asset
+        return asset
+
+
+def choose_encoding(accept_encodings):
+    """Best pre-built encoding a request's werkzeug Accept-Encoding header allows, or None"""
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the fingerprinted static assets')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='static folder (default: static/ next to assets.py)')
+    parser.add_argument('--out', help='also write each asset and its compressed copies here')
+    args = parser.parse_args(argv)
+
+    for name in ASSETS:
+        asset = build(args.static, name)
+        source = os.path.getsize(os.path.join(args.static, name))
+        sizes = '  '.join(f'{encoding or "minified"} {len(body):>7,}' for encoding, body in asset.bodies.items())
+        print(f'  {asset.url_name:<28} source {source:>7,}  {sizes}')
+        if args.out:
+            for encoding, body in asset.bodies.items():
+                suffix = {None: '', 'gzip': '.gz', 'br': '.br'}[encoding]
+                path = os.path.join(args.out, asset.url_name + suffix)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(body)
+    if not brotli:
+        print('brotli is not installed; only gzip copies were made')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
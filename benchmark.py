@@ -0,0 +1,729 @@
+"""
+Load test and benchmark for the web app and DB layer.
+
+Seeds a fresh database at the requested scale, then has concurrent virtual
+users drive the main routes, either through Flask's test client (in process)
+or over HTTP against a local threaded server. Modes wsgi and asgi start
+serve.py in its own process instead and drive it from one event loop, a
+keep-alive connection per virtual user, for runs with a thousand or more.
+Writes throughput, p50/p95/p99 latency and SQL statements per request as
+JSON. `compare` diffs two result files and exits non-zero on regressions.
+
+    python3 benchmark.py run --events 5000 --registrations 50000 --out before.json
+    python3 benchmark.py run --mode server --concurrency 32 --out after.json
+    python3 benchmark.py compare before.json after.json
+    python3 benchmark.py run --mode wsgi --concurrency 1000 --requests 20000 --out wsgi.json
+    python3 benchmark.py run --mode asgi --concurrency 1000 --requests 20000 --out asgi.json
+
+Presets fix the scale and traffic mix of a named scenario (explicit options
+still win), and pair with a switch that replays the code path it replaced:
+
+    python3 benchmark.py run --preset listing-10k --counts per-event --out before.json
+    python3 benchmark.py run --preset listing-10k --out after.json
+    python3 benchmark.py run --preset search-100k --search like --out like.json
+    python3 benchmark.py run --preset search-100k --out fts.json
+    python3 benchmark.py run --preset logins-200 --logins 0 --out quiet.json
+    python3 benchmark.py run --preset logins-200 --out logins.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+# Route label -> relative weight in the default traffic mix
+DEFAULT_MIX = {
+    'GET /events': 4,
+    'GET /event/<int:event_id>': 4,
+    'POST /register_event/<int:event_id>': 1,
+    'GET /my-registrations': 2,
+    'GET /admin': 1,
+}
+
+SEARCH_TERMS = ('conference', 'meetup', 'workshop', 'music', 'tech', 'summit')
+
+# Named scenarios: option defaults for `run`
+PRESETS = {
+    # Event listings with their registration counts, at 10k events
+    'listing-10k': {'users': 5000, 'events': 10000, 'registrations': 100000,
+                    'mix': 'GET /events?after=<cursor>=1,GET /admin/events?after=<cursor>=1'},
+    # Event search at 100k events, for common words and for rare ones
+    'search-100k': {'users': 5000, 'events': 100000, 'registrations': 100000,
+                    'concurrency': 4, 'requests': 1000, 'mix': 'GET /events?search=<q>=1'},
+    # Pages that don't sign anyone in, browsed while 200 others keep signing in
+    'logins-200': {'logins': 200, 'requests': 12000, 'mix': 'GET /events=4,GET /event/<int:event_id>=4,GET /my-registrations=2'},
+}
+
+# Label for the --logins traffic, reported alongside the mix's routes
+SIGN_IN = 'POST /login'
+
+
+
+def seed(db, users, venues, events, registrations, rng):
+    """Fill an initialised DB through bulk_import and return the attendee and event ids"""
+    from werkzeug.security import generate_password_hash
+    # One hash shared by every generated user; the KDF would dominate seeding otherwise
+    password_hash = generate_password_hash('benchmark')
+    db.bulk_import('users', ({'name': f'User {i}', 'email': f'user{i}@bench.example',
+                              'role': 'organizer' if i % 20 == 0 else 'attendee',
+                              'password_hash': password_hash} for i in range(users)))
+    db.bulk_import('venues', ({'name': f'Venue {i}', 'address': f'{i} Main Street',
+                               'capacity': rng.choice((50, 200, 1000))} for i in range(venues)))
+    cur = db.conn.cursor()
+    cur.execute("SELECT id FROM users WHERE role='organizer'")
+    organizers = [r[0] for r in cur.fetchall()]
+    cur.execute('SELECT id FROM venues')
+    venue_ids = [r[0] for r in cur.fetchall()]
+
+    first_day = datetime(2027, 1, 1, 9)
+
+    def event(i):
+        start = first_day + timedelta(days=i % 365, hours=i % 10)
+        return {'title': f'{rng.choice(SEARCH_TERMS).title()} {i}',
+                'description': f'Benchmark event {i} about {rng.choice(SEARCH_TERMS)}',
+                'venue_id': rng.choice(venue_ids), 'organizer_id': rng.choice(organizers),
+                'capacity': rng.choice((20, 100, 500)),
+                'start': start.strftime('%Y-%m-%d %H:%M'),
+                'end': (start + timedelta(hours=2)).strftime('%Y-%m-%d %H:%M')}
+    db.bulk_import('events', (event(i) for i in range(events)))
+
+    cur.execute("SELECT id FROM users WHERE role='attendee'")
+    attendees = [r[0] for r in cur.fetchall()]
+    cur.execute('SELECT id FROM events')
+    event_ids = [r[0] for r in cur.fetchall()]
+    db.bulk_import('registrations', ({'event_id': rng.choice(event_ids), 'user_id': rng.choice(attendees)}
+                                     for _ in range(registrations)))
+    db.refresh_statistics()
+    return attendees, event_ids
+
+
+def per_event_summary(db):
+    """
+    A stand-in for db.get_registration_summary that counts the way the listing
+    pages used to: each event's full attendee list, and the user's own
+    registrations fetched again for every event. --counts per-event patches
+    it in, as the baseline for the batched query.
+    """
+    def summary(user_id=None, event_ids=None):
+        cur = db.conn.cursor()
+        if event_ids is None:
+            cur.execute('SELECT id FROM events')
+            event_ids = [r[0] for r in cur.fetchall()]
+        event_ids = list(event_ids)
+        # The listing query itself carried the capacities
+        cur.execute(f"SELECT id, capacity FROM events WHERE id IN ({','.join('?' * len(event_ids))})", event_ids)
+        capacities = dict(cur.fetchall())
+        result = {}
+        for event_id in event_ids:
+            cur.execute('''
+            SELECT u.id,u.name,u.email,u.role, r.created_at as registration_date
+            FROM registrations r JOIN users u ON u.id=r.user_id
+            WHERE r.event_id=? ORDER BY r.created_at
+            ''', (event_id,))
+            count = len(cur.fetchall())
+            registered = False
+            if user_id is not None:
+                cur.execute('''
+                SELECT r.event_id, e.title, s.start, v.name, u.name
+                FROM registrations r
+                JOIN events e ON e.id=r.event_id
+                LEFT JOIN schedules s ON s.event_id=e.id
+                LEFT JOIN venues v ON v.id=e.venue_id
+                LEFT JOIN users u ON u.id=e.organizer_id
+                WHERE r.user_id=?
+                ORDER BY s.start IS NULL, s.start
+                ''', (user_id,))
+                registered = any(r[0] == event_id for r in cur.fetchall())
+            cap = capacities.get(event_id)
+            result[event_id] = {'registered_count': count, 'is_full': cap is not None and count >= cap,
+                                'is_registered': registered}
+        return result
+    return summary
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class VirtualUser:
+    """One simulated browser: an attendee session plus the shared admin session"""
+
+    def __init__(self, transport, user_sid, admin_sid, event_ids, rng, cursors=()):
+        self.user = transport.client(user_sid)
+        self.admin = transport.client(admin_sid)
+        self.event_ids = event_ids
+        self.rng = rng
+        # Page cursors at every depth of the listings, for the ?after=<cursor> routes
+        self.cursors = cursors
+
+    def request(self, label):
+        if label == 'GET /events':
+            if self.rng.random() < 0.25:
+                return self.user('GET', f'/events?search={self.rng.choice(SEARCH_TERMS)}')
+            return self.user('GET', '/events')
+        if label == 'GET /event/<int:event_id>':
+            return self.user('GET', f'/event/{self.rng.choice(self.event_ids)}')
+        if label == 'POST /register_event/<int:event_id>':
+            return self.user('POST', f'/register_event/{self.rng.choice(self.event_ids)}')
+        if label == 'GET /my-registrations':
+            return self.user('GET', '/my-registrations')
+        if label == 'GET /admin':
+            return self.admin('GET', '/admin')
+        if label == 'GET /events?search=<q>':
+            # Half common words, half an event number, found in a handful of titles
+            if self.rng.random() < 0.5:
+                return self.user('GET', f'/events?search={self.rng.choice(SEARCH_TERMS)}')
+            return self.user('GET', f'/events?search={self.rng.randrange(len(self.event_ids))}')
+        if label == 'GET /events?after=<cursor>':
+            return self.user('GET', f'/events?after={self.rng.choice(self.cursors)}')
+        if label == 'GET /admin/events?after=<cursor>':
+            return self.admin('GET', f'/admin/events?after={self.rng.choice(self.cursors)}')
+        raise ValueError(f'unknown route {label!r}')
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+
+    def client(self, sid):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['sid'] = sid
+
+        def send(method, path):
+            return client.open(path, method=method).status_code
+        return send
+
+    def signer(self, i):
+        """sign_in(email, password) from the i-th client address; True if it reached the dashboard"""
+        client = self.app.test_client()
+        address = f'10.0.{i // 250}.{i % 250 + 1}'
+
+        def sign_in(email, password):
+            response = client.post('/login', data={'email': email, 'password': password},
+                                   environ_base={'REMOTE_ADDR': address})
+            return response.headers.get('Location', '').endswith('/dashboard')
+        return sign_in
+
+
+class ServerTransport:
+    """A threaded werkzeug server on an ephemeral port, driven with urllib"""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+        self.app = app
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+        self.opener = urllib.request.build_opener(NoRedirect)
+
+    def client(self, sid):
+        cookie_value = self.app.session_interface.get_signing_serializer(self.app).dumps({'sid': sid})
+        cookie = f"{self.app.config['SESSION_COOKIE_NAME']}={cookie_value}"
+
+        def send(method, path):
+            req = urllib.request.Request(self.base + path, method=method, headers={'Cookie': cookie},
+                                         data=b'' if method == 'POST' else None)
+            try:
+                with self.opener.open(req, timeout=60) as resp:
+                    resp.read()
+                    return resp.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        return send
+
+    def close(self):
+        self.server.shutdown()
+
+
+class ProcessTransport:
+    """
+    serve.py in its own process (--mode wsgi or asgi), driven over keep-alive
+    HTTP/1.1 connections from one event loop. send() is a coroutine; each
+    virtual user has at most one request in flight, so the connections opened
+    equal the concurrency. The server's threads and memory are sampled throughout.
+    """
+
+    def __init__(self, app, mode, db_path, workers=1, threads=16):
+        self.app = app
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ, EVENTS_DB=db_path)
+        env.pop('EVENTS_PROFILE', None)
+        serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+        self.process = subprocess.Popen(
+            [sys.executable, serve, '--mode', mode, '--host', '127.0.0.1', '--port', str(self.port),
+             '--workers', str(workers), '--threads', str(threads)],
+            env=env, stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/about', timeout=5):
+                    break
+            except OSError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'serve.py --mode {mode} did not start')
+                time.sleep(0.2)
+        self._idle = []
+        self.peak_threads = self.peak_rss_kb = 0
+        self._sampling = True
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def client(self, sid):
+        cookie_value = self.app.session_interface.get_signing_serializer(self.app).dumps({'sid': sid})
+        head = (f"Host: 127.0.0.1\r\nCookie: {self.app.config['SESSION_COOKIE_NAME']}={cookie_value}\r\n"
+                f"Content-Length: 0\r\n\r\n").encode()
+
+        async def send(method, path):
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.open_connection('127.0.0.1', self.port)
+                status, _, keep_alive = await asyncio.wait_for(_exchange(conn, f'{method} {path} HTTP/1.1\r\n'.encode() + head), 60)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                if conn is not None:
+                    conn[1].close()
+                return 599
+            if keep_alive:
+                self._idle.append(conn)
+            else:
+                conn[1].close()
+            return status
+        return send
+
+    def signer(self, i):
+        """
+        TestClientTransport.signer over a connection per attempt, from the i-th
+        loopback address (127.0.1.1 onwards: Linux answers on all of 127/8)
+        """
+        address = f'127.0.{i // 250 + 1}.{i % 250 + 1}'
+
+        async def sign_in(email, password):
+            body = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+            request = (f'POST /login HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n'
+                       f'Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n')
+            try:
+                conn = await asyncio.open_connection('127.0.0.1', self.port, local_addr=(address, 0))
+                try:
+                    _, headers, _ = await asyncio.wait_for(_exchange(conn, request.encode() + body), 60)
+                finally:
+                    conn[1].close()
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                return False
+            return headers.get('location', '').endswith('/dashboard')
+        return sign_in
+
+    def disconnect(self):
+        """Close the idle connections; call on the loop that opened them"""
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+    def _sample(self):
+        while self._sampling:
+            threads, rss = _process_tree_usage(self.process.pid)
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss_kb = max(self.peak_rss_kb, rss)
+            time.sleep(0.25)
+
+    def close(self):
+        self._sampling = False
+        self._sampler.join()
+        self.process.terminate()
+        self.process.wait(30)
+
+
+async def _exchange(conn, request):
+    """Write one request and read its response; returns (status, headers, connection reusable)"""
+    reader, writer = conn
+    writer.write(request)
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split(' ', 2)[1])
+    headers = {}
+    for line in head[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, headers.get('connection') != 'close' and head[0].startswith('HTTP/1.1')
+
+
+def _process_tree_usage(pid):
+    """(threads, resident KB) summed over a process and its descendants, from /proc"""
+    threads = rss = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss += int(line.split()[1])
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return threads, rss
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    workdir = None
+    if args.db:
+        path = args.db
+    else:
+        workdir = tempfile.mkdtemp(prefix='events-bench-')
+        path = os.path.join(workdir, 'events.db')
+    # app.py reads these at import time
+    os.environ['EVENTS_DB'] = path
+    os.environ['EVENTS_PROFILE'] = '1'
+
+    from db import DB, encode_cursor
+    started = time.perf_counter()
+    seed_db = DB(path, cache=False)
+    attendees, event_ids = seed(seed_db, args.users, args.venues, args.events, args.registrations, rng)
+    cur = seed_db.conn.cursor()
+    cur.execute('SELECT start, event_id FROM schedules')
+    cursors = [encode_cursor(*r) for r in cur.fetchall()]
+    cur.execute("SELECT email FROM users WHERE role='attendee' ORDER BY id LIMIT ?", (args.logins,))
+    login_emails = [r[0] for r in cur.fetchall()]
+    seed_db.close()
+    seed_seconds = time.perf_counter() - started
+    print(f'Seeded {args.users:,} users, {args.venues:,} venues, {args.events:,} events, '
+          f'{args.registrations:,} registrations in {seed_seconds:.1f}s', file=sys.stderr)
+
+    import app as webapp
+    app, db, profiler = webapp.app, webapp.db, webapp.profiler
+    if args.counts == 'per-event':
+        db.get_registration_summary = per_event_summary(db)
+    if args.search == 'like':
+        # The fallback search_events takes on an SQLite built without FTS5
+        db.has_fts = False
+    admin_id = db.get_user_by_email('admin@eventmanager.com')[0]
+    admin_sid = db.create_session(admin_id, 3600)
+    db.release()
+    if args.mode == 'client':
+        transport = TestClientTransport(app)
+    elif args.mode == 'server':
+        transport = ServerTransport(app)
+    else:
+        transport = ProcessTransport(app, args.mode, path, args.workers, args.threads)
+
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {}
+        for part in args.mix.split(','):
+            label, weight = part.rsplit('=', 1)
+            mix[label.strip()] = float(weight)
+    labels, weights = list(mix), list(mix.values())
+
+    vusers = []
+    for i in range(args.concurrency):
+        sid = db.create_session(rng.choice(attendees), 3600)
+        vusers.append(VirtualUser(transport, sid, admin_sid, event_ids, random.Random(args.seed + i), cursors))
+    db.release()
+
+    # Each virtual user's request schedule is fixed up front so runs are repeatable
+    plans = [[vu.rng.choices(labels, weights)[0] for _ in range(args.requests // args.concurrency)]
+             for vu in vusers]
+    # Each signs in at most as often as the per-address throttle allows, from a
+    # start spread over one interval, for as long as the page traffic lasts
+    interval = webapp.ip_throttle.window / webapp.ip_throttle.limit
+    signers = [(transport.signer(i), email, rng.uniform(0, interval)) for i, email in enumerate(login_emails)]
+    reported = labels + ([SIGN_IN] if signers else [])
+    samples = {label: [] for label in reported}
+    errors = {label: 0 for label in reported}
+    if isinstance(transport, ProcessTransport):
+        elapsed = asyncio.run(drive_async(transport, vusers, plans, labels, samples, errors, signers, interval))
+    else:
+        elapsed = drive_threads(vusers, plans, labels, samples, errors, profiler, signers, interval)
+    server = {}
+    if isinstance(transport, (ServerTransport, ProcessTransport)):
+        transport.close()
+    if isinstance(transport, ProcessTransport):
+        server = {'peak_threads': transport.peak_threads, 'peak_rss_mb': round(transport.peak_rss_kb / 1024, 1)}
+
+    sql = {f"{r['method']} {r['route']}": r for r in profiler.snapshot()['routes']}
+    # The profiler counts per route, so labels that differ only in their query string share one
+    shared = {}
+    for label in reported:
+        shared.setdefault(label.split('?')[0], []).append(label)
+    routes = {}
+    for label in reported:
+        values = sorted(samples[label])
+        if not values:
+            continue
+        routes[label] = summarize(values, elapsed, errors[label])
+        route = label.split('?')[0]
+        routes[label]['sql_per_request'] = (round(sql[route]['sql_per_request'], 2)
+                                            if route in sql and len(shared[route]) == 1 else None)
+    # The pages only, so runs with and without --logins compare like for like
+    everything = sorted(v for label in labels for v in samples[label])
+    result = {
+        'meta': {
+            'mode': args.mode, 'concurrency': args.concurrency, 'seed': args.seed,
+            **({'logins': args.logins} if args.logins else {}),
+            **({'preset': args.preset} if args.preset else {}),
+            **({'counts': args.counts} if args.counts != 'summary' else {}),
+            **({'search': args.search} if args.search != 'fts' else {}),
+            'scale': {'users': args.users, 'venues': args.venues, 'events': args.events,
+                      'registrations': args.registrations},
+            'seed_seconds': round(seed_seconds, 2),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **({'server': server} if server else {}),
+        },
+        'overall': summarize(everything, elapsed, sum(errors[label] for label in labels)),
+        'routes': routes,
+    }
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    webapp.hasher.close()
+    if workdir:
+        db.close()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+    return 0
+
+
+def drive_threads(vusers, plans, labels, samples, errors, profiler, signers=(), interval=0.0):
+    """
+    A thread per virtual user; warms every route first. Each of `signers`,
+    (sign_in, email, delay), gets a thread signing in every `interval`
+    seconds until the virtual users are done. Returns the seconds taken.
+    """
+    for vu in vusers:
+        for label in labels:
+            vu.request(label)
+    profiler.reset()
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def drive(vu, plan):
+        local = []
+        for label in plan:
+            start = time.perf_counter()
+            status = vu.request(label)
+            local.append((label, time.perf_counter() - start, status >= 400))
+        with lock:
+            for label, seconds, failed in local:
+                samples[label].append(seconds)
+                errors[label] += failed
+
+    def sign_in_repeatedly(sign_in, email, delay):
+        local = []
+        done.wait(delay)
+        while not done.is_set():
+            start = time.perf_counter()
+            signed_in = sign_in(email, 'benchmark')
+            seconds = time.perf_counter() - start
+            local.append((seconds, not signed_in))
+            done.wait(max(0.0, interval - seconds))
+        with lock:
+            for seconds, turned_away in local:
+                samples[SIGN_IN].append(seconds)
+                errors[SIGN_IN] += turned_away
+
+    threads = [threading.Thread(target=drive, args=(vu, plan)) for vu, plan in zip(vusers, plans)]
+    signing = [threading.Thread(target=sign_in_repeatedly, args=signer) for signer in signers]
+    started = time.perf_counter()
+    for t in threads + signing:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for t in signing:
+        t.join()
+    return elapsed
+
+
+async def drive_async(transport, vusers, plans, labels, samples, errors, signers=(), interval=0.0):
+    """drive_threads for a ProcessTransport: a task per virtual user and per signer on one loop"""
+    done = asyncio.Event()
+
+    async def warm(vu):
+        for label in labels:
+            await vu.request(label)
+
+    async def drive(vu, plan):
+        for label in plan:
+            start = time.perf_counter()
+            status = await vu.request(label)
+            samples[label].append(time.perf_counter() - start)
+            errors[label] += status >= 400
+
+    async def pause(seconds):
+        try:
+            await asyncio.wait_for(done.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def sign_in_repeatedly(sign_in, email, delay):
+        await pause(delay)
+        while not done.is_set():
+            start = time.perf_counter()
+            signed_in = await sign_in(email, 'benchmark')
+            seconds = time.perf_counter() - start
+            samples[SIGN_IN].append(seconds)
+            errors[SIGN_IN] += not signed_in
+            await pause(max(0.0, interval - seconds))
+
+    try:
+        await asyncio.gather(*(warm(vu) for vu in vusers))
+        signing = [asyncio.create_task(sign_in_repeatedly(*signer)) for signer in signers]
+        started = time.perf_counter()
+        await asyncio.gather(*(drive(vu, plan) for vu, plan in zip(vusers, plans)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*signing)
+        return elapsed
+    finally:
+        transport.disconnect()
+
+
+def summarize(sorted_seconds, elapsed, errors):
+    return {
+        'requests': len(sorted_seconds),
+        'errors': errors,
+        'throughput_rps': round(len(sorted_seconds) / elapsed, 1) if elapsed else 0,
+        'mean_ms': round(statistics.fmean(sorted_seconds) * 1000, 3),
+        'p50_ms': round(percentile(sorted_seconds, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(sorted_seconds, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(sorted_seconds, 0.99) * 1000, 3),
+    }
+
+
+def compare(args):
+    """Print per-route deltas between two result files; return 1 if anything regressed"""
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        new = json.load(f)
+    if base['meta'].get('scale') != new['meta'].get('scale') or base['meta'].get('concurrency') != new['meta'].get('concurrency'):
+        print('warning: runs used different scale or concurrency; deltas may not be meaningful', file=sys.stderr)
+    if base['meta'].get('mode') != new['meta'].get('mode'):
+        print(f"comparing mode {base['meta'].get('mode')} with {new['meta'].get('mode')}", file=sys.stderr)
+
+    regressions = []
+    rows = [('overall', base['overall'], new['overall'])]
+    rows += [(label, base['routes'][label], new['routes'][label])
+             for label in base['routes'] if label in new['routes']]
+    print(f"{'route':<40} {'metric':<16} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for label, old, cur in rows:
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'sql_per_request'):
+            a, b = old.get(metric), cur.get(metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a * 100 if a else 0.0
+            if metric == 'throughput_rps':
+                worse = change < -args.threshold
+            elif metric == 'sql_per_request':
+                worse = b - a >= 1
+            else:
+                worse = change > args.threshold and b - a > args.min_ms
+            flag = '  REGRESSION' if worse else ''
+            print(f'{label:<40} {metric:<16} {a:>10.2f} {b:>10.2f} {change:>+7.1f}%{flag}')
+            if worse:
+                regressions.append((label, metric))
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:g}%')
+        return 1
+    print('No regressions')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test and benchmark the event manager')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = runner = sub.add_parser('run', help='seed a database and drive the routes with virtual users')
+    p.add_argument('--preset', choices=sorted(PRESETS), help='scale and mix of a named scenario')
+    p.add_argument('--users', type=int, default=2000)
+    p.add_argument('--venues', type=int, default=50)
+    p.add_argument('--events', type=int, default=2000)
+    p.add_argument('--registrations', type=int, default=20000)
+    p.add_argument('--concurrency', type=int, default=16, help='virtual users (threads)')
+    p.add_argument('--requests', type=int, default=4000, help='total requests across all virtual users')
+    p.add_argument('--mode', choices=('client', 'server', 'wsgi', 'asgi'), default='client',
+                   help='Flask test client in process, HTTP against a local threaded server, '
+                        'or serve.py in that mode in its own process')
+    p.add_argument('--workers', type=int, default=1, help='serve.py worker processes (asgi mode)')
+    p.add_argument('--threads', type=int, default=16, help='serve.py request threads per worker (asgi mode)')
+    p.add_argument('--mix', help='comma-separated "METHOD /route=weight" overrides, e.g. "GET /events=1"')
+    p.add_argument('--logins', type=int, default=0,
+                   help='extra users signing in repeatedly alongside the mix, each from its own address '
+                        '(client, wsgi and asgi modes; the last two need Linux loopback addresses)')
+    p.add_argument('--counts', choices=('summary', 'per-event'), default='summary',
+                   help='listing registration counts from the batched query, or per event as before it '
+                        '(client and server modes)')
+    p.add_argument('--search', choices=('fts', 'like'), default='fts',
+                   help="search through the FTS5 index, or LIKE scans as without it (client and server modes)")
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--db', help='database path to create (default: a temporary file)')
+    p.add_argument('--out', help='write the JSON result here as well as to stdout')
+
+    p = sub.add_parser('compare', help='diff two result files and flag regressions')
+    p.add_argument('baseline')
+    p.add_argument('candidate')
+    p.add_argument('--threshold', type=float, default=15.0, help='percent change counted as a regression')
+    p.add_argument('--min-ms', type=float, default=1.0, help='ignore latency changes smaller than this')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        if args.preset:
+            # Parsed again so that options given explicitly override the preset
+            runner.set_defaults(**PRESETS[args.preset])
+            args = parser.parse_args(argv)
+        if args.mode in ('wsgi', 'asgi') and (args.counts != 'summary' or args.search != 'fts'):
+            parser.error('--counts and --search need the client or server mode')
+        if args.logins and args.mode == 'server':
+            parser.error('--logins needs the client, wsgi or asgi mode')
+        if args.db and os.path.exists(args.db):
+            parser.error(f'{args.db} already exists; benchmark runs seed a fresh database')
+        return run(args)
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Bulk loader for users, venues, events and registrations.
+
+Streams a CSV (header row) or JSONL/NDJSON file into the database through
+DB.bulk_import, printing throughput as it goes. Rerunning the same command
+after a failure resumes from the last committed batch.
+
+    python3 bulk_import.py users users.csv
+    python3 bulk_import.py registrations history.jsonl --batch-size 20000
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from db import DB, IMPORT_KINDS
+
+
+def read_records(path):
+    """Yield one dict per CSV row or JSON line, without loading the whole file"""
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Reported as a rejected row by DB.bulk_import
+                    yield None
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import CSV/JSONL data into the events database')
+    parser.add_argument('kind', choices=sorted(IMPORT_KINDS))
+    parser.add_argument('path', help='CSV file with a header row, or .jsonl/.ndjson file')
+    parser.add_argument('--db', help='database path (default: events.db next to db.py)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per transaction (default 5000)')
+    parser.add_argument('--restart', action='store_true', help='ignore any saved progress for this file')
+    args = parser.parse_args(argv)
+
+    db = DB(args.db)
+    source = f'{args.kind}:{os.path.abspath(args.path)}'
+    if args.restart:
+        db.conn.execute('DELETE FROM import_progress WHERE source=?', (source,))
+        db.conn.commit()
+
+    def progress(result, elapsed):
+        rate = result['read'] / elapsed if elapsed else 0
+        print(f"  {result['resumed_at'] + result['read']:>10,} rows  {rate:>10,.0f} rows/s", flush=True)
+
+    try:
+        result = db.bulk_import(args.kind, read_records(args.path), source=source,
+                                batch_size=args.batch_size, progress=progress)
+    except Exception as e:
+        print(f'Import failed: {e}. Rerun the same command to resume.', file=sys.stderr)
+        return 1
+
+    if result['resumed_at']:
+        print(f"Resumed after {result['resumed_at']:,} previously imported rows")
+    print(f"{result['read']:,} rows read in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/s): "
+          f"{result['inserted']:,} inserted, {result['skipped']:,} skipped, {result['rejected']:,} rejected")
+    for number, error in result['errors'][:20]:
+        print(f'  row {number}: {error}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Integrity check for the events database.
+
+Reports rows whose references point at deleted users, events or venues,
+as left behind by deletes made before foreign keys were enforced, and
+runs SQLite's own quick_check. With --repair the orphans are removed (or
+their reference cleared, for venues and organizers) in one transaction.
+
+The file is opened as it is: it is never created, migrated or seeded, so
+what is reported is what was on disk.
+
+    python3 check_integrity.py
+    python3 check_integrity.py --repair --db /path/to/events.db
+"""
+import argparse
+import sqlite3
+import sys
+from urllib.parse import quote
+
+from db import DEFAULT_PATH, check_orphans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find and repair orphaned rows in the events database')
+    parser.add_argument('--db', default=DEFAULT_PATH, help='database path (default: events.db next to db.py)')
+    parser.add_argument('--repair', action='store_true', help='delete orphans or clear their references')
+    args = parser.parse_args(argv)
+
+    try:
+        # mode=rw: a mistyped path is an error rather than a new, empty database
+        conn = sqlite3.connect(f'file:{quote(args.db)}?mode=rw', uri=True, isolation_level=None)
+    except sqlite3.OperationalError as e:
+        print(f'Cannot open {args.db}: {e}', file=sys.stderr)
+        return 2
+    conn.execute('PRAGMA busy_timeout=5000')
+    # Repairs then cascade like the app's own deletes on a migrated database
+    conn.execute('PRAGMA foreign_keys=ON')
+    cur = conn.cursor()
+    cur.execute('PRAGMA quick_check')
+    problems = [r[0] for r in cur.fetchall() if r[0] != 'ok']
+    for problem in problems:
+        print(f'quick_check: {problem}')
+
+    found = check_orphans(conn, repair=args.repair)
+    for reference, rows in found.items():
+        print(f"  {reference:<28} {rows:>10,} orphaned row{'s' if rows != 1 else ''}"
+              f"{' repaired' if args.repair else ''}")
+    if not found:
+        print('No orphaned rows')
+    elif not args.repair:
+        print('Rerun with --repair to fix them')
+    conn.close()
+    return 1 if problems or (found and not args.repair) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,1313 @@
 import sqlite3
+import base64
+import functools
+import itertools
+import json
+import logging
 import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from datetime import datetime
 
+from recurrence import describe, last_start, min_gap, parse_rrule
+
+log = logging.getLogger(__name__)
+
+# The database DB opens when given no path
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events.db')
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections that threads check out and return"""
+
+    def __init__(self, path, size=16, timeout=30.0, busy_timeout=5000, factory=sqlite3.Connection):
+        self.path = path
+        self.factory = factory
+        # Every ':memory:' connection is a separate database, so only one can be shared
+        self.size = 1 if path == ':memory:' else size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        # Called with each new connection once the schema exists (see DB.__init__)
+        self.setup = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000,
+                               check_same_thread=False, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout)}')
+        # WAL lets readers run alongside the single writer
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        # Off by default in SQLite; the schema relies on ON DELETE CASCADE / SET NULL
+        conn.execute('PRAGMA foreign_keys=ON')
+        if self.setup:
+            self.setup(conn)
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening a new one while under the pool size"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Exception('Timed out waiting for a database connection')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any uncommitted work"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _sizeof(value):
+    """Rough recursive size in bytes of a cached query result"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, sqlite3.Row)):
+        size += sum(_sizeof(v) for v in value)
+    return size
+
+
+def _copy_result(value):
+    """Shallow-copy dict rows so callers can annotate results without touching the cache"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, Page):
+        return Page([_copy_result(v) for v in value], value.next_cursor)
+    if isinstance(value, list):
+        return [_copy_result(v) for v in value]
+    return value
+
+
+class QueryCache:
+    """
+    In-process LRU cache for DB read results with a TTL and a memory bound.
+    Entries carry tags (e.g. 'venues', 'event:3') and writes invalidate by tag.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=60.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, tags, expires)
+        self._by_tag = {}
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        """Return (found, value) and the generation a miss should be stored under"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, _copy_result(entry[0]), self._generation
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return False, None, self._generation
+
+    def put(self, key, value, tags, generation):
+        size = _sizeof(value)
+        with self._lock:
+            # An invalidation since the read began means the value may already be stale
+            if generation != self._generation or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, tags, time.monotonic() + self.ttl)
+            self._bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in self._by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        value, size, tags, expires = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def cached(*tags):
+    """
+    Serve a DB read method from self.cache. Tags may reference positional
+    arguments, e.g. 'event:{0}' tags get_event(3) as 'event:3'. A shared DB
+    also tags entries with the TAG_VERSIONS rows they depend on, for sync_cache.
+    """
+    versions = sorted({f'version:{name}' for tag in tags for name in TAG_VERSIONS[tag.split(':')[0]]})
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self.cache
+            if cache is None:
+                return method(self, *args, **kwargs)
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            found, value, generation = cache.get(key)
+            if found:
+                return value
+            value = method(self, *args, **kwargs)
+            entry_tags = [tag.format(*args) for tag in tags]
+            if self.shared:
+                entry_tags += versions
+            cache.put(key, value, entry_tags, generation)
+            return _copy_result(value)
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags):
+    """Invalidate cached reads carrying these tags once a DB write method returns"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                if self.cache is not None:
+                    self.cache.invalidate(*[tag.format(*args) for tag in tags])
+        return wrapper
+    return decorator
+
+
+def publishes_seats(arg):
+    """
+    After a DB write method returns, pass fresh seat counts for the event id
+    in positional argument `arg` to the DB's seat listeners
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._publish_seats([args[arg]])
+            return result
+        return wrapper
+    return decorator
+
+
+def _table_names(cur):
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return {r[0] for r in cur.fetchall()}
+
+
+def _columns(cur, table):
+    cur.execute(f'PRAGMA table_info({table})')
+    return [column[1] for column in cur.fetchall()]
+
+
+def _migration_password_hash(cur):
+    """Add users.password_hash to databases created before passwords existed"""
+    if 'password_hash' not in _columns(cur, 'users'):
+        cur.execute('ALTER TABLE users ADD COLUMN password_hash TEXT')
+
+
+def _migration_registration_counter(cur):
+    """One registration per (event, user) and a trigger-maintained events.registered_count"""
+    # Drop duplicates left by the old racy registration path
+    cur.execute('''
+    DELETE FROM registrations WHERE id NOT IN (
+        SELECT MIN(id) FROM registrations GROUP BY event_id, user_id
+    )
+    ''')
+    cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_registrations_event_user ON registrations(event_id, user_id)')
+    if 'registered_count' not in _columns(cur, 'events'):
+        cur.execute('ALTER TABLE events ADD COLUMN registered_count INTEGER NOT NULL DEFAULT 0')
+    cur.execute('''
+    UPDATE events SET registered_count =
+        (SELECT COUNT(*) FROM registrations r WHERE r.event_id=events.id)
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS registrations_count_insert AFTER INSERT ON registrations
+    BEGIN
+        UPDATE events SET registered_count = registered_count + 1 WHERE id=NEW.event_id;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS registrations_count_delete AFTER DELETE ON registrations
+    BEGIN
+        UPDATE events SET registered_count = registered_count - 1 WHERE id=OLD.event_id;
+    END
+    ''')
+
+
+def _migration_lookup_indexes(cur):
+    """Indexes for the foreign-key lookups used by listing and detail queries"""
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_registrations_user ON registrations(user_id, event_id, created_at)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_schedules_event ON schedules(event_id, start, end)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_events_organizer ON events(organizer_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_events_venue ON events(venue_id)')
+
+
+def _migration_search_index(cur):
+    """FTS5 index over event title, description and venue name, kept in sync by triggers"""
+    try:
+        cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(title, description, venue_name)
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; search_events keeps using LIKE
+        return
+    cur.execute('DELETE FROM events_fts')
+    cur.execute('''
+    INSERT INTO events_fts (rowid, title, description, venue_name)
+    SELECT e.id, e.title, e.description, v.name FROM events e LEFT JOIN venues v ON v.id=e.venue_id
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events
+    BEGIN
+        INSERT INTO events_fts (rowid, title, description, venue_name)
+        VALUES (NEW.id, NEW.title, NEW.description, (SELECT name FROM venues WHERE id=NEW.venue_id));
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description, venue_id ON events
+    BEGIN
+        DELETE FROM events_fts WHERE rowid=OLD.id;
+        INSERT INTO events_fts (rowid, title, description, venue_name)
+        VALUES (NEW.id, NEW.title, NEW.description, (SELECT name FROM venues WHERE id=NEW.venue_id));
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events
+    BEGIN
+        DELETE FROM events_fts WHERE rowid=OLD.id;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_fts_venue_update AFTER UPDATE OF name ON venues
+    BEGIN
+        UPDATE events_fts SET venue_name=NEW.name
+        WHERE rowid IN (SELECT id FROM events WHERE venue_id=NEW.id);
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_fts_venue_delete AFTER DELETE ON venues
+    BEGIN
+        UPDATE events_fts SET venue_name=NULL
+        WHERE rowid IN (SELECT id FROM events WHERE venue_id=OLD.id);
+    END
+    ''')
+
+
+def _migration_venue_bookings(cur):
+    """
+    R*Tree of (venue, time span) per schedule so overlap checks are index
+    lookups. Times are epoch seconds; a missing or non-positive end counts as
+    one minute from the start.
+    """
+    cur.execute('''
+    CREATE VIEW IF NOT EXISTS schedule_spans AS
+    SELECT id, event_id, venue_id, start_ts, MAX(COALESCE(end_ts, 0), start_ts + 60) AS end_ts
+    FROM (
+        SELECT s.id, s.event_id, e.venue_id,
+               CAST(strftime('%s', s.start) AS INTEGER) AS start_ts,
+               CAST(strftime('%s', s.end) AS INTEGER) AS end_ts
+        FROM schedules s JOIN events e ON e.id=s.event_id
+    )
+    WHERE start_ts IS NOT NULL AND venue_id IS NOT NULL
+    ''')
+    try:
+        # R*Tree coordinates are 32-bit floats (rounded outwards); the + columns keep exact values
+        cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS venue_bookings USING rtree(
+            id, venue_lo, venue_hi, start_lo, end_hi, +start_ts, +end_ts, +event_id
+        )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without R*Tree; check_venue_availability reads schedule_spans directly
+        return
+    cur.execute('DELETE FROM venue_bookings')
+    cur.execute('''
+    INSERT INTO venue_bookings
+    SELECT id, venue_id, venue_id, start_ts, end_ts, start_ts, end_ts, event_id FROM schedule_spans
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS venue_bookings_insert AFTER INSERT ON schedules
+    BEGIN
+        INSERT INTO venue_bookings
+        SELECT id, venue_id, venue_id, start_ts, end_ts, start_ts, end_ts, event_id
+        FROM schedule_spans WHERE id=NEW.id;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS venue_bookings_update AFTER UPDATE ON schedules
+    BEGIN
+        DELETE FROM venue_bookings WHERE id=OLD.id;
+        INSERT INTO venue_bookings
+        SELECT id, venue_id, venue_id, start_ts, end_ts, start_ts, end_ts, event_id
+        FROM schedule_spans WHERE id=NEW.id;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS venue_bookings_delete AFTER DELETE ON schedules
+    BEGIN
+        DELETE FROM venue_bookings WHERE id=OLD.id;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS venue_bookings_event_venue AFTER UPDATE OF venue_id ON events
+    BEGIN
+        DELETE FROM venue_bookings WHERE id IN (SELECT id FROM schedules WHERE event_id=NEW.id);
+        INSERT INTO venue_bookings
+        SELECT id, venue_id, venue_id, start_ts, end_ts, start_ts, end_ts, event_id
+        FROM schedule_spans WHERE event_id=NEW.id;
+    END
+    ''')
+
+
+# One aggregated pass over the tables; used to (re)build the statistics rollup
+STATISTICS_QUERY = '''
+SELECT
+    (SELECT COUNT(*) FROM events) AS total_events,
+    u.total_users, u.attendee_count, u.organizer_count, u.admin_count,
+    (SELECT COUNT(*) FROM venues) AS total_venues,
+    (SELECT COUNT(*) FROM registrations) AS total_registrations,
+    (SELECT COUNT(*) FROM events WHERE registered_count > 0) AS events_with_registrations
+FROM (
+    SELECT COUNT(*) AS total_users,
+           COALESCE(SUM(role = 'attendee'), 0) AS attendee_count,
+           COALESCE(SUM(role = 'organizer'), 0) AS organizer_count,
+           COALESCE(SUM(role = 'admin'), 0) AS admin_count
+    FROM users
+) u
+'''
+
+
+def _migration_statistics_rollup(cur):
+    """Single-row statistics table kept current by triggers, so reads are O(1)"""
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS statistics (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total_events INTEGER NOT NULL, total_users INTEGER NOT NULL,
+        attendee_count INTEGER NOT NULL, organizer_count INTEGER NOT NULL, admin_count INTEGER NOT NULL,
+        total_venues INTEGER NOT NULL, total_registrations INTEGER NOT NULL,
+        events_with_registrations INTEGER NOT NULL
+    )
+    ''')
+    cur.execute('INSERT OR REPLACE INTO statistics SELECT 1, * FROM (' + STATISTICS_QUERY + ')')
+    triggers = {
+        'statistics_user_insert': '''AFTER INSERT ON users BEGIN
+            UPDATE statistics SET total_users = total_users + 1,
+                attendee_count = attendee_count + (NEW.role = 'attendee'),
+                organizer_count = organizer_count + (NEW.role = 'organizer'),
+                admin_count = admin_count + (NEW.role = 'admin');
+        END''',
+        'statistics_user_delete': '''AFTER DELETE ON users BEGIN
+            UPDATE statistics SET total_users = total_users - 1,
+                attendee_count = attendee_count - (OLD.role = 'attendee'),
+                organizer_count = organizer_count - (OLD.role = 'organizer'),
+                admin_count = admin_count - (OLD.role = 'admin');
+        END''',
+        'statistics_user_role': '''AFTER UPDATE OF role ON users BEGIN
+            UPDATE statistics SET
+                attendee_count = attendee_count + (NEW.role = 'attendee') - (OLD.role = 'attendee'),
+                organizer_count = organizer_count + (NEW.role = 'organizer') - (OLD.role = 'organizer'),
+                admin_count = admin_count + (NEW.role = 'admin') - (OLD.role = 'admin');
+        END''',
+        'statistics_event_insert': '''AFTER INSERT ON events BEGIN
+            UPDATE statistics SET total_events = total_events + 1,
+                events_with_registrations = events_with_registrations + (NEW.registered_count > 0);
+        END''',
+        'statistics_event_delete': '''AFTER DELETE ON events BEGIN
+            UPDATE statistics SET total_events = total_events - 1,
+                events_with_registrations = events_with_registrations - (OLD.registered_count > 0);
+        END''',
+        'statistics_event_registered': '''AFTER UPDATE OF registered_count ON events BEGIN
+            UPDATE statistics SET events_with_registrations = events_with_registrations
+                + (NEW.registered_count > 0) - (OLD.registered_count > 0);
+        END''',
+        'statistics_venue_insert': '''AFTER INSERT ON venues BEGIN
+            UPDATE statistics SET total_venues = total_venues + 1;
+        END''',
+        'statistics_venue_delete': '''AFTER DELETE ON venues BEGIN
+            UPDATE statistics SET total_venues = total_venues - 1;
+        END''',
+        'statistics_registration_insert': '''AFTER INSERT ON registrations BEGIN
+            UPDATE statistics SET total_registrations = total_registrations + 1;
+        END''',
+        'statistics_registration_delete': '''AFTER DELETE ON registrations BEGIN
+            UPDATE statistics SET total_registrations = total_registrations - 1;
+        END''',
+    }
+    for name, body in triggers.items():
+        cur.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def _migration_schedule_order_index(cur):
+    """Index walking schedules in listing order, for keyset-paginated get_events"""
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_schedules_start ON schedules(start, event_id)')
+
+
+def _migration_import_progress(cur):
+    """Checkpoints letting bulk_import resume a source after a failure"""
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS import_progress (
+        source TEXT PRIMARY KEY, kind TEXT, rows_done INTEGER NOT NULL, updated_at TEXT
+    )
+    ''')
+
+
+def _migration_attendee_order_index(cur):
+    """Index walking an event's registrations in sign-up order, so attendee exports stream unsorted"""
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_registrations_event_created ON registrations(event_id, created_at)')
+
+
+def _migration_sessions(cur):
+    """Server-side login sessions; the browser cookie only carries the session id"""
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY, user_id INTEGER NOT NULL, created_at TEXT, expires_at REAL NOT NULL
+    )
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+
+
+def _migration_schedule_epochs(cur):
+    """
+    Integer start_ts/end_ts beside the free-form schedule text, written with
+    SCHEDULE_INSERT so status and date filters are plain comparisons. Like
+    the text they come from, they are wall-clock times read as UTC.
+    """
+    columns = _columns(cur, 'schedules')
+    for column in ('start_ts', 'end_ts'):
+        if column not in columns:
+            cur.execute(f'ALTER TABLE schedules ADD COLUMN {column} INTEGER')
+    cur.execute('''
+    UPDATE schedules SET start_ts=CAST(strftime('%s', start) AS INTEGER),
+                         end_ts=CAST(strftime('%s', end) AS INTEGER)
+    ''')
+    # Inserts go through SCHEDULE_INSERT (an AFTER INSERT fix-up would re-fire the
+    # venue_bookings triggers); this keeps in-place edits of the text in step
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS schedules_epoch_update AFTER UPDATE OF start, end ON schedules
+    BEGIN
+        UPDATE schedules SET start_ts=CAST(strftime('%s', NEW.start) AS INTEGER),
+                             end_ts=CAST(strftime('%s', NEW.end) AS INTEGER)
+        WHERE id=NEW.id;
+    END
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_schedules_event_start_ts ON schedules(event_id, start_ts)')
+
+
+# Waitlist ids must stay below this for the position tree (2**40, ~1.1e12 joins)
+WAITLIST_SPAN = 1 << 40
+
+
+def _migration_waitlist(cur):
+    """FIFO waitlist for full events; AUTOINCREMENT ids never repeat, so id order is join order"""
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS waitlist (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, event_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        created_at TEXT, UNIQUE(event_id, user_id)
+    )
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_waitlist_event ON waitlist(event_id, id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_waitlist_user ON waitlist(user_id)')
+    # Per-event Fenwick tree over waitlist ids: node i holds the number of live
+    # entries in (i - lowbit(i), i], so a queue position is the sum of at most
+    # log2(WAITLIST_SPAN) nodes and a join/leave touches as many. Rows are created
+    # on demand, keeping the tree sparse.
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS waitlist_counts (
+        event_id INTEGER NOT NULL, node INTEGER NOT NULL, n INTEGER NOT NULL,
+        PRIMARY KEY (event_id, node)
+    ) WITHOUT ROWID
+    ''')
+    cur.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS waitlist_counts_insert AFTER INSERT ON waitlist BEGIN
+        INSERT INTO waitlist_counts (event_id, node, n)
+        WITH RECURSIVE up(i) AS (SELECT NEW.id UNION ALL SELECT i + (i & -i) FROM up WHERE i + (i & -i) < {WAITLIST_SPAN})
+        SELECT NEW.event_id, i, 1 FROM up WHERE 1
+        ON CONFLICT (event_id, node) DO UPDATE SET n = n + 1;
+    END
+    ''')
+    cur.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS waitlist_counts_delete AFTER DELETE ON waitlist BEGIN
+        UPDATE waitlist_counts SET n = n - 1 WHERE event_id = OLD.event_id AND node IN (
+            WITH RECURSIVE up(i) AS (SELECT OLD.id UNION ALL SELECT i + (i & -i) FROM up WHERE i + (i & -i) < {WAITLIST_SPAN})
+            SELECT i FROM up);
+    END
+    ''')
+
+
+def _promote_waitlist(cur, event_id):
+    """
+    Move waitlisted users into free seats, oldest first, inside the
+    caller's write transaction. Returns the promoted user ids.
+    """
+    promoted = []
+    while True:
+        cur.execute('''
+        SELECT w.id, w.user_id FROM waitlist w JOIN events e ON e.id=w.event_id
+        WHERE w.event_id=? AND (e.capacity IS NULL OR e.registered_count < e.capacity)
+        ORDER BY w.id LIMIT 1
+        ''', (event_id,))
+        head = cur.fetchone()
+        if head is None:
+            return promoted
+        cur.execute('DELETE FROM waitlist WHERE id=?', (head[0],))
+        cur.execute('INSERT OR IGNORE INTO registrations (event_id,user_id,created_at) VALUES (?,?,?)',
+                    (event_id, head[1], datetime.utcnow().isoformat()))
+        if cur.rowcount:
+            promoted.append(head[1])
+
+
+def _migration_recurrences(cur):
+    """
+    One RRULE per recurring event. The event's schedules row stays its first
+    occurrence; the rest are expanded on demand (see _occurrences_cte), never
+    stored. last_ts, the start of the final occurrence, bounds each series.
+    """
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS recurrences (
+        event_id INTEGER PRIMARY KEY, rrule TEXT NOT NULL, freq TEXT NOT NULL, interval INTEGER NOT NULL,
+        start_ts INTEGER NOT NULL, duration INTEGER, last_ts INTEGER NOT NULL
+    )
+    ''')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_recurrences_last ON recurrences(last_ts)')
+    # Date-window listings range-scan one-off events by start
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_schedules_start_ts ON schedules(start_ts)')
+
+
+# (child table, column, parent table, ON DELETE action) for every reference in
+# the schema. Parents come before their children, so one pass in this order
+# also catches rows orphaned by an earlier repair.
+FOREIGN_KEYS = [
+    ('events', 'organizer_id', 'users', 'SET NULL'),
+    ('events', 'venue_id', 'venues', 'SET NULL'),
+    ('schedules', 'event_id', 'events', 'CASCADE'),
+    ('recurrences', 'event_id', 'events', 'CASCADE'),
+    ('registrations', 'event_id', 'events', 'CASCADE'),
+    ('registrations', 'user_id', 'users', 'CASCADE'),
+    ('waitlist', 'event_id', 'events', 'CASCADE'),
+    ('waitlist', 'user_id', 'users', 'CASCADE'),
+    ('waitlist_counts', 'event_id', 'events', 'CASCADE'),
+    ('sessions', 'user_id', 'users', 'CASCADE'),
+]
+
+# Tables rebuilt by _migration_foreign_keys: (name, columns, constraints and
+# options). Events kept their organizer's CASCADE until _migration_organizer_set_null.
+_FOREIGN_KEY_TABLES = [
+    ('events', 'id INTEGER PRIMARY KEY, title TEXT, description TEXT, '
+               'venue_id INTEGER REFERENCES venues(id) ON DELETE SET NULL, '
+               'organizer_id INTEGER REFERENCES users(id) ON DELETE CASCADE, '
+               'capacity INTEGER, registered_count INTEGER NOT NULL DEFAULT 0', ''),
+    ('schedules', 'id INTEGER PRIMARY KEY, event_id INTEGER REFERENCES events(id) ON DELETE CASCADE, '
+                  'start TEXT, end TEXT, start_ts INTEGER, end_ts INTEGER', ''),
+    ('recurrences', 'event_id INTEGER PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE, '
+                    'rrule TEXT NOT NULL, freq TEXT NOT NULL, interval INTEGER NOT NULL, '
+                    'start_ts INTEGER NOT NULL, duration INTEGER, last_ts INTEGER NOT NULL', ''),
+    ('registrations', 'id INTEGER PRIMARY KEY, event_id INTEGER REFERENCES events(id) ON DELETE CASCADE, '
+                      'user_id INTEGER REFERENCES users(id) ON DELETE CASCADE, created_at TEXT', ''),
+    ('waitlist', 'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                 'event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE, '
+                 'user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE, '
+                 'created_at TEXT, UNIQUE(event_id, user_id)', ''),
+    ('waitlist_counts', 'event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE, '
+                        'node INTEGER NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (event_id, node)', 'WITHOUT ROWID'),
+    ('sessions', 'id TEXT PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE, '
+                 'created_at TEXT, expires_at REAL NOT NULL', ''),
+]
+
+
+def _orphans(cur, repair=False):
+    """
+    Count rows whose FOREIGN_KEYS reference points at a missing parent. With
+    repair, delete them (CASCADE) or clear the reference (SET NULL) instead,
+    one set-based statement per reference, so the usual triggers keep the
+    counters in step. References between tables an older schema doesn't have
+    yet are skipped. Returns {'table.column': rows} for references with orphans.
+    """
+    tables = _table_names(cur)
+    found = {}
+    for table, column, parent, action in FOREIGN_KEYS:
+        if table not in tables or parent not in tables:
+            continue
+        where = f'{column} IS NOT NULL AND {column} NOT IN (SELECT id FROM {parent})'
+        if not repair:
+            cur.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}')
+            count = cur.fetchone()[0]
+        elif action == 'CASCADE':
+            cur.execute(f'DELETE FROM {table} WHERE {where}')
+            count = cur.rowcount
+        else:
+            cur.execute(f'UPDATE {table} SET {column}=NULL WHERE {where}')
+            count = cur.rowcount
+        if count:
+            found[f'{table}.{column}'] = count
+    return found
+
+
+def _cascade_counts(cur, root):
+    """
+    Rows each table would lose to ON DELETE CASCADE if the root table rows
+    whose ids are in temp.id_set were deleted, counted in one query per table
+    """
+    def doomed(table):
+        # WHERE clause matching the rows of table that go with the root rows
+        terms = [f'{column} IN ({"SELECT id FROM temp.id_set" if parent == root else f"SELECT id FROM {parent} WHERE {doomed(parent)}"})'
+                 for child, column, parent, action in FOREIGN_KEYS
+                 if child == table and action == 'CASCADE' and (parent == root or doomed(parent))]
+        return ' OR '.join(f'({term})' for term in terms)
+
+    counts = {}
+    for table in dict.fromkeys(child for child, _, _, _ in FOREIGN_KEYS):
+        where = doomed(table)
+        if where:
+            cur.execute(f'SELECT COUNT(*) FROM {table} WHERE {where}')
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def check_orphans(conn, repair=False):
+    """
+    Find rows left pointing at deleted parents (e.g. by deletes made before
+    foreign keys were enforced). With repair, remove them or clear the
+    reference in one transaction and hand any seats freed to the waitlist.
+    Works on any schema version, so check_integrity.py can run it on a file
+    without migrating it. Returns {'table.column': rows} for each reference
+    that had orphans.
+    """
+    cur = conn.cursor()
+    cur.execute('BEGIN IMMEDIATE')
+    try:
+        found = _orphans(cur, repair)
+        if repair and found and 'waitlist' in _table_names(cur):
+            cur.execute('''
+            SELECT DISTINCT w.event_id FROM waitlist w JOIN events e ON e.id=w.event_id
+            WHERE e.capacity IS NOT NULL AND e.registered_count < e.capacity
+            ''')
+            for (event_id,) in cur.fetchall():
+                _promote_waitlist(cur, event_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return found
+
+
+def _migration_foreign_keys(cur):
+    """
+    Declare the schema's references as foreign keys with ON DELETE actions,
+    so deletes cascade natively. SQLite can't add constraints in place, so
+    each child table is rebuilt and its indexes and triggers recreated.
+    DB.migrate runs this with enforcement off. Orphans already in the file
+    are copied as they are and logged: removing data is left to the operator
+    (check_integrity.py --repair).
+    """
+    found = _orphans(cur)
+    if found:
+        log.warning('%s rows point at deleted users, events or venues (%s); '
+                    'run check_integrity.py --repair to remove them', sum(found.values()),
+                    ', '.join(f'{reference}: {rows}' for reference, rows in found.items()))
+    _rebuild_tables(cur, _FOREIGN_KEY_TABLES)
+
+
+def _rebuild_tables(cur, tables):
+    """
+    Recreate each (name, columns, options) table with its rows, indexes and
+    triggers, which is how SQLite changes a table's constraints. Run with
+    foreign key enforcement off, so dropping the old tables cascades nothing.
+    """
+    names = [table for table, _, _ in tables]
+    cur.execute(f'''
+    SELECT sql FROM sqlite_master
+    WHERE type IN ('index', 'trigger') AND sql IS NOT NULL AND tbl_name IN ({",".join("?" * len(names))})
+    ''', names)
+    dependents = [r[0] for r in cur.fetchall()]
+    row = None
+    if 'waitlist' in names:
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name='waitlist'")
+        row = cur.fetchone()
+    # Leave references to the old names in views and triggers alone while tables are swapped
+    cur.execute('PRAGMA legacy_alter_table=ON')
+    for table, columns, options in tables:
+        names = ','.join(_columns(cur, table))
+        cur.execute(f'CREATE TABLE {table}_new ({columns}) {options}')
+        cur.execute(f'INSERT INTO {table}_new ({names}) SELECT {names} FROM {table}')
+        cur.execute(f'DROP TABLE {table}')
+        cur.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    cur.execute('PRAGMA legacy_alter_table=OFF')
+    for sql in dependents:
+        cur.execute(sql)
+    if row:
+        # Keep waitlist ids from ever being reused. Dropping the old table took
+        # its sqlite_sequence row; copying recreated it only if rows were left.
+        cur.execute("UPDATE sqlite_sequence SET seq=MAX(seq, ?) WHERE name='waitlist'", (row[0],))
+        if not cur.rowcount:
+            cur.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('waitlist', ?)", (row[0],))
+
+
+# Tables whose writes bump a table_versions row, for cheap change detection
+VERSIONED_TABLES = ('users', 'venues', 'events', 'schedules', 'recurrences', 'registrations', 'waitlist')
+
+# Current time as fractional epoch seconds, in SQL
+_SQL_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _migration_table_versions(cur):
+    """
+    A version counter and last-change time per table, bumped by triggers on
+    every insert, update and delete, so "has anything changed?" is one read
+    of a tiny table (the JSON API's ETags and Last-Modified come from it)
+    """
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        name TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    for table in VERSIONED_TABLES:
+        cur.execute(f'INSERT OR IGNORE INTO table_versions (name, version, updated_at) VALUES (?, 1, {_SQL_NOW})',
+                    (table,))
+        for op in ('insert', 'update', 'delete'):
+            cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{op} AFTER {op.upper()} ON {table} BEGIN
+                UPDATE table_versions SET version = version + 1, updated_at = {_SQL_NOW} WHERE name = '{table}';
+            END
+            ''')
+
+
+# The table_versions rows sync_cache follows, each with the table and writes
+# that bump it. 'events.details' leaves out registered_count, which every
+# registration updates and no cached read returns; 'sessions.ended' skips
+# inserts, as a new session can't be in anyone's cache yet.
+CACHE_VERSIONS = {
+    'users': ('users', ('INSERT', 'UPDATE', 'DELETE')),
+    'venues': ('venues', ('INSERT', 'UPDATE', 'DELETE')),
+    'schedules': ('schedules', ('INSERT', 'UPDATE', 'DELETE')),
+    'recurrences': ('recurrences', ('INSERT', 'UPDATE', 'DELETE')),
+    'registrations': ('registrations', ('INSERT', 'UPDATE', 'DELETE')),
+    'events.details': ('events', ('INSERT', 'DELETE', 'UPDATE OF title, description, venue_id, organizer_id, capacity')),
+    'sessions.ended': ('sessions', ('UPDATE', 'DELETE')),
+}
+
+# Cache tag kind (the part before any ':') -> the CACHE_VERSIONS rows its reads depend on
+TAG_VERSIONS = {
+    'users': ('users',),
+    'user': ('users',),
+    'sessions': ('sessions.ended',),
+    'session': ('sessions.ended',),
+    'venues': ('venues',),
+    'events': ('events.details', 'schedules', 'recurrences'),
+    'event': ('events.details', 'schedules', 'recurrences'),
+    'attendees': ('registrations', 'users'),
+}
+
+
+def _migration_cache_versions(cur):
+    """table_versions rows and triggers for the CACHE_VERSIONS that aren't whole tables"""
+    for name, (table, writes) in CACHE_VERSIONS.items():
+        if name in VERSIONED_TABLES:
+            continue
+        cur.execute(f'INSERT OR IGNORE INTO table_versions (name, version, updated_at) VALUES (?, 1, {_SQL_NOW})',
+                    (name,))
+        for write in writes:
+            cur.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name.replace(".", "_")}_version_{write.split()[0].lower()}
+            AFTER {write} ON {table} BEGIN
+                UPDATE table_versions SET version = version + 1, updated_at = {_SQL_NOW} WHERE name = '{name}';
+            END
+            ''')
+
+
+def _migration_organizer_set_null(cur):
+    """
+    Keep an organizer's events when the organizer is deleted, with
+    organizer_id cleared, rather than cascading to the events and every
+    attendee's registrations, schedules and waitlist places for them
+    """
+    _rebuild_tables(cur, [
+        ('events', 'id INTEGER PRIMARY KEY, title TEXT, description TEXT, '
+                   'venue_id INTEGER REFERENCES venues(id) ON DELETE SET NULL, '
+                   'organizer_id INTEGER REFERENCES users(id) ON DELETE SET NULL, '
+                   'capacity INTEGER, registered_count INTEGER NOT NULL DEFAULT 0', ''),
+    ])
+
+
+# Append new migrations to the end; never reorder or edit applied ones
+MIGRATIONS = [
+    _migration_password_hash,
+    _migration_registration_counter,
+    _migration_lookup_indexes,
+    _migration_search_index,
+    _migration_venue_bookings,
+    _migration_statistics_rollup,
+    _migration_schedule_order_index,
+    _migration_import_progress,
+    _migration_attendee_order_index,
+    _migration_sessions,
+    _migration_schedule_epochs,
+    _migration_waitlist,
+    _migration_recurrences,
+    _migration_foreign_keys,
+    _migration_table_versions,
+    _migration_cache_versions,
+    _migration_organizer_set_null,
+]
+
+# Writes a schedule with its epoch columns; parameters are (event_id, start, end)
+SCHEDULE_INSERT = '''
+INSERT INTO schedules (event_id,start,end,start_ts,end_ts)
+VALUES (?1, ?2, ?3, CAST(strftime('%s', ?2) AS INTEGER), CAST(strftime('%s', ?3) AS INTEGER))
+'''
+
+RECURRENCE_INSERT = '''
+INSERT INTO recurrences (event_id,rrule,freq,interval,start_ts,duration,last_ts) VALUES (?,?,?,?,?,?,?)
+'''
+
+# past / soon (within a day) / upcoming, or tbd / unknown when the start is missing / unparseable
+SCHEDULE_STATUS = '''CASE
+    WHEN s.start IS NULL OR s.start = '' THEN 'tbd'
+    WHEN s.start_ts IS NULL THEN 'unknown'
+    WHEN s.start_ts < CAST(strftime('%s', 'now', 'localtime') AS INTEGER) THEN 'past'
+    WHEN s.start_ts < CAST(strftime('%s', 'now', 'localtime') AS INTEGER) + 86400 THEN 'soon'
+    ELSE 'upcoming'
+END'''
+
+# Filters for get_registrations_by_user(when=...), on the same local clock as SCHEDULE_STATUS
+SCHEDULE_WHEN = {
+    'upcoming': "s.start_ts >= CAST(strftime('%s', 'now', 'localtime') AS INTEGER)",
+    'past': "s.start_ts < CAST(strftime('%s', 'now', 'localtime') AS INTEGER)",
+}
+
+
+def _step_start(k):
+    """SQL for the start of step k of the series in the current row (first_ts, freq, interval)"""
+    return f'''CASE WHEN freq = 'monthly'
+        THEN CAST(strftime('%s', first_ts, 'unixepoch', '+' || (({k}) * interval) || ' months') AS INTEGER)
+        ELSE first_ts + ({k}) * interval * CASE freq WHEN 'daily' THEN 86400 ELSE 604800 END
+    END'''
+
+
+def _occurrences_cte(name, rules, overlap=True, lo=':lo', hi=':hi'):
+    """
+    WITH RECURSIVE entries defining {name}(event_id, start_ts, end_ts, span_end, lo)
+    as the occurrences of the recurrences rows selected by `rules` (aliased
+    r) that overlap the window [lo, hi), or with overlap=False start inside
+    it. lo/hi default to the :lo/:hi parameters but may be columns of r, to
+    give each row its own window. span_end is the end used for overlap tests
+    (at least a minute, as in schedule_spans). Each series starts at the
+    first step that can reach its window, so the cost is the number of
+    occurrences inside the windows, not the length of the series.
+    """
+    reach = 'MAX(COALESCE({0}duration, 0), 60)' if overlap else '1'
+    return f'''
+    {name}_steps(event_id, freq, interval, first_ts, duration, last_ts, lo, hi, k, ts) AS (
+        SELECT event_id, freq, interval, first_ts, duration, last_ts, lo, hi, k, {_step_start('k')}
+        FROM (
+            SELECT r.event_id, r.freq, r.interval, r.start_ts AS first_ts, r.duration, r.last_ts,
+                   {lo} AS lo, {hi} AS hi,
+                   CASE WHEN r.freq = 'monthly'
+                       THEN MAX(0, ((strftime('%Y', {lo}, 'unixepoch') - strftime('%Y', r.start_ts, 'unixepoch')) * 12
+                                    + strftime('%m', {lo}, 'unixepoch') - strftime('%m', r.start_ts, 'unixepoch'))
+                                   / r.interval - 1)
+                       ELSE MAX(0, ({lo} - {reach.format('r.')} - r.start_ts)
+                                   / (r.interval * CASE r.freq WHEN 'daily' THEN 86400 ELSE 604800 END))
+                   END AS k
+            FROM ({rules}) r
+            WHERE r.start_ts < {hi} AND r.last_ts + {reach.format('r.')} > {lo}
+        )
+        UNION ALL
+        SELECT event_id, freq, interval, first_ts, duration, last_ts, lo, hi, k + 1, {_step_start('k + 1')}
+        FROM {name}_steps
+        WHERE ts < hi AND ts < last_ts
+    ),
+    {name}(event_id, start_ts, end_ts, span_end, lo) AS (
+        SELECT event_id, ts, ts + duration, ts + MAX(COALESCE(duration, 0), 60), lo
+        FROM {name}_steps
+        WHERE ts < hi AND ts <= last_ts AND ts + {reach.format('')} > lo
+        -- Monthly series skip months without their day (Jan 31 + 1 month lands in March)
+        AND (freq != 'monthly' OR strftime('%d', ts, 'unixepoch') = strftime('%d', first_ts, 'unixepoch'))
+    )'''
+
+
+def _sql_time(column):
+    """Render an epoch column in the schedules text format"""
+    return f"strftime('%Y-%m-%d %H:%M', {column}, 'unixepoch')"
+
+
+# Markers search results wrap around matched terms (see highlight filter in app.py)
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+# bm25 column weights for title, description, venue_name
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+
+class Page(list):
+    """One page of rows plus the cursor for the next page (None on the last page)"""
+
+    def __init__(self, rows, next_cursor=None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(*key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(token):
+    """Return the (sort value, id) pair in a page cursor, or None if it's missing or malformed"""
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        return None
+    if not isinstance(key, list) or len(key) != 2:
+        return None
+    return tuple(key)
+
+
+def _page(rows, limit, key):
+    """Trim a limit+1 fetch to a Page whose cursor is built from the last row's key columns"""
+    rows = [dict(r) for r in rows]
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    return Page(rows, encode_cursor(*(rows[-1][k] for k in key)))
+
+
+def _fill_id_set(cur, ids):
+    """
+    Load ids into the connection's temp.id_set table for `IN (SELECT id FROM
+    temp.id_set)` filters, which, unlike bound parameter lists, have no size limit
+    """
+    cur.execute('CREATE TEMP TABLE IF NOT EXISTS id_set (id INTEGER PRIMARY KEY)')
+    cur.execute('DELETE FROM temp.id_set')
+    cur.executemany('INSERT OR IGNORE INTO temp.id_set (id) VALUES (?)', ((int(i),) for i in ids))
+
+
+def _existing_ids(cur, table, ids):
+    """The subset of ids present in table, looked up in chunks under SQLite's variable limit"""
+    ids = list(ids)
+    found = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        cur.execute(f'SELECT id FROM {table} WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+        found.update(r[0] for r in cur.fetchall())
+    return found
+
+
+def _iter_batches(cur, batch_size):
+    """Drain an executed cursor with fetchmany, yielding each row as a dict"""
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+    finally:
+        cur.close()
+
+
+def _start_keyset(after, id_column):
+    """WHERE clause resuming ORDER BY s.start IS NULL, s.start, <id_column> after a cursor"""
+    key = decode_cursor(after)
+    if key is None:
+        return '1', []
+    start, last_id = key
+    if start is None:
+        return f'(s.start IS NULL AND {id_column} > ?)', [last_id]
+    return f'(s.start IS NULL OR s.start > ? OR (s.start = ? AND {id_column} > ?))', [start, start, last_id]
+
+
+# Rows fetched per round trip by the iter_* export generators
+EXPORT_BATCH_SIZE = 1000
+
+
+def csv_cell(value):
+    """Neutralise values a spreadsheet would otherwise evaluate as a formula"""
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+EVENT_COLUMNS = '''e.id,e.title,e.description,e.capacity,e.organizer_id, v.name as venue_name, v.address as venue_address, s.start, s.end, u.name as organizer_name, u.email as organizer_email'''
+
+# EVENT_COLUMNS from events e alone. Under ORDER BY ... LIMIT, SQLite works out
+# result columns only for the rows that make the limit, so these lookups cost
+# a page of rows where the same joins would cost one per candidate.
+EVENT_COLUMNS_BY_LOOKUP = '''e.id,e.title,e.description,e.capacity,e.organizer_id,
+(SELECT name FROM venues WHERE id=e.venue_id) as venue_name,
+(SELECT address FROM venues WHERE id=e.venue_id) as venue_address,
+(SELECT start FROM schedules WHERE event_id=e.id) as start,
+(SELECT end FROM schedules WHERE event_id=e.id) as end,
+(SELECT name FROM users WHERE id=e.organizer_id) as organizer_name,
+(SELECT email FROM users WHERE id=e.organizer_id) as organizer_email'''
+
+
+def _field(row, name, required=True):
+    value = row.get(name)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        if required:
+            raise ValueError(f'{name} is required')
+        return None
+    return value
+
+
+def _int_field(row, name, required=True):
+    value = _field(row, name, required)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if value < 0:
+        raise ValueError(f'{name} must not be negative')
+    return value
+
+
+def _datetime_field(row, name, required=True):
+    value = _field(row, name, required)
+    if value is not None:
+        try:
+            datetime.strptime(value, "%Y-%m-%d %H:%M")
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} must look like YYYY-MM-DD HH:MM')
+    return value
+
+
+def _import_user(row):
+    email = _field(row, 'email')
+    if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
+        raise ValueError('email is not valid')
+    role = _field(row, 'role', False) or 'attendee'
+    if role not in ('attendee', 'organizer', 'admin'):
+        raise ValueError(f'unknown role {role!r}')
+    password_hash = _field(row, 'password_hash', False)
+    if password_hash is None and _field(row, 'password', False):
+        from werkzeug.security import generate_password_hash
+        password_hash = generate_password_hash(_field(row, 'password'))
+    return (_int_field(row, 'id', False), _field(row, 'name'), email, role, password_hash)
+
+
+def _import_venue(row):
+    return (_int_field(row, 'id', False), _field(row, 'name'), _field(row, 'address'),
+            _int_field(row, 'capacity'))
+
+
+def _import_event(row):
+    start = _datetime_field(row, 'start', False)
+    end = _datetime_field(row, 'end', False)
+    if end and not start:
+        raise ValueError('end given without start')
+    return (_int_field(row, 'id', False), _field(row, 'title'), _field(row, 'description', False) or '',
+            _int_field(row, 'venue_id'), _int_field(row, 'organizer_id'), _int_field(row, 'capacity'),
+            start, end)
+
+
+def _import_registration(row):
+    event_id = _int_field(row, 'event_id')
+    user_id = _int_field(row, 'user_id')
+    created_at = _field(row, 'created_at', False) or datetime.utcnow().isoformat()
+    # Parameters for the INSERT ... WHERE EXISTS in bulk_import
+    return (event_id, user_id, created_at, event_id, user_id)
+
+
+# kind -> (row validator, INSERT used with executemany)
+IMPORT_KINDS = {
+    'users': (_import_user,
+              'INSERT OR IGNORE INTO users (id,name,email,role,password_hash) VALUES (?,?,?,?,?)'),
+    'venues': (_import_venue,
+               'INSERT OR IGNORE INTO venues (id,name,address,capacity) VALUES (?,?,?,?)'),
+    'events': (_import_event,
+               'INSERT INTO events (id,title,description,venue_id,organizer_id,capacity) VALUES (?,?,?,?,?,?)'),
+    'registrations': (_import_registration, '''
+        INSERT OR IGNORE INTO registrations (event_id,user_id,created_at)
+        SELECT ?,?,? WHERE EXISTS (SELECT 1 FROM events WHERE id=?) AND EXISTS (SELECT 1 FROM users WHERE id=?)
+    '''),
+}
+
+
+class _Checkout:
+    """Per-thread marker whose collection hands the connection back to the pool"""
+
+
+class _OwnWritesConnection:
+    """
+    Connection mixin for a shared DB. Once counting (see DB._count_own_writes),
+    commit() records how often this connection has bumped each CACHE_VERSIONS
+    row, so sync_cache can tell this process's writes from other processes'.
+    """
+    db = None
+    counting = False
+
+    def commit(self):
+        if not (self.counting and self.in_transaction):
+            return super().commit()
+        # Read inside the transaction: the counts commit (or roll back) with it
+        counts = dict(self.execute('SELECT name, n FROM temp.own_writes').fetchall())
+        with self.db._sync_lock:
+            super().commit()
+            self.db._own_writes[id(self)] = counts
+
 
 class DB:
-    def __init__(self, path=None):
-        self.path = path or os.path.join(os.path.dirname(__file__), 'events.db')
-        self.conn = sqlite3.connect(self.path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+    def __init__(self, path=None, pool_size=16, busy_timeout=5000, cache=True, profiler=None, shared=False):
+        self.path = path or DEFAULT_PATH
+        # A metrics.Profiler times every statement through its connection class
+        factory = profiler.connection_class if profiler else sqlite3.Connection
+        # shared=True when other processes write the same file; see sync_cache
+        self.shared = shared
+        if shared:
+            factory = type('SharedConnection', (_OwnWritesConnection, factory), {'db': self})
+        self.pool = ConnectionPool(self.path, pool_size, busy_timeout=busy_timeout, factory=factory)
+        # Pass cache=False to disable, or a QueryCache to size it
+        self.cache = QueryCache() if cache is True else (cache or None)
+        self._local = threading.local()
+        # Callables given {event_id: seat counts} after writes that change them (see get_seat_counts)
+        self.seat_listeners = []
+        # For sync_cache: committed CACHE_VERSIONS bump counts per pooled connection,
+        # and the versions and this process's totals as of the last sync
+        self._sync_lock = threading.Lock()
+        self._own_writes = {}
+        self._synced = ({}, {})
         self.init_db()
+        cur = self.conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name='events_fts'")
+        self.has_fts = cur.fetchone() is not None
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name='venue_bookings'")
+        self.has_rtree = cur.fetchone() is not None
+        if shared:
+            # The pool holds just this connection so far; later ones are set up as they open
+            self._count_own_writes(self.conn)
+            self.pool.setup = self._count_own_writes
+            self.sync_cache()
+        self.release()
+
+    @property
+    def conn(self):
+        """The calling thread's connection, checked out from the pool on first use"""
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            conn = self.pool.acquire()
+            local.conn = conn
+            local.checkout = _Checkout()
+            # Threads that exit without release() still return their connection
+            local.finalizer = weakref.finalize(local.checkout, self.pool.release, conn)
+        return local.conn
+
+    def release(self):
+        """Return the calling thread's connection to the pool (e.g. at request teardown)"""
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            return
+        finalizer = local.finalizer
+        local.conn = local.checkout = local.finalizer = None
+        finalizer()
+
+    def sync_cache(self):
+        """
+        For a shared DB: invalidate the cached reads that depend on a
+        CACHE_VERSIONS row another process has bumped since the last call,
+        and nothing else. Bumps made by this process's own commits, which
+        invalidated exactly what they changed, are subtracted first. One
+        read of table_versions, meant for a background thread to poll.
+        Returns the names of the rows found stale.
+        """
+        if self.cache is None or not self.shared:
+            return []
+        names = list(CACHE_VERSIONS)
+        cur = self.conn.cursor()
+        # No commit of this process can land between the two readings
+        with self._sync_lock:
+            cur.execute(f'SELECT name, version FROM table_versions WHERE name IN ({",".join("?" * len(names))})',
+                        names)
+            versions = dict(cur.fetchall())
+            own = {name: sum(counts.get(name, 0) for counts in self._own_writes.values()) for name in names}
+        last_versions, last_own = self._synced
+        self._synced = (versions, own)
+        stale = [name for name in names
+                 if versions.get(name, 0) - last_versions.get(name, 0) > own[name] - last_own.get(name, 0)]
+        if stale:
+            self.cache.invalidate(*[f'version:{name}' for name in stale])
+        return stale
+
+    def _count_own_writes(self, conn):
+        """
+        Give a shared DB's connection TEMP triggers (seen only by it) that
+        count its bumps of each CACHE_VERSIONS row, mirroring the triggers
+        that do the bumping
+        """
+        cur = conn.cursor()
+        cur.execute('CREATE TEMP TABLE own_writes (name TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID')
+        cur.executemany('INSERT INTO temp.own_writes (name, n) VALUES (?, 0)', [(name,) for name in CACHE_VERSIONS])
+        for i, (name, (table, writes)) in enumerate(CACHE_VERSIONS.items()):
+            for j, write in enumerate(writes):
+                cur.execute(f'''
+                CREATE TEMP TRIGGER own_write_{i}_{j} AFTER {write} ON main.{table} BEGIN
+                    UPDATE own_writes SET n = n + 1 WHERE name = '{name}';
+                END
+                ''')
+        conn.commit()
+        conn.counting = True
+
+    def close(self):
+        self.release()
+        self.pool.close()
 
     def init_db(self):
         cur = self.conn.cursor()
@@ -17,12 +1316,6 @@ class DB:
             id INTEGER PRIMARY KEY, name TEXT, email TEXT UNIQUE, role TEXT, password_hash TEXT
         )
         ''')
-        
-        # Add password_hash column if it doesn't exist (for existing databases)
-        cur.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cur.fetchall()]
-        if 'password_hash' not in columns:
-            cur.execute('ALTER TABLE users ADD COLUMN password_hash TEXT')
         cur.execute('''
         CREATE TABLE IF NOT EXISTS venues (
             id INTEGER PRIMARY KEY, name TEXT, address TEXT, capacity INTEGER
@@ -30,26 +1323,59 @@ class DB:
         ''')
         cur.execute('''
         CREATE TABLE IF NOT EXISTS events (
-            id INTEGER PRIMARY KEY, title TEXT, description TEXT, venue_id INTEGER,
-            organizer_id INTEGER, capacity INTEGER
+            id INTEGER PRIMARY KEY, title TEXT, description TEXT,
+            venue_id INTEGER REFERENCES venues(id) ON DELETE SET NULL,
+            organizer_id INTEGER REFERENCES users(id) ON DELETE SET NULL, capacity INTEGER
         )
         ''')
         cur.execute('''
         CREATE TABLE IF NOT EXISTS schedules (
-            id INTEGER PRIMARY KEY, event_id INTEGER, start TEXT, end TEXT
+            id INTEGER PRIMARY KEY, event_id INTEGER REFERENCES events(id) ON DELETE CASCADE,
+            start TEXT, end TEXT
         )
         ''')
         cur.execute('''
         CREATE TABLE IF NOT EXISTS registrations (
-            id INTEGER PRIMARY KEY, event_id INTEGER, user_id INTEGER, created_at TEXT
+            id INTEGER PRIMARY KEY, event_id INTEGER REFERENCES events(id) ON DELETE CASCADE,
+            user_id INTEGER REFERENCES users(id) ON DELETE CASCADE, created_at TEXT
         )
         ''')
         self.conn.commit()
-        # seed sample data if users empty
+        self.migrate()
+        # seed sample data if users empty, under the write lock as worker processes start together
+        cur.execute('BEGIN IMMEDIATE')
         cur.execute('SELECT count(*) FROM users')
         if cur.fetchone()[0] == 0:
             self._seed(cur)
-            self.conn.commit()
+        self.conn.commit()
+
+    def migrate(self):
+        """
+        Bring the schema up to date. Each entry in MIGRATIONS runs once, in its
+        own transaction, and PRAGMA user_version records the last one applied.
+        Returns the resulting schema version.
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        # Table rebuilds must not fire cascades; the pragma is ignored inside a transaction
+        cur.execute('PRAGMA foreign_keys=OFF')
+        try:
+            for version, migration in enumerate(MIGRATIONS, start=1):
+                cur.execute('BEGIN IMMEDIATE')
+                try:
+                    # Re-read inside the write lock in case another process migrated first
+                    cur.execute('PRAGMA user_version')
+                    if cur.fetchone()[0] < version:
+                        migration(cur)
+                        cur.execute(f'PRAGMA user_version={version}')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        finally:
+            cur.execute('PRAGMA foreign_keys=ON')
+        cur.execute('PRAGMA user_version')
+        return cur.fetchone()[0]
 
     def _seed(self, cur):
         from werkzeug.security import generate_password_hash
@@ -72,9 +1398,9 @@ class DB:
         cur.execute("INSERT INTO events (title,description,venue_id,organizer_id,capacity) VALUES (?,?,?,?,?)",
                     ('Annual Conference','Our biggest event of the year','3','1',400))
         # schedules
-        cur.execute("INSERT INTO schedules (event_id,start,end) VALUES (?,?,?)", (1,'2025-11-25 18:00','2025-11-25 20:00'))
-        cur.execute("INSERT INTO schedules (event_id,start,end) VALUES (?,?,?)", (2,'2025-11-27 09:00','2025-11-27 12:00'))
-        cur.execute("INSERT INTO schedules (event_id,start,end) VALUES (?,?,?)", (3,'2025-12-05 09:00','2025-12-05 17:00'))
+        cur.execute(SCHEDULE_INSERT, (1,'2025-11-25 18:00','2025-11-25 20:00'))
+        cur.execute(SCHEDULE_INSERT, (2,'2025-11-27 09:00','2025-11-27 12:00'))
+        cur.execute(SCHEDULE_INSERT, (3,'2025-12-05 09:00','2025-12-05 17:00'))
 
     # Users
     def get_users(self):
@@ -94,12 +1420,14 @@ class DB:
         r = cur.fetchone()
         return tuple(r) if r else None
 
+    @invalidates('users')
     def create_user_with_password(self, name, email, role='attendee', password_hash=None):
         cur = self.conn.cursor()
         cur.execute('INSERT INTO users (name,email,role,password_hash) VALUES (?,?,?,?)', (name, email, role, password_hash))
         self.conn.commit()
         return cur.lastrowid
 
+    @invalidates('users')
     def create_user(self, name, email, role='attendee'):
         cur = self.conn.cursor()
         cur.execute('INSERT INTO users (name,email,role) VALUES (?,?,?)', (name, email, role))
@@ -107,13 +1435,50 @@ class DB:
         return cur.lastrowid
 
     def delete_user(self, user_id):
-        cur = self.conn.cursor()
-        # Delete registrations first
-        cur.execute('DELETE FROM registrations WHERE user_id=?', (user_id,))
-        # Then delete user
-        cur.execute('DELETE FROM users WHERE id=?', (user_id,))
-        self.conn.commit()
+        """Delete a user and everything that references them"""
+        return self.delete_users([user_id])['users'] > 0
+
+    def delete_users(self, user_ids):
+        """
+        Delete many users in one transaction. A single DELETE removes them and
+        ON DELETE CASCADE takes their registrations, waitlist places and
+        sessions; the events they organize stay, with organizer_id cleared by
+        ON DELETE SET NULL. Each event that lost an attendee is then refilled
+        from its waitlist. Returns the number of rows removed per table.
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        event_ids, owned = [], []
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            _fill_id_set(cur, user_ids)
+            cur.execute('''
+            SELECT event_id FROM registrations WHERE user_id IN (SELECT id FROM temp.id_set)
+            UNION SELECT event_id FROM waitlist WHERE user_id IN (SELECT id FROM temp.id_set)
+            ''')
+            event_ids = [r[0] for r in cur.fetchall()]
+            cur.execute('SELECT id FROM events WHERE organizer_id IN (SELECT id FROM temp.id_set)')
+            owned = [r[0] for r in cur.fetchall()]
+            counts = _cascade_counts(cur, 'users')
+            cur.execute('DELETE FROM users WHERE id IN (SELECT id FROM temp.id_set)')
+            counts['users'] = cur.rowcount
+            for event_id in event_ids:
+                _promote_waitlist(cur, event_id)
+            cur.execute('DELETE FROM temp.id_set')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate('users', 'sessions', *[f'user:{user_id}' for user_id in user_ids],
+                                      *[f'attendees:{event_id}' for event_id in event_ids],
+                                      # Their events lost the organizer's name and email
+                                      *(['events'] + [f'event:{event_id}' for event_id in owned] if owned else []))
+        self._publish_seats(event_ids)
+        return counts
 
+    @invalidates('users', 'user:{0}')
     def update_user_role(self, user_id, new_role):
         """Update a user's role"""
         cur = self.conn.cursor()
@@ -121,18 +1486,69 @@ class DB:
         self.conn.commit()
         return cur.rowcount > 0
 
+    @cached('user:{0}')
+    def get_session_user(self, user_id):
+        """The signed-in user's id, name, email and role as a dict, or None if the user is gone"""
+        cur = self.conn.cursor()
+        cur.execute('SELECT id,name,email,role FROM users WHERE id=?', (user_id,))
+        r = cur.fetchone()
+        return dict(r) if r else None
+
+    # Sessions
+    def create_session(self, user_id, ttl):
+        """Start a login session lasting ttl seconds and return its id"""
+        sid = secrets.token_urlsafe(32)
+        now = time.time()
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+        cur.execute('INSERT INTO sessions (id,user_id,created_at,expires_at) VALUES (?,?,?,?)',
+                    (sid, user_id, datetime.now().isoformat(), now + ttl))
+        self.conn.commit()
+        return sid
+
+    def get_session(self, sid):
+        """Return the user_id a live session belongs to, or None if it's unknown or expired"""
+        row = self._get_session(sid)
+        if row is None or row['expires_at'] <= time.time():
+            return None
+        return row['user_id']
+
+    @cached('session:{0}', 'sessions')
+    def _get_session(self, sid):
+        cur = self.conn.cursor()
+        cur.execute('SELECT user_id, expires_at FROM sessions WHERE id=?', (sid,))
+        r = cur.fetchone()
+        return dict(r) if r else None
+
+    @invalidates('session:{0}')
+    def delete_session(self, sid):
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM sessions WHERE id=?', (sid,))
+        self.conn.commit()
+
+    @invalidates('sessions')
+    def delete_user_sessions(self, user_id):
+        """Sign a user out everywhere"""
+        cur = self.conn.cursor()
+        cur.execute('DELETE FROM sessions WHERE user_id=?', (user_id,))
+        self.conn.commit()
+        return cur.rowcount
+
     # Venues
+    @invalidates('venues')
     def create_venue(self, name, address, capacity):
         cur = self.conn.cursor()
         cur.execute('INSERT INTO venues (name,address,capacity) VALUES (?,?,?)', (name, address, capacity))
         self.conn.commit()
         return cur.lastrowid
 
+    @cached('venues')
     def get_venues(self):
         cur = self.conn.cursor()
         cur.execute('SELECT id,name,address,capacity FROM venues ORDER BY id')
         return cur.fetchall()
 
+    @cached('venues')
     def get_venue(self, venue_id):
         """Get a single venue by ID"""
         cur = self.conn.cursor()
@@ -140,43 +1556,239 @@ class DB:
         return cur.fetchone()
 
     # Events & schedules
-    def create_event(self, title, description, venue_id, organizer_id, capacity, start=None, end=None):
+    @invalidates('events')
+    def create_event(self, title, description, venue_id, organizer_id, capacity, start=None, end=None, rrule=None):
+        """
+        Create an event. With an rrule (e.g. 'FREQ=WEEKLY;COUNT=52') start/end
+        is the first occurrence of a series; a bad rule raises ValueError
+        before anything is written.
+        """
         cur = self.conn.cursor()
+        recurrence = None
+        if rrule:
+            if not start:
+                raise ValueError('A recurring event needs a start time')
+            recurrence = self._recurrence_row(cur, rrule, start, end)
         cur.execute('INSERT INTO events (title,description,venue_id,organizer_id,capacity) VALUES (?,?,?,?,?)',
                     (title, description, venue_id, organizer_id, capacity))
         eid = cur.lastrowid
         if start:
-            cur.execute('INSERT INTO schedules (event_id,start,end) VALUES (?,?,?)', (eid, start, end))
+            cur.execute(SCHEDULE_INSERT, (eid, start, end))
+        if recurrence:
+            cur.execute(RECURRENCE_INSERT, (eid,) + recurrence)
         self.conn.commit()
         return eid
 
-    def get_events(self):
+    def _recurrence_row(self, cur, rrule, start, end):
+        """Validate an RRULE against its first occurrence; returns the recurrences row after event_id"""
+        rule = parse_rrule(rrule)
+        cur.execute("SELECT CAST(strftime('%s', ?) AS INTEGER), CAST(strftime('%s', ?) AS INTEGER)", (start, end))
+        start_ts, end_ts = cur.fetchone()
+        if start_ts is None:
+            raise ValueError('A recurring event needs a valid start time')
+        duration = end_ts - start_ts if end_ts is not None and end_ts > start_ts else None
+        if duration is not None and duration >= min_gap(rule):
+            raise ValueError('Each occurrence must end before the next one starts')
+        last_ts = last_start(rule, start_ts)
+        if last_ts is None:
+            raise ValueError('The recurrence ends before the first occurrence')
+        return (rrule.strip().upper(), rule.freq, rule.interval, start_ts, duration, last_ts)
+
+    @cached('event:{0}')
+    def get_recurrence(self, event_id):
+        """An event's series rule as {rrule, summary, last_start, last_ts}, or None for a one-off event"""
         cur = self.conn.cursor()
-        cur.execute('''
-        SELECT e.id,e.title,e.description,e.capacity,e.organizer_id, v.name as venue_name, v.address as venue_address, s.start, s.end, u.name as organizer_name, u.email as organizer_email
-        FROM events e
-        LEFT JOIN venues v ON e.venue_id=v.id
-        LEFT JOIN schedules s ON s.event_id=e.id
-        LEFT JOIN users u ON e.organizer_id=u.id
-        ORDER BY s.start IS NULL, s.start
-        ''')
-        rows = cur.fetchall()
-        return [dict(r) for r in rows]
+        cur.execute(f'SELECT rrule, last_ts, {_sql_time("last_ts")} AS last_start FROM recurrences WHERE event_id=?', (event_id,))
+        r = cur.fetchone()
+        if not r:
+            return None
+        return dict(r, summary=describe(parse_rrule(r['rrule'])))
 
-    def search_events(self, q):
+    @cached('events', 'venues', 'users')
+    def get_occurrences(self, start, end, limit=None, after=None, exclude_organizer_id=None, event_id=None):
+        """
+        Occurrences starting in [start, end) (epoch seconds), one-off events and
+        expanded series alike, ordered by start. Series are expanded only
+        inside the window. With a limit, returns a Page following `after`.
+        """
         cur = self.conn.cursor()
-        qlike = f"%{q}%"
-        cur.execute('''
-        SELECT e.id,e.title,e.description,e.capacity,e.organizer_id, v.name as venue_name, v.address as venue_address, s.start, s.end, u.name as organizer_name, u.email as organizer_email
-        FROM events e
+        params = {'lo': start, 'hi': end}
+        rules, singles, where = 'SELECT * FROM recurrences', '', '1'
+        if event_id is not None:
+            rules += ' WHERE event_id = :event_id'
+            singles = ' AND s.event_id = :event_id'
+            params['event_id'] = event_id
+        if exclude_organizer_id is not None:
+            where += ' AND e.organizer_id IS NOT :exclude'
+            params['exclude'] = exclude_organizer_id
+        key = decode_cursor(after) if limit is not None else None
+        if key:
+            # Nothing before the cursor is needed, so expansion can start there
+            where += ' AND (o.start_ts, o.event_id) > (:after_ts, :after_id)'
+            params.update(after_ts=key[0], after_id=key[1], lo=max(start, key[0]))
+        cur.execute(f'''
+        WITH RECURSIVE {_occurrences_cte('occ', rules, overlap=False)}
+        SELECT e.id, e.title, e.description, e.capacity, e.organizer_id,
+               v.name as venue_name, v.address as venue_address, o.start, o.end, o.start_ts,
+               u.name as organizer_name, u.email as organizer_email
+        FROM (
+            SELECT event_id, start_ts, {_sql_time('start_ts')} AS start, {_sql_time('end_ts')} AS end FROM occ
+            UNION ALL
+            SELECT s.event_id, s.start_ts, s.start, s.end FROM schedules s
+            WHERE s.start_ts >= :lo AND s.start_ts < :hi {singles}
+            AND NOT EXISTS (SELECT 1 FROM recurrences r WHERE r.event_id = s.event_id)
+        ) o
+        JOIN events e ON e.id=o.event_id
         LEFT JOIN venues v ON e.venue_id=v.id
-        LEFT JOIN schedules s ON s.event_id=e.id
         LEFT JOIN users u ON e.organizer_id=u.id
-        WHERE e.title LIKE ? OR e.description LIKE ? OR v.name LIKE ?
-        ORDER BY s.start IS NULL, s.start
-        ''', (qlike, qlike, qlike))
+        WHERE {where}
+        ORDER BY o.start_ts, o.event_id
+        {'LIMIT :limit' if limit is not None else ''}
+        ''', dict(params, limit=(limit or 0) + 1))
+        if limit is not None:
+            return _page(cur.fetchall(), limit, ('start_ts', 'id'))
         return [dict(r) for r in cur.fetchall()]
 
+    @cached('events', 'venues', 'users')
+    def get_events(self, limit=None, after=None, exclude_organizer_id=None):
+        """
+        List events by start time, unscheduled ones last. With a limit, returns
+        a Page of events following the `after` cursor.
+        """
+        cur = self.conn.cursor()
+        extra, extra_params = '', []
+        if exclude_organizer_id is not None:
+            extra, extra_params = ' AND e.organizer_id IS NOT ?', [exclude_organizer_id]
+
+        if limit is None:
+            cur.execute(f'''
+            SELECT {EVENT_COLUMNS}
+            FROM events e
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN schedules s ON s.event_id=e.id
+            LEFT JOIN users u ON e.organizer_id=u.id
+            WHERE 1 {extra}
+            ORDER BY s.start IS NULL, s.start
+            ''', extra_params)
+            rows = cur.fetchall()
+            return [dict(r) for r in rows]
+
+        # Scheduled events walk idx_schedules_start, then unscheduled ones follow by id
+        key = decode_cursor(after)
+        rows = []
+        if key is None or key[0] is not None:
+            where, params = 's.start IS NOT NULL' + extra, list(extra_params)
+            if key:
+                where += ' AND (s.start, s.event_id) > (?, ?)'
+                params += list(key)
+            cur.execute(f'''
+            SELECT {EVENT_COLUMNS}
+            FROM schedules s
+            JOIN events e ON e.id=s.event_id
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN users u ON e.organizer_id=u.id
+            WHERE {where}
+            ORDER BY s.start, s.event_id
+            LIMIT ?
+            ''', params + [limit + 1])
+            rows = cur.fetchall()
+        if len(rows) <= limit:
+            where, params = 's.start IS NULL' + extra, list(extra_params)
+            if key and key[0] is None:
+                where += ' AND e.id > ?'
+                params.append(key[1])
+            cur.execute(f'''
+            SELECT {EVENT_COLUMNS}
+            FROM events e
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN schedules s ON s.event_id=e.id
+            LEFT JOIN users u ON e.organizer_id=u.id
+            WHERE {where}
+            ORDER BY e.id
+            LIMIT ?
+            ''', params + [limit + 1 - len(rows)])
+            rows += cur.fetchall()
+        return _page(rows, limit, ('start', 'id'))
+
+    def _fts_query(self, q):
+        """Turn free text into an FTS5 prefix query, or None when FTS can't serve it"""
+        if not self.has_fts:
+            return None
+        terms = re.findall(r'\w+', q)
+        if not terms:
+            return None
+        # Every term must match, each as a prefix ("tech work" finds "Tech Workshop")
+        return ' '.join(f'"{t}"*' for t in terms)
+
+    def search_events(self, q, limit=None, after=None, exclude_organizer_id=None):
+        """
+        Search events by title, description and venue name. With FTS5 the
+        results are ranked by bm25 and carry title_highlight and
+        description_highlight with matches wrapped in HIGHLIGHT_START/END.
+        With a limit, returns a Page following the `after` cursor.
+        """
+        cur = self.conn.cursor()
+        extra, extra_params = '', []
+        if exclude_organizer_id is not None:
+            extra, extra_params = ' AND e.organizer_id IS NOT ?', [exclude_organizer_id]
+        match = self._fts_query(q)
+        if match is None:
+            qlike = f"%{q}%"
+            where, params = '1', []
+            if limit is not None:
+                where, params = _start_keyset(after, 'e.id')
+            cur.execute(f'''
+            SELECT {EVENT_COLUMNS}
+            FROM events e
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN schedules s ON s.event_id=e.id
+            LEFT JOIN users u ON e.organizer_id=u.id
+            WHERE (e.title LIKE ? OR e.description LIKE ? OR v.name LIKE ?) AND {where} {extra}
+            ORDER BY s.start IS NULL, s.start, e.id
+            {'LIMIT ?' if limit is not None else ''}
+            ''', [qlike, qlike, qlike] + params + extra_params + ([limit + 1] if limit is not None else []))
+            if limit is not None:
+                return _page(cur.fetchall(), limit, ('start', 'id'))
+            return [dict(r) for r in cur.fetchall()]
+
+        if limit is None:
+            cur.execute(f'''
+            SELECT {EVENT_COLUMNS},
+                   highlight(events_fts, 0, ?, ?) as title_highlight,
+                   highlight(events_fts, 1, ?, ?) as description_highlight
+            FROM events_fts
+            JOIN events e ON e.id=events_fts.rowid
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN schedules s ON s.event_id=e.id
+            LEFT JOIN users u ON e.organizer_id=u.id
+            WHERE events_fts MATCH ? {extra}
+            ORDER BY bm25(events_fts, ?, ?, ?)
+            ''', (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, match, *extra_params) + SEARCH_WEIGHTS)
+            return [dict(r) for r in cur.fetchall()]
+
+        # Ranked pages resume after the (score, id) of the previous page's last hit.
+        # Every match is ranked, but the venue, schedule and organizer lookups and
+        # the highlights are result columns, worked out for that page only (in a
+        # subquery's select list they would be computed for every match).
+        keyset, key_params = '', []
+        key = decode_cursor(after)
+        if key:
+            keyset, key_params = ' AND (bm25(events_fts, ?, ?, ?), e.id) > (?, ?)', list(SEARCH_WEIGHTS) + list(key)
+        cur.execute(f'''
+        SELECT {EVENT_COLUMNS_BY_LOOKUP},
+               highlight(events_fts, 0, ?, ?) as title_highlight,
+               highlight(events_fts, 1, ?, ?) as description_highlight,
+               bm25(events_fts, ?, ?, ?) as score
+        FROM events_fts
+        JOIN events e ON e.id=events_fts.rowid
+        WHERE events_fts MATCH ? {extra} {keyset}
+        ORDER BY score, e.id
+        LIMIT ?
+        ''', [HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END] + list(SEARCH_WEIGHTS) + [match]
+            + extra_params + key_params + [limit + 1])
+        return _page(cur.fetchall(), limit, ('score', 'id'))
+
+    @cached('event:{0}', 'venues', 'users')
     def get_event(self, event_id):
         cur = self.conn.cursor()
         cur.execute('''
@@ -190,7 +1802,39 @@ class DB:
         r = cur.fetchone()
         return dict(r) if r else None
 
-    def get_event_attendees(self, event_id):
+    @cached('attendees:{0}', 'users')
+    def get_event_attendees(self, event_id, limit=None, after=None):
+        """An event's attendees in sign-up order; with a limit, a Page following `after`"""
+        cur = self.conn.cursor()
+        if limit is None:
+            cur.execute('''
+            SELECT u.id,u.name,u.email,u.role, r.created_at as registration_date
+            FROM registrations r
+            JOIN users u ON u.id=r.user_id
+            WHERE r.event_id=?
+            ORDER BY r.created_at
+            ''', (event_id,))
+            return [dict(r) for r in cur.fetchall()]
+        where, params = '1', []
+        key = decode_cursor(after)
+        if key is not None:
+            where, params = '(r.created_at > ? OR (r.created_at = ? AND r.user_id > ?))', [key[0], key[0], key[1]]
+        cur.execute(f'''
+        SELECT u.id,u.name,u.email,u.role, r.created_at as registration_date
+        FROM registrations r
+        JOIN users u ON u.id=r.user_id
+        WHERE r.event_id=? AND {where}
+        ORDER BY r.created_at, r.user_id
+        LIMIT ?
+        ''', [event_id] + params + [limit + 1])
+        return _page(cur.fetchall(), limit, ('registration_date', 'id'))
+
+    def iter_event_attendees(self, event_id, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Yield an event's attendees one dict at a time, fetching batch_size rows
+        per round trip so exports of large events run in constant memory.
+        Same columns and order as get_event_attendees; bypasses the cache.
+        """
         cur = self.conn.cursor()
         cur.execute('''
         SELECT u.id,u.name,u.email,u.role, r.created_at as registration_date
@@ -199,125 +1843,444 @@ class DB:
         WHERE r.event_id=?
         ORDER BY r.created_at
         ''', (event_id,))
-        return [dict(r) for r in cur.fetchall()]
+        yield from _iter_batches(cur, batch_size)
 
-    def register_user_for_event(self, user_id, event_id):
+    def iter_event_report(self, batch_size=EXPORT_BATCH_SIZE):
+        """Yield one dict per event with its schedule, venue, organizer and seat counts, in event id order"""
+        cur = self.conn.cursor()
+        cur.execute('''
+        SELECT e.id, e.title, s.start, s.end, v.name as venue_name,
+               u.name as organizer_name, u.email as organizer_email,
+               e.capacity, e.registered_count
+        FROM events e
+        LEFT JOIN venues v ON e.venue_id=v.id
+        LEFT JOIN schedules s ON s.event_id=e.id
+        LEFT JOIN users u ON e.organizer_id=u.id
+        ORDER BY e.id
+        ''')
+        yield from _iter_batches(cur, batch_size)
+
+    def get_registration_summary(self, user_id=None, event_ids=None):
+        """
+        Get registration counts for many events in one query, read from the
+        maintained events.registered_count counter.
+        Returns {event_id: {'registered_count', 'is_full', 'is_registered'}}
+        where is_registered refers to user_id.
+        """
         cur = self.conn.cursor()
-        # check duplicate
+        query = '''
+        SELECT e.id, e.capacity, e.registered_count,
+               EXISTS(SELECT 1 FROM registrations r WHERE r.event_id=e.id AND r.user_id=?) as is_registered
+        FROM events e
+        '''
+        if event_ids is None:
+            cur.execute(query, (user_id,))
+            rows = cur.fetchall()
+        else:
+            # Chunk the id list to stay under SQLite's bound parameter limit
+            event_ids = list(event_ids)
+            rows = []
+            for i in range(0, len(event_ids), 500):
+                chunk = event_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cur.execute(query + f' WHERE e.id IN ({placeholders})',
+                            [user_id] + chunk)
+                rows.extend(cur.fetchall())
+
+        summary = {}
+        for r in rows:
+            cap = r['capacity']
+            summary[r['id']] = {
+                'registered_count': r['registered_count'],
+                'is_full': cap is not None and r['registered_count'] >= cap,
+                'is_registered': bool(r['is_registered'])
+            }
+        return summary
+
+    @publishes_seats(1)
+    @invalidates('attendees:{1}')
+    def register_user_for_event(self, user_id, event_id):
+        """
+        Register a user for an event. The capacity check and the insert are a
+        single conditional INSERT run under BEGIN IMMEDIATE, so concurrent
+        registrations can never oversell an event.
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            if not self._take_seat(cur, user_id, event_id):
+                raise Exception('Event is full')
+            conn.commit()
+            return cur.lastrowid
+        except Exception:
+            conn.rollback()
+            raise
+
+    def register_batch(self, requests):
+        """
+        Register many (user_id, event_id) pairs in one write transaction, in
+        order. Each pair gets the same capacity check as
+        register_user_for_event; a failure only skips that pair. Returns a
+        list of (registration_id, None) or (None, error message).
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        results = []
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            for user_id, event_id in requests:
+                try:
+                    if self._take_seat(cur, user_id, event_id):
+                        results.append((cur.lastrowid, None))
+                    else:
+                        results.append((None, 'Event is full'))
+                except Exception as e:
+                    results.append((None, str(e)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(*{f'attendees:{event_id}' for _, event_id in requests})
+        self._publish_seats({event_id for (_, event_id), (_, error) in zip(requests, results) if not error})
+        return results
+
+    def _take_seat(self, cur, user_id, event_id):
+        """Conditionally register inside the caller's transaction; False if the event is full"""
+        try:
+            cur.execute('''
+            INSERT INTO registrations (event_id,user_id,created_at)
+            SELECT id, ?, ? FROM events
+            WHERE id=? AND (capacity IS NULL OR registered_count < capacity)
+            ''', (user_id, datetime.utcnow().isoformat(), event_id))
+        except sqlite3.IntegrityError as e:
+            # The user was deleted while the request was in flight
+            if 'FOREIGN KEY' in str(e):
+                raise Exception('User not found')
+            raise Exception('Already registered')
+        if cur.rowcount:
+            return True
         cur.execute('SELECT count(*) FROM registrations WHERE user_id=? AND event_id=?', (user_id, event_id))
         if cur.fetchone()[0] > 0:
             raise Exception('Already registered')
-        # check capacity
-        cur.execute('SELECT capacity FROM events WHERE id=?', (event_id,))
-        row = cur.fetchone()
-        if not row:
+        cur.execute('SELECT 1 FROM events WHERE id=?', (event_id,))
+        if not cur.fetchone():
             raise Exception('Event not found')
-        cap = row[0]
-        cur.execute('SELECT count(*) FROM registrations WHERE event_id=?', (event_id,))
-        regcount = cur.fetchone()[0]
-        if cap is not None and regcount >= cap:
-            raise Exception('Event is full')
-        cur.execute('INSERT INTO registrations (event_id,user_id,created_at) VALUES (?,?,?)',
-                    (event_id, user_id, datetime.utcnow().isoformat()))
-        self.conn.commit()
-        return cur.lastrowid
+        return False
 
+    @publishes_seats(1)
+    @invalidates('attendees:{1}')
     def unregister_user_from_event(self, user_id, event_id):
-        """Remove a user's registration from an event"""
+        """Remove a user's registration from an event, promoting the head of its waitlist"""
+        return self._release_seat(user_id, event_id)
+
+    def _release_seat(self, user_id, event_id):
+        """Delete a registration and fill the freed seat from the waitlist in one transaction"""
+        conn = self.conn
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            cur.execute('DELETE FROM registrations WHERE user_id=? AND event_id=?', (user_id, event_id))
+            removed = cur.rowcount > 0
+            if removed:
+                _promote_waitlist(cur, event_id)
+            conn.commit()
+            return removed
+        except Exception:
+            conn.rollback()
+            raise
+
+    # Waitlist
+    @publishes_seats(1)
+    @invalidates('attendees:{1}')
+    def join_waitlist(self, user_id, event_id):
+        """
+        Queue a user for a full event. If a seat is free by the time this runs
+        the user is registered instead. Returns {'status': 'registered'} or
+        {'status': 'waitlisted', 'position': n}.
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            if self._take_seat(cur, user_id, event_id):
+                conn.commit()
+                return {'status': 'registered'}
+            try:
+                cur.execute('INSERT INTO waitlist (event_id,user_id,created_at) VALUES (?,?,?)',
+                            (event_id, user_id, datetime.utcnow().isoformat()))
+            except sqlite3.IntegrityError:
+                raise Exception('Already on the waitlist')
+            position = self._waitlist_position(cur, cur.lastrowid, event_id)
+            conn.commit()
+            return {'status': 'waitlisted', 'position': position}
+        except Exception:
+            conn.rollback()
+            raise
+
+    @publishes_seats(1)
+    def leave_waitlist(self, user_id, event_id):
         cur = self.conn.cursor()
-        cur.execute('DELETE FROM registrations WHERE user_id=? AND event_id=?', (user_id, event_id))
+        cur.execute('DELETE FROM waitlist WHERE user_id=? AND event_id=?', (user_id, event_id))
         self.conn.commit()
         return cur.rowcount > 0
 
-    def get_registrations_by_user(self, user_id):
+    def get_waitlist_position(self, user_id, event_id):
+        """1-based place in the event's queue, or None if the user isn't waitlisted"""
+        cur = self.conn.cursor()
+        cur.execute('SELECT id FROM waitlist WHERE event_id=? AND user_id=?', (event_id, user_id))
+        row = cur.fetchone()
+        return self._waitlist_position(cur, row[0], event_id) if row else None
+
+    def _waitlist_position(self, cur, entry_id, event_id):
+        # Prefix sum down the Fenwick tree: at most log2(WAITLIST_SPAN) primary key lookups
+        cur.execute('''
+        WITH RECURSIVE down(i) AS (SELECT ? UNION ALL SELECT i - (i & -i) FROM down WHERE i - (i & -i) > 0)
+        SELECT coalesce(sum(n), 0) FROM waitlist_counts WHERE event_id=? AND node IN down
+        ''', (entry_id, event_id))
+        return cur.fetchone()[0]
+
+    def get_waitlist(self, event_id):
+        """An event's queue in order, for organizers"""
         cur = self.conn.cursor()
         cur.execute('''
-        SELECT r.event_id, e.title as event_title, e.description, e.capacity, s.start, s.end, v.name as venue_name, v.address as venue_address, u.name as organizer_name, u.email as organizer_email, r.created_at as registration_date
+        SELECT u.id,u.name,u.email, w.created_at as joined_at
+        FROM waitlist w JOIN users u ON u.id=w.user_id
+        WHERE w.event_id=?
+        ORDER BY w.id
+        ''', (event_id,))
+        return [dict(r) for r in cur.fetchall()]
+
+    def get_waitlist_count(self, event_id):
+        cur = self.conn.cursor()
+        cur.execute('SELECT count(*) FROM waitlist WHERE event_id=?', (event_id,))
+        return cur.fetchone()[0]
+
+    def get_seat_counts(self, event_ids):
+        """
+        {event_id: {'capacity', 'registered_count', 'waitlist_count', 'version'}}
+        read fresh, with {'deleted': True, 'version'} for ids that no longer
+        exist. version grows with every events/waitlist write, so of two
+        readings the one with the higher version is current.
+        """
+        event_ids = list(dict.fromkeys(event_ids))
+        cur = self.conn.cursor()
+        cur.execute("SELECT SUM(version) FROM table_versions WHERE name IN ('events', 'waitlist')")
+        version = cur.fetchone()[0]
+        counts = {event_id: {'deleted': True, 'version': version} for event_id in event_ids}
+        for i in range(0, len(event_ids), 500):
+            chunk = event_ids[i:i + 500]
+            cur.execute(f'''
+            SELECT e.id, e.capacity, e.registered_count,
+                   (SELECT COUNT(*) FROM waitlist w WHERE w.event_id=e.id) AS waitlist_count
+            FROM events e WHERE e.id IN ({",".join("?" * len(chunk))})
+            ''', chunk)
+            for r in cur.fetchall():
+                counts[r['id']] = {'capacity': r['capacity'], 'registered_count': r['registered_count'],
+                                   'waitlist_count': r['waitlist_count'], 'version': version}
+        return counts
+
+    def _publish_seats(self, event_ids):
+        """Hand fresh seat counts for event_ids to each seat listener; called once the write has committed"""
+        if self.seat_listeners and event_ids:
+            counts = self.get_seat_counts(event_ids)
+            for listener in self.seat_listeners:
+                listener(counts)
+
+    def get_registrations_by_user(self, user_id, limit=None, after=None, when=None):
+        """
+        A user's registrations by event start, each with a computed status;
+        when='upcoming' or 'past' filters on the start time in SQL. With a
+        limit, a Page following `after`.
+        """
+        cur = self.conn.cursor()
+        where, params = '1', []
+        if limit is not None:
+            where, params = _start_keyset(after, 'r.event_id')
+        if when is not None:
+            where = f'{where} AND {SCHEDULE_WHEN[when]}'
+        cur.execute(f'''
+        SELECT r.event_id, e.title as event_title, e.description, e.capacity, s.start, s.end, v.name as venue_name, v.address as venue_address, u.name as organizer_name, u.email as organizer_email, r.created_at as registration_date,
+               {SCHEDULE_STATUS} as status
         FROM registrations r
         JOIN events e ON e.id=r.event_id
         LEFT JOIN schedules s ON s.event_id=e.id
         LEFT JOIN venues v ON v.id=e.venue_id
         LEFT JOIN users u ON u.id=e.organizer_id
-        WHERE r.user_id=?
-        ORDER BY s.start IS NULL, s.start
-        ''', (user_id,))
+        WHERE r.user_id=? AND {where}
+        ORDER BY s.start IS NULL, s.start, r.event_id
+        {'LIMIT ?' if limit is not None else ''}
+        ''', [user_id] + params + ([limit + 1] if limit is not None else []))
+        if limit is not None:
+            return _page(cur.fetchall(), limit, ('start', 'event_id'))
         return [dict(r) for r in cur.fetchall()]
 
-    def get_events_by_organizer(self, org_id):
+    def get_events_by_organizer(self, org_id, limit=None, after=None):
+        """An organizer's events by start, each with a computed status; with a limit, a Page following `after`"""
         cur = self.conn.cursor()
-        cur.execute('''
-        SELECT e.id,e.title,e.description,e.capacity, v.name as venue_name, s.start
+        where, params = '1', []
+        if limit is not None:
+            where, params = _start_keyset(after, 'e.id')
+        cur.execute(f'''
+        SELECT e.id,e.title,e.description,e.capacity, v.name as venue_name, s.start,
+               {SCHEDULE_STATUS} as status
         FROM events e
         LEFT JOIN venues v ON e.venue_id=v.id
         LEFT JOIN schedules s ON s.event_id=e.id
-        WHERE e.organizer_id=?
-        ORDER BY s.start IS NULL, s.start
-        ''', (org_id,))
+        WHERE e.organizer_id=? AND {where}
+        ORDER BY s.start IS NULL, s.start, e.id
+        {'LIMIT ?' if limit is not None else ''}
+        ''', [org_id] + params + ([limit + 1] if limit is not None else []))
+        if limit is not None:
+            return _page(cur.fetchall(), limit, ('start', 'id'))
+        return [dict(r) for r in cur.fetchall()]
+
+    def find_venue_conflicts(self, venue_id, start_time, end_time=None, exclude_event_id=None, rrule=None):
+        """
+        List events booked at a venue whose time span overlaps [start_time, end_time).
+        A missing end counts as one minute from the start, for both the
+        requested slot and existing bookings. With an rrule the slot is the
+        first occurrence of a series and every occurrence is checked, against
+        one-off bookings and other series alike, in a single query.
+        """
+        cur = self.conn.cursor()
+        cur.execute("SELECT CAST(strftime('%s', ?) AS INTEGER), CAST(strftime('%s', ?) AS INTEGER)",
+                    (start_time, end_time))
+        start_ts, end_ts = cur.fetchone()
+        if start_ts is None:
+            return []
+        span = max(end_ts or 0, start_ts + 60) - start_ts
+        params = {'venue': venue_id, 'start_ts': start_ts, 'span': span,
+                  'lo': start_ts, 'hi': start_ts + span, 'exclude': exclude_event_id}
+        if rrule:
+            rule = parse_rrule(rrule)
+            last_ts = last_start(rule, start_ts)
+            if last_ts is None:
+                return []
+            params.update(freq=rule.freq, interval=rule.interval, last_ts=last_ts, hi=last_ts + span)
+            requested = _occurrences_cte('requested', '''
+                SELECT 0 AS event_id, :freq AS freq, :interval AS interval, :start_ts AS start_ts,
+                       :span AS duration, :last_ts AS last_ts''')
+            slot = 'slot(start_ts, end_ts) AS (SELECT start_ts, span_end FROM requested)'
+        else:
+            requested = ''
+            slot = 'slot(start_ts, end_ts) AS (SELECT :start_ts, :start_ts + :span)'
+
+        if self.has_rtree:
+            bookings, overlaps = 'venue_bookings', '''b.venue_lo <= :venue AND b.venue_hi >= :venue
+            AND b.start_lo < slot.end_ts AND b.end_hi > slot.start_ts
+            AND b.start_ts < slot.end_ts AND b.end_ts > slot.start_ts'''
+        else:
+            # SQLite built without R*Tree
+            bookings, overlaps = 'schedule_spans', '''b.venue_id = :venue
+            AND b.start_ts < slot.end_ts AND b.end_ts > slot.start_ts'''
+        # Other series at the venue, each expanded only inside each requested slot.
+        # The CROSS JOINs fix the loop order: each slot probes the bookings index on
+        # venue and time, and series are found from recurrences rather than by
+        # walking every event at the venue.
+        booked = _occurrences_cte('booked', '''
+            SELECT r.*, slot.start_ts AS slot_start, slot.end_ts AS slot_end
+            FROM slot CROSS JOIN recurrences r CROSS JOIN events e
+            WHERE e.id = r.event_id AND e.venue_id = :venue AND r.event_id IS NOT :exclude
+            AND r.last_ts >= :lo - MAX(COALESCE(r.duration, 0), 60)''', lo='r.slot_start', hi='r.slot_end')
+
+        cur.execute(f'''
+        WITH RECURSIVE {requested + ',' if requested else ''} {slot}, {booked}
+        SELECT e.id, e.title, s.start, s.end
+        FROM slot
+        CROSS JOIN {bookings} b
+        JOIN events e ON e.id=b.event_id
+        JOIN schedules s ON s.id=b.id
+        WHERE {overlaps}
+        AND b.event_id IS NOT :exclude
+        -- A series' first occurrence is in the bookings too; it is matched below
+        AND NOT EXISTS (SELECT 1 FROM recurrences r WHERE r.event_id = b.event_id)
+        UNION
+        SELECT e.id, e.title, {_sql_time('o.start_ts')}, {_sql_time('o.end_ts')}
+        FROM booked o
+        JOIN events e ON e.id=o.event_id
+        ORDER BY 3
+        ''', params)
         return [dict(r) for r in cur.fetchall()]
 
-    def check_venue_availability(self, venue_id, start_time, end_time, exclude_event_id=None):
+    def check_venue_availability(self, venue_id, start_time, end_time=None, exclude_event_id=None):
         """
         Check if a venue is available for the specified time slot.
         Returns True if available, False if there's a conflict.
         """
-        cur = self.conn.cursor()
-        
-        # Check for overlapping events at the same venue
-        query = '''
-        SELECT COUNT(*) FROM events e
-        JOIN schedules s ON e.id = s.event_id
-        WHERE e.venue_id = ? 
-        AND ((s.start <= ? AND s.end > ?) OR 
-             (s.start < ? AND s.end >= ?) OR
-             (s.start >= ? AND s.end <= ?))
-        '''
-        params = [venue_id, start_time, start_time, end_time, end_time, start_time, end_time]
-        
-        # Exclude current event if updating
-        if exclude_event_id:
-            query += ' AND e.id != ?'
-            params.append(exclude_event_id)
-            
-        cur.execute(query, params)
-        conflict_count = cur.fetchone()[0]
-        
-        return conflict_count == 0
+        return not self.find_venue_conflicts(venue_id, start_time, end_time, exclude_event_id)
     
+    @publishes_seats(0)
+    @invalidates('events', 'event:{0}', 'attendees:{0}')
     def update_event(self, event_id, title, description, venue_id, capacity, start=None, end=None):
-        """Update an existing event"""
+        """Update an existing event; a new start re-anchors its recurrence, if any"""
         cur = self.conn.cursor()
+        recurrence = None
+        if start:
+            cur.execute('SELECT rrule FROM recurrences WHERE event_id=?', (event_id,))
+            r = cur.fetchone()
+            if r:
+                # Validate before writing anything
+                recurrence = self._recurrence_row(cur, r['rrule'], start, end)
         cur.execute('''UPDATE events 
                       SET title=?, description=?, venue_id=?, capacity=? 
                       WHERE id=?''', 
                    (title, description, venue_id, capacity, event_id))
+        updated = cur.rowcount > 0
         
         # Update schedule if provided
         if start:
             cur.execute('DELETE FROM schedules WHERE event_id=?', (event_id,))
-            cur.execute('INSERT INTO schedules (event_id,start,end) VALUES (?,?,?)', 
-                       (event_id, start, end))
+            cur.execute(SCHEDULE_INSERT, (event_id, start, end))
+            if recurrence:
+                cur.execute('DELETE FROM recurrences WHERE event_id=?', (event_id,))
+                cur.execute(RECURRENCE_INSERT, (event_id,) + recurrence)
         
+        # A raised capacity admits people from the waitlist
+        _promote_waitlist(cur, event_id)
         self.conn.commit()
-        return cur.rowcount > 0
+        return updated
 
     def delete_event(self, event_id):
         """Delete an event and all related data"""
-        cur = self.conn.cursor()
-        # Delete in order: registrations, schedules, then event
-        cur.execute('DELETE FROM registrations WHERE event_id=?', (event_id,))
-        cur.execute('DELETE FROM schedules WHERE event_id=?', (event_id,))
-        cur.execute('DELETE FROM events WHERE id=?', (event_id,))
-        self.conn.commit()
-        return cur.rowcount > 0
+        return self.delete_events([event_id])['events'] > 0
 
+    def delete_events(self, event_ids):
+        """
+        Delete many events in one transaction; ON DELETE CASCADE removes their
+        schedules, recurrences, registrations and waitlists. Returns the number
+        of rows removed per table.
+        """
+        conn = self.conn
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            _fill_id_set(cur, event_ids)
+            counts = _cascade_counts(cur, 'events')
+            cur.execute('DELETE FROM events WHERE id IN (SELECT id FROM temp.id_set)')
+            counts['events'] = cur.rowcount
+            cur.execute('DELETE FROM temp.id_set')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate('events', *[f'event:{event_id}' for event_id in event_ids],
+                                      *[f'attendees:{event_id}' for event_id in event_ids])
+        self._publish_seats(event_ids)
+        del counts['waitlist_counts']
+        return counts
+
+    @publishes_seats(1)
+    @invalidates('attendees:{1}')
     def remove_user_from_event(self, user_id, event_id):
-        """Remove a specific user's registration from an event (for organizers/admins)"""
-        cur = self.conn.cursor()
-        cur.execute('DELETE FROM registrations WHERE user_id=? AND event_id=?', 
-                   (user_id, event_id))
-        self.conn.commit()
-        return cur.rowcount > 0
+        """Remove a specific user's registration from an event (for organizers/admins), promoting from the waitlist"""
+        return self._release_seat(user_id, event_id)
 
+    @cached('event:{0}', 'venues', 'users')
     def get_event_with_organizer(self, event_id):
         """Get event details including organizer info"""
         cur = self.conn.cursor()
@@ -357,17 +2320,31 @@ class DB:
         from datetime import datetime
         cur = self.conn.cursor()
         now = datetime.now().isoformat()
-        qlike = f"%{q}%"
-        
+        match = self._fts_query(q)
+        if match is None:
+            qlike = f"%{q}%"
+            cur.execute('''
+            SELECT e.id,e.title,e.description,e.capacity, v.name as venue_name, s.start, s.end
+            FROM events e
+            LEFT JOIN venues v ON e.venue_id=v.id
+            LEFT JOIN schedules s ON s.event_id=e.id
+            WHERE (s.end IS NULL OR s.end > ?) 
+            AND (e.title LIKE ? OR e.description LIKE ? OR v.name LIKE ?)
+            ORDER BY s.start IS NULL, s.start
+            ''', (now, qlike, qlike, qlike))
+            return [dict(r) for r in cur.fetchall()]
+
         cur.execute('''
-        SELECT e.id,e.title,e.description,e.capacity, v.name as venue_name, s.start, s.end
-        FROM events e
+        SELECT e.id,e.title,e.description,e.capacity, v.name as venue_name, s.start, s.end,
+               highlight(events_fts, 0, ?, ?) as title_highlight,
+               highlight(events_fts, 1, ?, ?) as description_highlight
+        FROM events_fts
+        JOIN events e ON e.id=events_fts.rowid
         LEFT JOIN venues v ON e.venue_id=v.id
         LEFT JOIN schedules s ON s.event_id=e.id
-        WHERE (s.end IS NULL OR s.end > ?) 
-        AND (e.title LIKE ? OR e.description LIKE ? OR v.name LIKE ?)
-        ORDER BY s.start IS NULL, s.start
-        ''', (now, qlike, qlike, qlike))
+        WHERE events_fts MATCH ? AND (s.end IS NULL OR s.end > ?)
+        ORDER BY bm25(events_fts, ?, ?, ?)
+        ''', (HIGHLIGHT_START, HIGHLIGHT_END, HIGHLIGHT_START, HIGHLIGHT_END, match, now) + SEARCH_WEIGHTS)
         return [dict(r) for r in cur.fetchall()]
 
     def get_all_users(self):
@@ -376,47 +2353,146 @@ class DB:
         cur.execute('SELECT id,name,email,role,password_hash FROM users ORDER BY id')
         return cur.fetchall()
 
+    def bulk_import(self, kind, records, source=None, batch_size=5000, progress=None):
+        """
+        Load users, venues, events or registrations from an iterable of dicts.
+        Rows are validated, then inserted with executemany, one transaction
+        per batch. Invalid rows are reported and skipped; duplicates (and
+        rows referencing unknown events, users or venues) are counted as skipped.
+
+        When source is given (e.g. the file path) the number of records
+        consumed is checkpointed with each batch, so a rerun after a failure
+        resumes where the last committed batch ended.
+        Returns a summary dict including rows_per_sec.
+        """
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f'Unknown import kind {kind!r}')
+        validate, insert_sql = IMPORT_KINDS[kind]
+        conn = self.conn
+        cur = conn.cursor()
+        result = {'kind': kind, 'read': 0, 'inserted': 0, 'skipped': 0, 'rejected': 0,
+                  'resumed_at': 0, 'errors': []}
+
+        if source is not None:
+            cur.execute('SELECT rows_done FROM import_progress WHERE source=?', (source,))
+            row = cur.fetchone()
+            result['resumed_at'] = row[0] if row else 0
+
+        # Durability only matters per batch here; checkpoint the WAL once at the end
+        cur.execute('PRAGMA synchronous=OFF')
+        cur.execute('PRAGMA wal_autocheckpoint=0')
+        started = time.perf_counter()
+        try:
+            records = itertools.islice(records, result['resumed_at'], None)
+            number = result['resumed_at']
+            while True:
+                batch, consumed = [], 0
+                for record in itertools.islice(records, batch_size):
+                    number += 1
+                    consumed += 1
+                    try:
+                        if not isinstance(record, dict):
+                            raise ValueError('row is not an object')
+                        batch.append(validate(record))
+                    except ValueError as e:
+                        result['rejected'] += 1
+                        if len(result['errors']) < 100:
+                            result['errors'].append((number, str(e)))
+                if not consumed:
+                    break
+
+                cur.execute('BEGIN IMMEDIATE')
+                try:
+                    inserted = self._insert_import_batch(cur, kind, insert_sql, batch)
+                    if source is not None:
+                        cur.execute('''INSERT OR REPLACE INTO import_progress (source,kind,rows_done,updated_at)
+                                       VALUES (?,?,?,?)''', (source, kind, number, datetime.utcnow().isoformat()))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                result['read'] += consumed
+                result['inserted'] += inserted
+                result['skipped'] += len(batch) - inserted
+                if progress:
+                    progress(result, time.perf_counter() - started)
+        finally:
+            cur.execute('PRAGMA synchronous=NORMAL')
+            cur.execute('PRAGMA wal_autocheckpoint=1000')
+            cur.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            if self.cache is not None:
+                self.cache.clear()
+
+        result['seconds'] = time.perf_counter() - started
+        result['rows_per_sec'] = result['read'] / result['seconds'] if result['seconds'] else 0.0
+        return result
+
+    def _insert_import_batch(self, cur, kind, insert_sql, batch):
+        """Insert one validated batch inside the caller's transaction; returns rows inserted"""
+        if kind == 'registrations':
+            # Index order keeps the B-tree inserts local
+            batch.sort()
+        if kind != 'events':
+            cur.executemany(insert_sql, batch)
+            return cur.rowcount
+
+        # Events need their ids for the schedules rows: keep explicit ids that are
+        # free and number the rest after the current maximum
+        explicit = [row[0] for row in batch if row[0] is not None]
+        taken = _existing_ids(cur, 'events', explicit)
+        # Rows naming an unknown venue or organizer would fail the foreign keys; skip them
+        venues = _existing_ids(cur, 'venues', {row[3] for row in batch})
+        organizers = _existing_ids(cur, 'users', {row[4] for row in batch})
+        cur.execute('SELECT COALESCE(MAX(id), 0) FROM events')
+        next_id = max([cur.fetchone()[0]] + explicit) + 1
+        events, schedules, seen = [], [], set()
+        for row in batch:
+            if row[3] not in venues or row[4] not in organizers:
+                continue
+            event_id = row[0]
+            if event_id is None:
+                event_id, next_id = next_id, next_id + 1
+            elif event_id in taken or event_id in seen:
+                continue
+            seen.add(event_id)
+            events.append((event_id,) + row[1:6])
+            if row[6]:
+                schedules.append((event_id, row[6], row[7]))
+        cur.executemany(insert_sql, events)
+        cur.executemany(SCHEDULE_INSERT, schedules)
+        return len(events)
+
+    def get_table_versions(self, tables):
+        """
+        {table: (version, updated_at epoch)} for VERSIONED_TABLES. Deliberately
+        uncached: it is the one-row-per-table read that tells callers (and
+        other processes) whether anything else needs reading at all.
+        """
+        cur = self.conn.cursor()
+        cur.execute(f'''
+        SELECT name, version, updated_at FROM table_versions WHERE name IN ({",".join("?" * len(tables))})
+        ''', list(tables))
+        return {name: (version, updated_at) for name, version, updated_at in cur.fetchall()}
+
     def get_event_statistics(self):
-        """Get basic statistics about the system"""
+        """Get basic statistics about the system from the trigger-maintained rollup"""
         cur = self.conn.cursor()
-        
-        # Total events
-        cur.execute('SELECT COUNT(*) FROM events')
-        total_events = cur.fetchone()[0]
-        
-        # Total users
-        cur.execute('SELECT COUNT(*) FROM users')
-        total_users = cur.fetchone()[0]
-        
-        # Total venues
-        cur.execute('SELECT COUNT(*) FROM venues')
-        total_venues = cur.fetchone()[0]
-        
-        # Total registrations
-        cur.execute('SELECT COUNT(*) FROM registrations')
-        total_registrations = cur.fetchone()[0]
-        
-        # User role counts
-        cur.execute('SELECT COUNT(*) FROM users WHERE role = ?', ('attendee',))
-        attendee_count = cur.fetchone()[0]
-        
-        cur.execute('SELECT COUNT(*) FROM users WHERE role = ?', ('organizer',))
-        organizer_count = cur.fetchone()[0]
-        
-        cur.execute('SELECT COUNT(*) FROM users WHERE role = ?', ('admin',))
-        admin_count = cur.fetchone()[0]
-        
-        # Events with registrations
-        cur.execute('SELECT COUNT(DISTINCT event_id) FROM registrations')
-        events_with_registrations = cur.fetchone()[0]
-        
-        return {
-            'total_events': total_events,
-            'total_users': total_users,
-            'total_venues': total_venues,
-            'total_registrations': total_registrations,
-            'attendee_count': attendee_count,
-            'organizer_count': organizer_count,
-            'admin_count': admin_count,
-            'events_with_registrations': events_with_registrations
-        }
+        cur.execute('SELECT * FROM statistics WHERE id=1')
+        stats = dict(cur.fetchone())
+        del stats['id']
+        return stats
+
+    def check_integrity(self, repair=False):
+        """check_orphans on this database, dropping every cached read after a repair"""
+        try:
+            return check_orphans(self.conn, repair)
+        finally:
+            if repair and self.cache is not None:
+                self.cache.clear()
+
+    def refresh_statistics(self):
+        """Rebuild the statistics rollup from the base tables in one aggregated query"""
+        cur = self.conn.cursor()
+        cur.execute('INSERT OR REPLACE INTO statistics SELECT 1, * FROM (' + STATISTICS_QUERY + ')')
+        self.conn.commit()
+        return self.get_event_statistics()
@@ -1,9 +1,19 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, font
-from db import DB
-from datetime import datetime, timedelta
+from tkinter import ttk, messagebox, font, filedialog
+from db import DB, csv_cell
+from datetime import datetime
+import csv
 import re
 
+# Display text for the status column computed by DB listing queries
+STATUS_LABELS = {'past': "Past", 'soon': "Soon", 'upcoming': "Upcoming", 'tbd': "TBD", 'unknown': "Unknown"}
+
+def format_start(start):
+	"""Schedule start text as shown in the tables ('YYYY-MM-DD HH:MM', or TBD)"""
+	if not start:
+		return 'TBD'
+	return start.replace('T', ' ')[:16]
+
 class EventApp(tk.Tk):
 	def __init__(self):
 		super().__init__()
@@ -385,10 +395,11 @@ class BrowseFrame(ttk.Frame):
 		
 		query = self.search_var.get().strip()
 		events = self.app.db.search_events(query) if query else self.app.db.get_events()
+		summary = self.app.db.get_registration_summary()
 		
 		for event in events:
 			# Get registration count
-			registered_count = len(self.app.db.get_event_attendees(event['id']))
+			registered_count = summary[event['id']]['registered_count']
 			
 			# Format the start time
 			start_time = event.get('start', 'TBD')
@@ -540,7 +551,25 @@ class BrowseFrame(ttk.Frame):
 				self.app.frames['MyRegsFrame'].refresh()
 				
 		except Exception as ex:
-			messagebox.showerror("Registration Failed", str(ex))
+			if str(ex) == 'Event is full' and messagebox.askyesno(
+					"Event Full", f"'{event['title']}' is full.\n\nJoin the waitlist? You'll be registered automatically when a seat opens."):
+				self.join_waitlist(event_id, event)
+			else:
+				messagebox.showerror("Registration Failed", str(ex))
+
+	def join_waitlist(self, event_id, event):
+		try:
+			result = self.app.db.join_waitlist(self.app.current_user[0], event_id)
+		except Exception as ex:
+			messagebox.showerror("Waitlist", str(ex))
+			return
+		if result['status'] == 'registered':
+			messagebox.showinfo("Registration Successful", 
+							   f"A seat opened up - you are now registered for '{event['title']}'!")
+			self.populate()
+			self.app.frames['MyRegsFrame'].refresh()
+		else:
+			messagebox.showinfo("Waitlist", f"You're #{result['position']} on the waitlist for '{event['title']}'.")
 
 
 class MyRegsFrame(ttk.Frame):
@@ -617,37 +646,17 @@ class MyRegsFrame(ttk.Frame):
 		registrations = self.app.db.get_registrations_by_user(self.app.current_user[0])
 		
 		for reg in registrations:
-			# Format start time
-			start_time = reg.get('start', 'TBD')
-			if start_time and start_time != 'TBD':
-				try:
-					dt = datetime.fromisoformat(start_time.replace('T', ' '))
-					start_time = dt.strftime("%Y-%m-%d %H:%M")
-					
-					# Determine status based on date
-					now = datetime.now()
-					if dt < now:
-						status = "Past"
-						tags = ['past']
-					elif dt - now < timedelta(days=1):
-						status = "Soon"
-						tags = ['soon']
-					else:
-						status = "Upcoming"
-						tags = ['upcoming']
-				except:
-					status = "Unknown"
-					tags = []
-			else:
-				status = "TBD"
-				tags = []
+			# Status is computed by the query from the schedule's epoch column
+			start_time = format_start(reg.get('start'))
+			status = STATUS_LABELS[reg['status']]
+			tags = [reg['status']] if reg['status'] in ('past', 'soon', 'upcoming') else []
 			
 			venue_name = reg.get('venue_name', 'TBD')
 			capacity = reg.get('capacity', 0)
 			
 			self.tree.insert('', tk.END, 
 							iid=reg['event_id'], 
-							values=(reg['title'], venue_name, start_time, capacity, status),
+							values=(reg['event_title'], venue_name, start_time, capacity, status),
 							tags=tags)
 		
 		# Configure tag colors
@@ -786,33 +795,19 @@ class OrganizerFrame(ttk.Frame):
 			return
 		
 		events = self.app.db.get_events_by_organizer(self.app.current_user[0])
+		summary = self.app.db.get_registration_summary(event_ids=[e['id'] for e in events])
 		
 		for event in events:
 			# Get registration count
-			registered_count = len(self.app.db.get_event_attendees(event['id']))
+			registered_count = summary[event['id']]['registered_count']
 			
-			# Format start time and determine status
-			start_time = event.get('start', 'TBD')
+			# Status is computed by the query; events without a usable start stay "Active"
+			start_time = format_start(event.get('start'))
 			status = "Active"
 			tags = []
-			
-			if start_time and start_time != 'TBD':
-				try:
-					dt = datetime.fromisoformat(start_time.replace('T', ' '))
-					start_time = dt.strftime("%Y-%m-%d %H:%M")
-					
-					now = datetime.now()
-					if dt < now:
-						status = "Past"
-						tags = ['past']
-					elif dt - now < timedelta(days=1):
-						status = "Soon"
-						tags = ['soon']
-					else:
-						status = "Upcoming"
-						tags = ['upcoming']
-				except:
-					pass
+			if event['status'] in ('past', 'soon', 'upcoming'):
+				status = STATUS_LABELS[event['status']]
+				tags = [event['status']]
 			
 			venue_name = event.get('venue_name', 'TBD')
 			capacity = event.get('capacity', 0)
@@ -1020,9 +1015,34 @@ class OrganizerFrame(ttk.Frame):
 		
 		attendee_tree.pack(fill=tk.BOTH, expand=True)
 		
-		# Close button
-		ttk.Button(main_frame, text="Close", command=dlg.destroy,
-				  style='Primary.TButton').pack(pady=(15, 0))
+		btn_frame = ttk.Frame(main_frame, style='Card.TFrame')
+		btn_frame.pack(pady=(15, 0))
+		ttk.Button(btn_frame, text="Export CSV...",
+				  command=lambda: self.export_attendees(event, dlg)).pack(side=tk.LEFT, padx=5)
+		ttk.Button(btn_frame, text="Close", command=dlg.destroy,
+				  style='Primary.TButton').pack(side=tk.LEFT, padx=5)
+
+	def export_attendees(self, event, parent):
+		path = filedialog.asksaveasfilename(parent=parent, defaultextension=".csv",
+										   initialfile=f"event-{event['id']}-attendees.csv",
+										   filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+		if not path:
+			return
+		
+		# Stream rows straight from the cursor to disk rather than building the list
+		count = 0
+		try:
+			with open(path, 'w', newline='', encoding='utf-8') as f:
+				writer = csv.writer(f)
+				writer.writerow(["Name", "Email", "Role", "Registration Date"])
+				for attendee in self.app.db.iter_event_attendees(event['id']):
+					writer.writerow([csv_cell(attendee[f]) for f in
+									 ('name', 'email', 'role', 'registration_date')])
+					count += 1
+		except OSError as e:
+			messagebox.showerror("Export Failed", str(e), parent=parent)
+			return
+		messagebox.showinfo("Export Complete", f"Exported {count} attendee(s) to {path}", parent=parent)
 
 
 class AdminFrame(ttk.Frame):
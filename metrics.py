@@ -0,0 +1,228 @@
+"""
+Opt-in request profiling: per-route wall time, SQL statement count and time,
+rows fetched, and the slowest statements seen.
+
+    profiler = Profiler()
+    db = DB(profiler=profiler)
+    profiler.init_app(app)
+
+DB hands profiler.connection_class to sqlite3.connect, so every statement on
+a pooled connection is timed against the request running on that thread.
+With no profiler, connections are plain sqlite3.Connection objects and cost
+nothing extra.
+"""
+import heapq
+import re
+import sqlite3
+import threading
+import time
+
+from flask import request
+
+# Upper bounds (seconds) of the Prometheus request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Request:
+    __slots__ = ('start', 'sql_count', 'sql_time', 'rows')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+
+
+class RouteStats:
+    __slots__ = ('requests', 'seconds', 'max_seconds', 'sql_count', 'sql_seconds', 'rows', 'buckets')
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+    def as_dict(self):
+        n = self.requests or 1
+        return {
+            'requests': self.requests,
+            'avg_ms': self.seconds / n * 1000,
+            'max_ms': self.max_seconds * 1000,
+            'sql_per_request': self.sql_count / n,
+            'sql_ms_per_request': self.sql_seconds / n * 1000,
+            'rows_per_request': self.rows / n,
+        }
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.profiler.record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.profiler.record_sql(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self.connection.profiler.record_fetch(row is not None, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.connection.profiler.record_fetch(len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self.connection.profiler.record_fetch(len(rows), time.perf_counter() - start)
+        return rows
+
+
+class ProfiledConnection(sqlite3.Connection):
+    profiler = None
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Profiler:
+    def __init__(self, slowest=20):
+        self.slowest = slowest
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+        # A connection class bound to this profiler, for sqlite3.connect(factory=...)
+        self.connection_class = type('ProfiledConnection', (ProfiledConnection,), {'profiler': self})
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self._slow = []  # min-heap of (seconds, seq, sql, route)
+            self._seq = 0
+            self.since = time.time()
+
+    def init_app(self, app):
+        app.before_request(self._begin)
+        app.teardown_request(self._end)
+
+    def _begin(self):
+        self._local.current = _Request()
+
+    def _end(self, exception=None):
+        current = getattr(self._local, 'current', None)
+        if current is None:
+            return
+        self._local.current = None
+        elapsed = time.perf_counter() - current.start
+        key = (request.method, request.url_rule.rule if request.url_rule else '<unmatched>')
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                stats = self.routes[key] = RouteStats()
+            stats.requests += 1
+            stats.seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.sql_count += current.sql_count
+            stats.sql_seconds += current.sql_time
+            stats.rows += current.rows
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if elapsed <= bound:
+                    stats.buckets[i] += 1
+                    break
+
+    def record_sql(self, sql, seconds):
+        current = getattr(self._local, 'current', None)
+        if current is None:
+            return
+        current.sql_count += 1
+        current.sql_time += seconds
+        # Cheap unlocked pre-check: most statements are nowhere near the slowest
+        slow = self._slow
+        if len(slow) < self.slowest or seconds > slow[0][0]:
+            route = request.url_rule.rule if request.url_rule else request.path
+            with self._lock:
+                self._seq += 1
+                entry = (seconds, self._seq, sql, route)
+                if len(self._slow) < self.slowest:
+                    heapq.heappush(self._slow, entry)
+                elif seconds > self._slow[0][0]:
+                    heapq.heapreplace(self._slow, entry)
+
+    def record_fetch(self, rows, seconds):
+        current = getattr(self._local, 'current', None)
+        if current is None:
+            return
+        current.rows += rows
+        current.sql_time += seconds
+
+    def snapshot(self):
+        """Per-route stats (slowest average first) and the slowest statements, for /admin/metrics"""
+        with self._lock:
+            routes = [dict(method=method, route=route, **stats.as_dict())
+                      for (method, route), stats in self.routes.items()]
+            slow = sorted(self._slow, reverse=True)
+        routes.sort(key=lambda r: r['avg_ms'], reverse=True)
+        return {
+            'since': self.since,
+            'routes': routes,
+            'slowest': [{'ms': seconds * 1000, 'sql': _squash(sql), 'route': route}
+                        for seconds, _, sql, route in slow],
+        }
+
+    def prometheus(self, prefix='eventmanager'):
+        """Render the per-route counters and duration histogram in Prometheus text format"""
+        with self._lock:
+            items = sorted(self.routes.items())
+            lines = []
+            counters = [
+                ('requests_total', 'Requests handled', lambda s: s.requests),
+                ('request_sql_statements_total', 'SQL statements executed', lambda s: s.sql_count),
+                ('request_sql_seconds_total', 'Time spent in SQL execute and fetch', lambda s: s.sql_seconds),
+                ('request_rows_fetched_total', 'Rows fetched from SQL cursors', lambda s: s.rows),
+            ]
+            for name, help_text, value in counters:
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} counter')
+                for (method, route), stats in items:
+                    lines.append(f'{prefix}_{name}{{{_labels(method, route)}}} {value(stats)}')
+            name = f'{prefix}_request_duration_seconds'
+            lines.append(f'# HELP {name} Request wall time')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, route), stats in items:
+                labels = _labels(method, route)
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats.requests}')
+                lines.append(f'{name}_sum{{{labels}}} {stats.seconds}')
+                lines.append(f'{name}_count{{{labels}}} {stats.requests}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+def _squash(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
@@ -0,0 +1,104 @@
+"""
+Password hashing off the request threads, and a login attempt throttle.
+
+werkzeug's password hashes use deliberately slow KDFs (scrypt by default).
+PasswordHasher runs them in a small process pool, so at most `workers` of
+them burn CPU at once and the web workers' GIL stays free for other
+requests. It refuses new work once `max_pending` calls are already queued
+or running. LoginThrottle rejects floods by email and by client address
+before they get that far.
+"""
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """The hashing pool is saturated (or too slow); the caller should ask the user to retry"""
+
+
+class PasswordHasher:
+    def __init__(self, workers=2, max_pending=32, timeout=10.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        # Created on first use, with spawn so forking never copies a threaded server's locks
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many sign-in requests in progress')
+        pool = self._executor()
+        try:
+            return pool.submit(fn, *args).result(self.timeout)
+        except FutureTimeout:
+            raise HasherBusy('Password check timed out')
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise HasherBusy('Password hashing pool restarted')
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+class LoginThrottle:
+    """
+    Sliding-window attempt counter. Each allowed hit() is recorded, so a burst
+    of parallel attempts is cut off at `limit` before any of them is checked.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        """Record an attempt for key; return 0 if allowed, else seconds until the next one would be"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            if len(self._hits) > 10000:
+                self._prune(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, now):
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
@@ -0,0 +1,169 @@
+"""
+In-process publish/subscribe fan-out, used to push live seat counts.
+
+A Subscription is a small object, not a thread. Publishing to a topic
+touches only that topic's subscribers, and each one keeps just the newest
+message per topic, so a slow reader catches up on the latest counts instead
+of working through a backlog. Readers block in Subscription.wait (a thread
+each, as under a threaded WSGI server) or await Subscription.wait_async on
+an event loop, where thousands of idle subscribers cost one small object
+apiece. publish may be called from any thread.
+"""
+import threading
+from collections import defaultdict
+
+
+class TooManySubscribers(Exception):
+    """The broker is at max_subscribers; the caller should ask the client to retry later"""
+
+
+class Subscription:
+    __slots__ = ('broker', 'topics', 'loop', 'pending', 'closed', '_ready', '_waiter')
+
+    def __init__(self, broker, topics, loop=None):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.pending = {}  # topic -> (version, message), guarded by the broker's lock
+        self.closed = False
+        self._ready = threading.Event() if loop is None else None
+        self._waiter = None  # future wait_async is parked on, touched only from the loop
+
+    def wait(self, timeout=None):
+        """
+        Block until something is published (or timeout) and return
+        {topic: message} for what arrived; {} on timeout, None once closed.
+        """
+        self._ready.wait(timeout)
+        self._ready.clear()
+        return self._take()
+
+    async def wait_async(self, timeout=None):
+        """wait() for subscriptions made with a loop; run it on that loop"""
+        # A bare future and timer rather than asyncio.wait_for, which costs a
+        # task per call; with thousands of readers that dominates a fan-out
+        if not self.pending and not self.closed:
+            self._waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, _resolve, self._waiter) if timeout is not None else None
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+                if timer is not None:
+                    timer.cancel()
+        return self._take()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def _take(self):
+        with self.broker._lock:
+            if self.closed:
+                return None
+            pending, self.pending = self.pending, {}
+        return {topic: message for topic, (_, message) in pending.items()}
+
+    def _notify(self):
+        if self._waiter is not None:
+            _resolve(self._waiter)
+
+
+class Broker:
+    def __init__(self, max_subscribers=10000, max_topics=100):
+        self.max_subscribers = max_subscribers
+        self.max_topics = max_topics
+        self._subscribers = defaultdict(set)  # topic -> subscriptions
+        self._lock = threading.Lock()
+        self.subscriptions = 0
+        self.published = self.delivered = 0
+
+    def subscribe(self, topics, loop=None):
+        """
+        Subscribe to up to max_topics topics. Pass the running event loop to
+        read with wait_async instead of wait.
+        """
+        topics = list(dict.fromkeys(topics))
+        if not topics or len(topics) > self.max_topics:
+            raise ValueError(f'Subscribe to between 1 and {self.max_topics} topics')
+        subscription = Subscription(self, topics, loop)
+        with self._lock:
+            if self.subscriptions >= self.max_subscribers:
+                raise TooManySubscribers('Too many live connections')
+            self.subscriptions += 1
+            for topic in subscription.topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription.closed:
+                return
+            subscription.closed = True
+            self.subscriptions -= 1
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+        self._wake([subscription])
+
+    def publish(self, topic, message, version=0):
+        self.publish_many([(topic, message, version)])
+
+    def publish_many(self, items):
+        """
+        Deliver (topic, message, version) items. A subscriber's pending message
+        for a topic is only replaced by one at least as new, so publishers
+        racing each other can't leave stale counts behind.
+        """
+        woken = []
+        with self._lock:
+            for topic, message, version in items:
+                self.published += 1
+                for subscription in self._subscribers.get(topic, ()):
+                    current = subscription.pending.get(topic)
+                    if current is None or current[0] <= version:
+                        subscription.pending[topic] = (version, message)
+                        woken.append(subscription)
+            self.delivered += len(woken)
+        self._wake(woken)
+
+    def topics(self):
+        """Topics that currently have at least one subscriber"""
+        with self._lock:
+            return list(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscriptions': self.subscriptions,
+                'topics': len(self._subscribers),
+                'published': self.published,
+                'delivered': self.delivered,
+            }
+
+    def _wake(self, subscriptions):
+        # Loop-bound subscribers are woken with one callback per loop, not one per subscriber
+        by_loop = defaultdict(list)
+        for subscription in dict.fromkeys(subscriptions):
+            if subscription.loop is None:
+                subscription._ready.set()
+            else:
+                by_loop[subscription.loop].append(subscription)
+        for loop, woken in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_notify_all, woken)
+            except RuntimeError:
+                # The loop has been closed; its subscribers are gone with it
+                pass
+
+
+def _notify_all(subscriptions):
+    for subscription in subscriptions:
+        subscription._notify()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
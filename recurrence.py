@@ -0,0 +1,151 @@
+"""
+Recurrence rules for event series, in a small subset of RFC 5545 RRULE:
+
+    FREQ=DAILY|WEEKLY|MONTHLY[;INTERVAL=n][;COUNT=n | ;UNTIL=YYYYMMDD[THHMMSS]]
+
+A series stores one rule instead of one schedule row per occurrence; DB
+expands it in SQL for the window a query asks about. Times are wall-clock
+epoch seconds read as UTC, like the schedules table. A monthly series on
+the 29th-31st skips months that don't have that day, as RRULE does.
+"""
+import calendar
+from collections import namedtuple
+from datetime import datetime, timezone
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+# Step lengths in seconds; monthly steps are calendar months and handled apart
+STEP_SECONDS = {'daily': 86400, 'weekly': 7 * 86400}
+
+# Upper bound on a series, so one form submission can't book a venue for decades
+MAX_OCCURRENCES = 1000
+
+Rule = namedtuple('Rule', 'freq interval count until_ts')
+
+
+def parse_rrule(text):
+    """Parse an RRULE string into a Rule; raises ValueError with a user-facing message"""
+    parts = {}
+    text = (text or '').strip().upper()
+    # str.removeprefix would need Python 3.9
+    if text.startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    for part in text.split(';'):
+        if not part:
+            continue
+        name, sep, value = part.partition('=')
+        if not sep or name in parts:
+            raise ValueError(f'Invalid recurrence rule part "{part}"')
+        parts[name] = value
+    unknown = set(parts) - {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL'}
+    if unknown:
+        raise ValueError(f'Unsupported recurrence rule part {", ".join(sorted(unknown))}')
+
+    freq = parts.get('FREQ', '').lower()
+    if freq not in FREQUENCIES:
+        raise ValueError('Recurrence must repeat daily, weekly or monthly')
+    try:
+        interval = int(parts.get('INTERVAL', 1))
+        count = int(parts['COUNT']) if 'COUNT' in parts else None
+    except ValueError:
+        raise ValueError('Recurrence interval and count must be whole numbers')
+    if interval < 1:
+        raise ValueError('Recurrence interval must be at least 1')
+    if (count is None) == ('UNTIL' not in parts):
+        raise ValueError('A recurring event needs either a number of occurrences or an end date')
+    if count is not None and not 1 <= count <= MAX_OCCURRENCES:
+        raise ValueError(f'A recurring event can have at most {MAX_OCCURRENCES} occurrences')
+
+    until_ts = None
+    if 'UNTIL' in parts:
+        value = parts['UNTIL'].rstrip('Z')
+        for fmt in ('%Y%m%dT%H%M%S', '%Y%m%d'):
+            try:
+                until = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError('Recurrence end date must look like YYYYMMDD')
+        if fmt == '%Y%m%d':
+            # A bare date includes occurrences on that day
+            until = until.replace(hour=23, minute=59, second=59)
+        until_ts = _epoch(until)
+    return Rule(freq, interval, count, until_ts)
+
+
+def format_rrule(freq, interval=1, count=None, until=None):
+    """Build an RRULE string from form values; until is a YYYY-MM-DD date"""
+    parts = [f'FREQ={freq.upper()}']
+    if interval and int(interval) != 1:
+        parts.append(f'INTERVAL={int(interval)}')
+    if count:
+        parts.append(f'COUNT={int(count)}')
+    elif until:
+        parts.append('UNTIL=' + until.replace('-', ''))
+    return ';'.join(parts)
+
+
+def describe(rule):
+    """Short human summary, e.g. 'Every 2 weeks, 10 times'"""
+    unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[rule.freq]
+    text = f'Every {unit}' if rule.interval == 1 else f'Every {rule.interval} {unit}s'
+    if rule.count is not None:
+        return f'{text}, {rule.count} time{"s" if rule.count != 1 else ""}'
+    return f'{text} until {datetime.fromtimestamp(rule.until_ts, timezone.utc):%Y-%m-%d}'
+
+
+def occurrence(rule, start_ts, k):
+    """Start of the k-th step of a series (a monthly step may land on a skipped day: None)"""
+    if rule.freq in STEP_SECONDS:
+        return start_ts + k * rule.interval * STEP_SECONDS[rule.freq]
+    first = datetime.fromtimestamp(start_ts, timezone.utc)
+    months = first.month - 1 + k * rule.interval
+    year, month = first.year + months // 12, months % 12 + 1
+    if first.day > calendar.monthrange(year, month)[1]:
+        return None
+    return _epoch(first.replace(year=year, month=month, tzinfo=None))
+
+
+def last_start(rule, start_ts):
+    """
+    Start of the final occurrence, or None if the series has none (UNTIL
+    before the first start). Raises ValueError past MAX_OCCURRENCES.
+    """
+    if rule.count is not None:
+        if rule.freq in STEP_SECONDS:
+            return occurrence(rule, start_ts, rule.count - 1)
+        seen, k = 0, 0
+        while True:
+            ts = occurrence(rule, start_ts, k)
+            if ts is not None:
+                seen += 1
+                if seen == rule.count:
+                    return ts
+            k += 1
+    if rule.until_ts < start_ts:
+        return None
+    if rule.freq in STEP_SECONDS:
+        steps = (rule.until_ts - start_ts) // (rule.interval * STEP_SECONDS[rule.freq])
+    else:
+        first = datetime.fromtimestamp(start_ts, timezone.utc)
+        until = datetime.fromtimestamp(rule.until_ts, timezone.utc)
+        steps = ((until.year - first.year) * 12 + until.month - first.month) // rule.interval
+    if steps >= MAX_OCCURRENCES:
+        raise ValueError(f'A recurring event can have at most {MAX_OCCURRENCES} occurrences')
+    for k in range(steps, -1, -1):
+        ts = occurrence(rule, start_ts, k)
+        if ts is not None and ts <= rule.until_ts:
+            return ts
+    return None
+
+
+def min_gap(rule):
+    """Shortest time between two consecutive occurrences; an occurrence must end within it"""
+    if rule.freq in STEP_SECONDS:
+        return rule.interval * STEP_SECONDS[rule.freq]
+    return rule.interval * 28 * 86400
+
+
+def _epoch(dt):
+    return calendar.timegm(dt.timetuple())
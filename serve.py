@@ -0,0 +1,66 @@
+"""
+Production server for the event manager.
+
+    python3 serve.py                                  # ASGI under uvicorn, one process
+    python3 serve.py --workers 4 --threads 16 --port 8000
+    python3 serve.py --mode wsgi                      # the threaded werkzeug server
+
+The ASGI mode (asgi.py) needs uvicorn: pip install uvicorn. Worker
+processes share events.db; each keeps its own caches, and a background
+thread in each invalidates what the others' writes have made stale.
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the event manager')
+    parser.add_argument('--mode', choices=('asgi', 'wsgi'), default='asgi',
+                        help='uvicorn with asgi.py, or the threaded werkzeug server (a thread per connection)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5003)
+    parser.add_argument('--workers', type=int, default=1, help='worker processes (ASGI mode)')
+    parser.add_argument('--threads', type=int, default=16, help='request threads per worker (ASGI mode)')
+    parser.add_argument('--max-queued', type=int, default=1024,
+                        help='requests a worker lets wait for a thread before answering 503 (ASGI mode)')
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error('--workers and --threads must be at least 1')
+
+    # app.py and asgi.py read these at import time, in every worker process
+    os.environ['EVENTS_WORKERS'] = str(args.workers)
+    os.environ['EVENTS_THREADS'] = str(args.threads)
+    os.environ['EVENTS_MAX_QUEUED'] = str(args.max_queued)
+
+    if args.mode == 'wsgi':
+        if args.workers != 1:
+            parser.error('--workers needs the ASGI mode')
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        from app import app
+
+        class QuietHandler(WSGIRequestHandler):
+            # No access log, as in the ASGI mode
+            def log_request(self, *args, **kwargs):
+                pass
+        server = make_server(args.host, args.port, app, threaded=True, request_handler=QuietHandler)
+        print(f'Serving WSGI on http://{args.host}:{args.port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error('the ASGI mode needs uvicorn: pip install uvicorn')
+    uvicorn.run('asgi:app', app_dir=HERE, host=args.host, port=args.port, workers=args.workers,
+                log_level='warning', access_log=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
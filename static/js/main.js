@@ -166,3 +166,50 @@ document.addEventListener('DOMContentLoaded', function() {
 window.toggleTheme = toggleTheme;
 window.toggleAI = toggleAI;
 window.toggleAIAssistant = toggleAI;
+
+// Live seat counts: elements marked data-seats="registered_count|capacity|seats_left|waitlist_count|percent|bar"
+// inside a data-seats-event="<id>" container follow the /events/seats stream
+function applySeatCounts(counts) {
+    Object.keys(counts).forEach(function(eventId) {
+        const seats = counts[eventId];
+        if (seats.deleted) return;
+        document.querySelectorAll('[data-seats-event="' + eventId + '"]').forEach(function(container) {
+            const percent = seats.capacity ? Math.round(seats.registered_count / seats.capacity * 100) : 0;
+            const values = {
+                registered_count: seats.registered_count,
+                capacity: seats.capacity,
+                seats_left: seats.capacity ? Math.max(seats.capacity - seats.registered_count, 0) : '',
+                waitlist_count: seats.waitlist_count,
+                percent: percent
+            };
+            container.querySelectorAll('[data-seats]').forEach(function(el) {
+                const field = el.getAttribute('data-seats');
+                if (field === 'bar') {
+                    el.style.width = Math.min(percent, 100) + '%';
+                    el.style.background = percent >= 100 ? 'var(--error-color)' : percent >= 80 ? 'var(--warning-color)' : 'var(--success-color)';
+                } else if (field in values) {
+                    el.textContent = values[field];
+                }
+            });
+        });
+    });
+}
+
+function watchSeatCounts() {
+    if (!window.EventSource) return;
+    const ids = new Set();
+    document.querySelectorAll('[data-seats-event]').forEach(function(el) {
+        ids.add(el.getAttribute('data-seats-event'));
+    });
+    if (ids.size === 0) return;
+    // The browser reconnects on its own after errors; each connection starts with a fresh snapshot
+    const source = new EventSource('/events/seats?ids=' + Array.from(ids).join(','));
+    source.onmessage = function(e) {
+        applySeatCounts(JSON.parse(e.data));
+    };
+    window.addEventListener('pagehide', function() {
+        source.close();
+    });
+}
+
+document.addEventListener('DOMContentLoaded', watchSeatCounts);
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py opens EVENTS_DB when it is imported; keep tests away from the real events.db
+os.environ.setdefault('EVENTS_DB', os.path.join(tempfile.mkdtemp(prefix='events-tests-'), 'events.db'))
+
+from db import DB
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh, seeded database with its own file"""
+    database = DB(str(tmp_path / 'events.db'))
+    yield database
+    database.close()
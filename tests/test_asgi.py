@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+asgi = pytest.importorskip('asgi')
+
+
+async def _request(method, path, headers=(), body=b''):
+    """Run one request through asgi.app; returns (status, headers, body, body messages)"""
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': list(headers),
+             'http_version': '1.1', 'scheme': 'http', 'server': ('test', 80), 'client': ('127.0.0.1', 5000)}
+    incoming = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    never = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if incoming:
+            return incoming.pop()
+        await never.wait()
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    bodies = sent[1:]
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(m['body'] for m in bodies), bodies
+
+
+async def _login(email, password):
+    status, headers, _, _ = await _request(
+        'POST', '/login', [(b'content-type', b'application/x-www-form-urlencoded')],
+        f'email={email}&password={password}'.encode())
+    assert status == 302 and headers[b'location'] == b'/dashboard'
+    return headers[b'set-cookie'].split(b';')[0]
+
+
+def test_streamed_exports_through_the_bridge():
+    async def run():
+        cookie = await _login('admin@eventmanager.com', 'admin123')
+        results = []
+        # Twice each: a second request must find the contexts and the connection pool as the first left them
+        for path in ['/admin/events/export.csv', '/admin/events/export.ndjson',
+                     '/manage_event/1/attendees.csv', '/manage_event/1/attendees.ndjson'] * 2:
+            results.append((path, await _request('GET', path, [(b'cookie', cookie)])))
+        return results
+
+    events = asgi.db.get_event_statistics()['total_events']
+    asgi.db.release()
+    for path, (status, headers, body, messages) in asyncio.run(run()):
+        assert status == 200, path
+        assert messages[-1] == {'type': 'http.response.body', 'body': b''}
+        lines = body.decode().splitlines()
+        if path == '/admin/events/export.csv':
+            assert lines[0].startswith('id,title,start') and len(lines) == events + 1
+        elif path == '/admin/events/export.ndjson':
+            assert len(lines) == events and all('registered_count' in json.loads(line) for line in lines)
+        elif path.endswith('.csv'):
+            assert lines == ['id,name,email,role,registration_date']
+        else:
+            assert lines == []
+    # Every pooled connection the exports checked out has been returned
+    assert asgi.db.pool._slots._value == asgi.db.pool.size
+
+
+def test_seat_stream_through_the_bridge():
+    async def run():
+        cookie = await _login('user@eventmanager.com', 'user123')
+        scope = {'type': 'http', 'method': 'GET', 'path': '/events/seats', 'query_string': b'ids=1',
+                 'headers': [(b'cookie', cookie)], 'http_version': '1.1', 'scheme': 'http',
+                 'server': ('test', 80), 'client': ('127.0.0.1', 5000)}
+        requested, first_chunk = False, asyncio.Event()
+        sent = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Hang up once the snapshot has arrived
+            await first_chunk.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body':
+                first_chunk.set()
+
+        await asyncio.wait_for(asgi.app(scope, receive, send), 10)
+        return sent
+
+    sent = asyncio.run(run())
+    assert sent[0]['status'] == 200
+    assert sent[1]['body'].startswith(b'retry: 5000\ndata: {"1": ')
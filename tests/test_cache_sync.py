@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from db import DB
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two shared DBs on one file, standing in for two worker processes"""
+    path = str(tmp_path / 'events.db')
+    first, second = DB(path, shared=True), DB(path, shared=True)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def _hits(db):
+    return db.cache.stats()['hits']
+
+
+def test_other_workers_writes_invalidate_only_what_they_touch(workers):
+    a, b = workers
+    sid = a.create_session(3, 3600)
+    a.get_session(sid), a.get_session_user(3), a.get_event(1), a.get_events(), a.get_event_attendees(1)
+    assert a.sync_cache() == []
+
+    # A registration elsewhere makes the attendee list stale, not the event, the listing or the session
+    b.register_user_for_event(3, 1)
+    assert a.sync_cache() == ['registrations']
+    hits = _hits(a)
+    a.get_session(sid), a.get_session_user(3), a.get_event(1), a.get_events()
+    assert _hits(a) == hits + 4
+    assert [r['id'] for r in a.get_event_attendees(1)] == [3]
+
+    b.update_event(1, 'Renamed', 'New description', 1, 100)
+    assert a.sync_cache() == ['events.details']
+    assert a.get_event(1)['title'] == 'Renamed'
+
+    # Signing out on another worker ends the session here too
+    b.delete_session(sid)
+    assert a.sync_cache() == ['sessions.ended']
+    assert a.get_session(sid) is None
+
+
+def test_own_writes_are_not_synced_again(workers):
+    a, b = workers
+    a.get_event(1), a.get_venues(), a.get_session_user(3)
+
+    def register():
+        # A second pooled connection of the same process
+        a.register_user_for_event(3, 1)
+        a.release()
+    thread = threading.Thread(target=register)
+    thread.start()
+    thread.join()
+    a.update_event(2, 'Renamed', 'New description', 2, 30)
+    assert a.sync_cache() == []
+    hits = _hits(a)
+    # Neither write touched these, and the sync didn't drop them either
+    a.get_event(1), a.get_venues(), a.get_session_user(3)
+    assert _hits(a) == hits + 3
+
+    # Writes from both sides between two syncs: only the other side's are seen
+    a.register_user_for_event(3, 2)
+    b.create_venue('Annex', '1 Side St', 40)
+    assert a.sync_cache() == ['venues']
+
+
+def test_rolled_back_writes_are_not_counted(workers):
+    a, b = workers
+    with pytest.raises(Exception, match='Already registered'):
+        a.register_user_for_event(3, 1)
+        a.register_user_for_event(3, 1)
+    conn = a.conn
+    conn.execute("UPDATE users SET name='Nobody' WHERE id=3")
+    conn.rollback()
+    b.create_user('New User', 'new@example.com')
+    assert a.sync_cache() == ['users']
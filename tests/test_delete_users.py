@@ -0,0 +1,39 @@
+import sqlite3
+
+from db import DB, MIGRATIONS
+
+
+def test_deleting_an_organizer_keeps_their_events(db):
+    organizer_id, attendee_id = 2, 3
+    events = [e['id'] for e in db.get_events_by_organizer(organizer_id)]
+    assert events
+    db.register_user_for_event(attendee_id, events[0])
+
+    counts = db.delete_users([organizer_id])
+    assert counts['users'] == 1
+    assert 'events' not in counts
+    for event_id in events:
+        event = db.get_event(event_id)
+        assert event['organizer_id'] is None and event['organizer_name'] is None
+    assert attendee_id in {a['id'] for a in db.get_event_attendees(events[0])}
+
+
+def test_migration_stops_organizer_deletes_cascading(tmp_path):
+    path = str(tmp_path / 'events.db')
+    DB(path).close()
+    # The events table as the foreign keys migration first declared it
+    conn = sqlite3.connect(path)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='events'").fetchone()[0]
+    conn.execute('PRAGMA writable_schema=ON')
+    conn.execute("UPDATE sqlite_master SET sql=? WHERE name='events'",
+                 (sql.replace('users(id) ON DELETE SET NULL', 'users(id) ON DELETE CASCADE'),))
+    conn.execute('PRAGMA writable_schema=OFF')
+    conn.execute(f'PRAGMA user_version={len(MIGRATIONS) - 1}')
+    conn.commit()
+    conn.close()
+
+    db = DB(path)
+    events = [e['id'] for e in db.get_events_by_organizer(2)]
+    db.delete_user(2)
+    assert [db.get_event(event_id)['organizer_id'] for event_id in events] == [None] * len(events)
+    db.close()
@@ -0,0 +1,58 @@
+import re
+
+import pytest
+
+from db import DB
+
+# Hot listing and search reads, with the indexes their plans must use. None
+# may scan a whole table, except where the result is the whole table.
+HOT_QUERIES = {
+    'events page': (lambda db: db.get_events(limit=2), {'idx_schedules_start'}),
+    'events page after a cursor': (lambda db: db.get_events(limit=1, after=db.get_events(limit=1).next_cursor),
+                                   {'idx_schedules_start'}),
+    'all events': (lambda db: db.get_events(), {'idx_schedules_event'}, {'SCAN e'}),
+    'event detail': (lambda db: db.get_event(1), {'idx_schedules_event'}),
+    'search': (lambda db: db.search_events('workshop', limit=20), {'idx_schedules_event'}),
+    'registrations by user': (lambda db: db.get_registrations_by_user(3, limit=20), {'idx_registrations_user'}),
+    'events by organizer': (lambda db: db.get_events_by_organizer(2, limit=20), {'idx_events_organizer'}),
+    'attendees': (lambda db: db.get_event_attendees(1, limit=20), {'idx_registrations_event_created'}),
+    'registration summary': (lambda db: db.get_registration_summary(3, [1, 2, 3]),
+                             {'idx_registrations_event_user'}),
+}
+
+# A full pass over one of the base tables, by row or by index
+TABLE_SCAN = re.compile(r'SCAN (e|r|s|v|u|events|registrations|schedules|venues|users)\b')
+
+
+@pytest.fixture
+def uncached_db(tmp_path):
+    database = DB(str(tmp_path / 'events.db'), cache=False)
+    database.register_user_for_event(3, 1)
+    yield database
+    database.close()
+
+
+def query_plans(db, call):
+    """EXPLAIN QUERY PLAN details for each SELECT that call(db) runs"""
+    conn = db.conn
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call(db)
+    finally:
+        conn.set_trace_callback(None)
+    return [[row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_queries_use_their_indexes(uncached_db, name):
+    call, indexes, *allowed = HOT_QUERIES[name]
+    plans = query_plans(uncached_db, call)
+    assert plans, 'no query was run'
+    details = [detail for plan in plans for detail in plan]
+    for index in indexes:
+        assert any(re.search(rf'INDEX {index}\b', detail) for detail in details), \
+            f'{index} not used:\n' + '\n'.join(details)
+    scans = [d for d in details if TABLE_SCAN.match(d) and d not in (allowed[0] if allowed else ())]
+    assert not scans, '\n'.join(details)
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from db import DB
+
+REGISTRANTS = 500
+CAPACITY = 100
+
+
+@pytest.fixture
+def crowd(tmp_path):
+    """A DB with REGISTRANTS fresh attendees and an empty event of CAPACITY seats"""
+    database = DB(str(tmp_path / 'events.db'), busy_timeout=30000)
+    conn = database.conn
+    cur = conn.cursor()
+    cur.executemany('INSERT INTO users (name,email,role) VALUES (?,?,?)',
+                    [(f'Attendee {i}', f'attendee{i}@example.com', 'attendee') for i in range(REGISTRANTS)])
+    conn.commit()
+    cur.execute('SELECT id FROM users WHERE email LIKE ? ORDER BY id', ('attendee%@example.com',))
+    users = [r[0] for r in cur.fetchall()]
+    event_id = database.create_event('Crowded', 'Everyone at once', 1, 2, CAPACITY)
+    database.release()
+    yield database, users, event_id
+    database.close()
+
+
+def _all_at_once(db, users, call):
+    """call(user_id) from one thread per user, all released together; returns {user_id: result or exception}"""
+    start = threading.Barrier(len(users))
+    results = {}
+
+    def run(user_id):
+        start.wait()
+        try:
+            results[user_id] = call(user_id)
+        except Exception as e:
+            results[user_id] = e
+        finally:
+            db.release()
+    threads = [threading.Thread(target=run, args=(user_id,)) for user_id in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _confirmed(db, event_id):
+    cur = db.conn.cursor()
+    cur.execute('SELECT registered_count FROM events WHERE id=?', (event_id,))
+    registered_count = cur.fetchone()[0]
+    cur.execute('SELECT user_id FROM registrations WHERE event_id=?', (event_id,))
+    users = [r[0] for r in cur.fetchall()]
+    assert registered_count == len(users) == len(set(users))
+    return set(users)
+
+
+def test_concurrent_registrations_never_oversell(crowd):
+    db, users, event_id = crowd
+    results = _all_at_once(db, users, lambda user_id: db.register_user_for_event(user_id, event_id))
+
+    registered = {u for u, r in results.items() if not isinstance(r, Exception)}
+    assert all(str(r) == 'Event is full' for u, r in results.items() if u not in registered)
+    assert _confirmed(db, event_id) == registered
+    assert len(registered) == CAPACITY
+
+
+def test_concurrent_waitlist_joins_queue_without_gaps(crowd):
+    db, users, event_id = crowd
+    results = _all_at_once(db, users, lambda user_id: db.join_waitlist(user_id, event_id))
+
+    assert not [r for r in results.values() if isinstance(r, Exception)]
+    registered = {u for u, r in results.items() if r['status'] == 'registered'}
+    assert _confirmed(db, event_id) == registered
+    assert len(registered) == CAPACITY
+
+    # Each join saw its own place in the queue, and together they are 1..n in join order
+    queue = [w['id'] for w in db.get_waitlist(event_id)]
+    assert sorted(queue) == sorted(set(users) - registered)
+    assert [results[u]['position'] for u in queue] == list(range(1, len(queue) + 1))
+    assert [db.get_waitlist_position(u, event_id) for u in queue] == list(range(1, len(queue) + 1))
+
+    # Freed seats go to the head of the queue, and everyone behind moves up
+    leaving = sorted(registered)[:10]
+    _all_at_once(db, leaving, lambda user_id: db.unregister_user_from_event(user_id, event_id))
+    assert _confirmed(db, event_id) == registered - set(leaving) | set(queue[:10])
+    rest = [w['id'] for w in db.get_waitlist(event_id)]
+    assert rest == queue[10:]
+    assert [db.get_waitlist_position(u, event_id) for u in rest] == list(range(1, len(rest) + 1))
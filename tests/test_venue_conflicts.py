@@ -0,0 +1,88 @@
+import pytest
+
+from db import DB
+
+HALL, ROOM = 1, 2
+
+
+@pytest.fixture(params=[True, False], ids=['rtree', 'spans'])
+def venues(request, tmp_path):
+    """
+    A DB with one 10:00-11:00 booking in each of two venues, queried through
+    the R*Tree or, as when SQLite is built without it, schedule_spans
+    """
+    database = DB(str(tmp_path / 'events.db'), cache=False)
+    if request.param and not database.has_rtree:
+        pytest.skip('SQLite built without R*Tree')
+    database.has_rtree = request.param
+    hall = database.create_event('Talk', '', HALL, 2, 50, '2030-01-07 10:00:00', '2030-01-07 11:00:00')
+    database.create_event('Workshop', '', ROOM, 2, 50, '2030-01-07 10:00:00', '2030-01-07 11:00:00')
+    yield database, hall
+    database.close()
+
+
+def _conflicts(db, venue_id, start, end=None, exclude=None, rrule=None):
+    return {c['title'] for c in db.find_venue_conflicts(venue_id, start, end, exclude, rrule)}
+
+
+# Slots against the 10:00-11:00 booking, to the second: the R*Tree keeps
+# epoch seconds as 32-bit floats, so its candidates must be rechecked exactly
+@pytest.mark.parametrize('start, end, clash', [
+    ('2030-01-07 09:00:00', '2030-01-07 10:00:00', False),
+    ('2030-01-07 11:00:00', '2030-01-07 12:00:00', False),
+    ('2030-01-07 09:00:00', '2030-01-07 10:00:01', True),
+    ('2030-01-07 10:59:59', '2030-01-07 12:00:00', True),
+    ('2030-01-07 10:15:00', '2030-01-07 10:30:00', True),
+    ('2030-01-07 09:00:00', '2030-01-07 12:00:00', True),
+    # No end, or one before the start: a minute from the start
+    ('2030-01-07 09:59:00', None, False),
+    ('2030-01-07 09:59:01', None, True),
+    ('2030-01-07 09:59:30', '2030-01-07 09:00:00', True),
+])
+def test_slots_touching_a_booking_do_not_clash(venues, start, end, clash):
+    db, _ = venues
+    assert _conflicts(db, HALL, start, end) == ({'Talk'} if clash else set())
+    assert db.check_venue_availability(HALL, start, end) == (not clash)
+
+
+def test_a_booking_without_an_end_takes_a_minute(venues):
+    db, _ = venues
+    db.create_event('Announcement', '', ROOM, 2, 50, '2030-01-07 12:00:00')
+    assert _conflicts(db, ROOM, '2030-01-07 12:00:59', '2030-01-07 13:00:00') == {'Announcement'}
+    assert _conflicts(db, ROOM, '2030-01-07 12:01:00', '2030-01-07 13:00:00') == set()
+
+
+def test_the_event_being_edited_is_excluded(venues):
+    db, hall = venues
+    assert _conflicts(db, HALL, '2030-01-07 10:30:00', '2030-01-07 11:30:00', exclude=hall) == set()
+
+
+def test_moves_and_deletes_reach_the_index(venues):
+    db, hall = venues
+    db.update_event(hall, 'Talk', '', HALL, 50, '2030-01-07 14:00:00', '2030-01-07 15:00:00')
+    assert _conflicts(db, HALL, '2030-01-07 10:00:00', '2030-01-07 11:00:00') == set()
+    assert _conflicts(db, HALL, '2030-01-07 14:30:00', '2030-01-07 16:00:00') == {'Talk'}
+    # A venue change alone, with the time left as it was
+    db.update_event(hall, 'Talk', '', ROOM, 50)
+    assert _conflicts(db, HALL, '2030-01-07 14:30:00', '2030-01-07 16:00:00') == set()
+    assert _conflicts(db, ROOM, '2030-01-07 14:30:00', '2030-01-07 16:00:00') == {'Talk'}
+    db.delete_event(hall)
+    assert _conflicts(db, ROOM, '2030-01-07 14:30:00', '2030-01-07 16:00:00') == set()
+
+
+def test_series_clash_on_any_occurrence(venues):
+    db, _ = venues
+    # Mondays 18:00-20:00 from 7 January, three times
+    db.create_event('Evening class', '', HALL, 2, 50, '2030-01-07 18:00:00', '2030-01-07 20:00:00',
+                    'FREQ=WEEKLY;COUNT=3')
+    assert _conflicts(db, HALL, '2030-01-21 19:00:00', '2030-01-21 21:00:00') == {'Evening class'}
+    assert _conflicts(db, HALL, '2030-01-28 19:00:00', '2030-01-28 21:00:00') == set()
+    assert _conflicts(db, HALL, '2030-01-14 20:00:00', '2030-01-14 21:00:00') == set()
+    # A daily series starting a week early first meets the one-off talk on its eighth day
+    assert _conflicts(db, HALL, '2029-12-31 10:30:00', '2029-12-31 10:45:00',
+                      rrule='FREQ=DAILY;COUNT=8') == {'Talk'}
+    assert _conflicts(db, HALL, '2029-12-31 10:30:00', '2029-12-31 10:45:00',
+                      rrule='FREQ=DAILY;COUNT=7') == set()
+    # Two series: every other day from 9 January lands on the 21st
+    assert _conflicts(db, HALL, '2030-01-09 19:30:00', '2030-01-09 19:45:00',
+                      rrule='FREQ=DAILY;INTERVAL=2;COUNT=10') == {'Evening class'}
@@ -0,0 +1,96 @@
+import pytest
+
+from db import DB
+
+
+@pytest.fixture
+def queue(tmp_path):
+    """A one-seat event, taken, with five users queued behind it"""
+    database = DB(str(tmp_path / 'events.db'), cache=False)
+    users = [database.create_user(f'Queuer {i}', f'queuer{i}@example.com') for i in range(6)]
+    event_id = database.create_event('Small', '', 1, 2, 1)
+    assert database.join_waitlist(users[0], event_id) == {'status': 'registered'}
+    for place, user_id in enumerate(users[1:], start=1):
+        assert database.join_waitlist(user_id, event_id) == {'status': 'waitlisted', 'position': place}
+    yield database, users, event_id
+    database.close()
+
+
+def _queued(db, event_id):
+    """The queue in order, checked against each user's own position and the count"""
+    queue = [w['id'] for w in db.get_waitlist(event_id)]
+    assert [db.get_waitlist_position(u, event_id) for u in queue] == list(range(1, len(queue) + 1))
+    assert db.get_waitlist_count(event_id) == len(queue)
+    return queue
+
+
+def _attendees(db, event_id):
+    return {a['id'] for a in db.get_event_attendees(event_id)}
+
+
+def test_leaving_the_middle_moves_those_behind_up(queue):
+    db, users, event_id = queue
+    assert db.leave_waitlist(users[3], event_id)
+    assert not db.leave_waitlist(users[3], event_id)
+    assert db.get_waitlist_position(users[3], event_id) is None
+    assert _queued(db, event_id) == [users[1], users[2], users[4], users[5]]
+
+
+def test_joining_twice_is_refused(queue):
+    db, users, event_id = queue
+    with pytest.raises(Exception, match='Already registered'):
+        db.join_waitlist(users[0], event_id)
+    with pytest.raises(Exception, match='Already on the waitlist'):
+        db.join_waitlist(users[2], event_id)
+    assert _queued(db, event_id) == users[1:]
+
+
+def test_unregistering_promotes_the_head(queue):
+    db, users, event_id = queue
+    assert db.unregister_user_from_event(users[0], event_id)
+    assert _attendees(db, event_id) == {users[1]}
+    assert _queued(db, event_id) == users[2:]
+    # Someone who left the queue is skipped
+    db.leave_waitlist(users[2], event_id)
+    db.unregister_user_from_event(users[1], event_id)
+    assert _attendees(db, event_id) == {users[3]}
+    assert _queued(db, event_id) == users[4:]
+
+
+def test_raising_capacity_promotes_in_queue_order(queue):
+    db, users, event_id = queue
+    db.update_event(event_id, 'Bigger', '', 1, 3)
+    assert _attendees(db, event_id) == set(users[:3])
+    assert _queued(db, event_id) == users[3:]
+
+
+def test_deleting_users_promotes_and_closes_the_gap(queue):
+    db, users, event_id = queue
+    db.delete_user(users[2])
+    assert _queued(db, event_id) == [users[1], users[3], users[4], users[5]]
+    db.delete_user(users[0])
+    assert _attendees(db, event_id) == {users[1]}
+    assert _queued(db, event_id) == users[3:]
+
+
+# Waitlist ids just below a power of two, so the Fenwick tree's counts are
+# kept across it, up to near the top of its span (WAITLIST_SPAN)
+@pytest.mark.parametrize('start', [(1 << 12) - 5, (1 << 33) - 5, (1 << 39) - 5])
+def test_positions_across_a_power_of_two(tmp_path, start):
+    db = DB(str(tmp_path / 'events.db'), cache=False)
+    conn = db.conn
+    conn.execute("DELETE FROM sqlite_sequence WHERE name='waitlist'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('waitlist', ?)", (start,))
+    conn.commit()
+    users = [db.create_user(f'Queuer {i}', f'queuer{i}@example.com') for i in range(12)]
+    # Two events' entries interleave in the one counts table
+    events = [db.create_event(f'Full {i}', '', 1, 2, 0) for i in range(2)]
+    for user_id in users:
+        for event_id in events:
+            db.join_waitlist(user_id, event_id)
+    db.leave_waitlist(users[0], events[0])
+    db.leave_waitlist(users[7], events[0])
+    db.leave_waitlist(users[5], events[1])
+    assert _queued(db, events[0]) == users[1:7] + users[8:]
+    assert _queued(db, events[1]) == users[:5] + users[6:]
+    db.close()